@@ -0,0 +1,236 @@
+""" Benchmark suite of media_gpsplot: readers per format, directory walk, dataframe building
+    and plot_map, on a synthetic corpus from make_media_corpus.
+
+    Every benchmark runs in a fresh process, so its peak RSS (resident memory) can be measured.
+    Results are saved as JSON. With --compare the results are compared with an earlier run.
+
+Usage:
+    python benchmark_media_gpsplot.py -n 1000 -o benchmark_media_gpsplot.json
+    python benchmark_media_gpsplot.py -n 1000 --compare benchmark_media_gpsplot.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from make_media_corpus import CORPUS_FORMATS, make_media_corpus
+from run_stats import read_io_counters
+
+
+# Numbers of points for the dataframe and plot_map benchmarks
+DEFAULT_POINTS = "1000,10000,100000"
+
+# Number of times media_gpsplot.py is started for the startup benchmark
+STARTUP_RUNS = 10
+
+
+def read_peak_rss():
+    """ Reads the peak resident memory of this process.
+
+    Returns:
+        int: peak RSS in bytes, or None if unknown
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_benchmark(name, corpus_dir, parameter):
+    """ Runs one benchmark. Runs in a fresh process.
+
+    Args:
+        name (str): startup, walk, extract, dataframe or plot_map
+        corpus_dir (str): directory of the synthetic corpus
+        parameter: arguments for startup, extension for extract,
+                   number of points for dataframe and plot_map
+
+    Returns:
+        dict: benchmark, parameter, items, seconds, items_per_second, bytes_read, peak_rss
+    """
+    if name == "startup":
+        # Start of the program, with the imports, up to the argument parsing
+        media_gpsplot_script = Path(__file__).with_name("media_gpsplot.py")
+        start_time = time.perf_counter()
+        for _ in range(STARTUP_RUNS):
+            subprocess.run([sys.executable, str(media_gpsplot_script), *parameter.split()],
+                           stdout=subprocess.DEVNULL, check=True)
+        seconds = time.perf_counter() - start_time
+        return {"benchmark": name, "parameter": parameter, "items": STARTUP_RUNS,
+                "seconds": round(seconds, 4), "items_per_second": round(STARTUP_RUNS / seconds, 1),
+                "bytes_read": None, "peak_rss": None}
+
+    # Imported here, so the import time isn't measured as part of the benchmark
+    import media_gpsplot
+    from benchmark_plot_map import make_media_files_df
+
+    logger = logging.getLogger()
+    # Errors of the corrupt files are expected, they aren't printed
+    logger.addHandler(logging.NullHandler())
+    items = 0
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        if name == "walk":
+            bytes_read_before = read_io_counters()
+            start_time = time.perf_counter()
+            items = sum(1 for _ in media_gpsplot.walk_media_files(
+                [Path(corpus_dir)], list(CORPUS_FORMATS), logger))
+        elif name == "extract":
+            media_files = [media_file for _, media_file in media_gpsplot.walk_media_files(
+                [Path(corpus_dir) / parameter], [parameter], logger)]
+            bytes_read_before = read_io_counters()
+            start_time = time.perf_counter()
+            media_records = media_gpsplot.read_media_files(media_files, parameter, logger)
+            items = len(media_records)
+        elif name == "dataframe":
+            media_files_df = make_media_files_df(parameter)
+            media_records = [
+                media_gpsplot.MediaRecord(filename, row.extension,
+                                          row.creationdate.strftime("%Y:%m:%d %H:%M:%S"),
+                                          (row.latitude, row.longitude, row.altitude))
+                for filename, row in zip(media_files_df.index, media_files_df.itertuples())]
+            bytes_read_before = read_io_counters()
+            start_time = time.perf_counter()
+            media_record_builder = media_gpsplot.MediaRecordBuilder()
+            for media_record in media_records:
+                media_record_builder.append(media_record)
+            items = len(media_record_builder.to_dataframe())
+        elif name == "plot_map":
+            media_files_df = make_media_files_df(parameter)
+            bytes_read_before = read_io_counters()
+            start_time = time.perf_counter()
+            with tempfile.TemporaryDirectory() as output_dir:
+                media_gpsplot.plot_map(media_files_df, os.path.join(output_dir, "map.html"),
+                                       logger, "cluster")
+            items = parameter
+        else:
+            raise ValueError(f"Unknown benchmark {name}")
+        seconds = time.perf_counter() - start_time
+    bytes_read_after = read_io_counters()
+    return {
+        "benchmark": name,
+        "parameter": parameter,
+        "items": items,
+        "seconds": round(seconds, 4),
+        "items_per_second": round(items / seconds, 1) if seconds > 0 else None,
+        "bytes_read": None if bytes_read_before is None else bytes_read_after - bytes_read_before,
+        "peak_rss": read_peak_rss(),
+    }
+
+
+def run_benchmarks(corpus_dir, formats, numbers_of_points):
+    """ Runs all benchmarks, each in a fresh process.
+
+    Args:
+        corpus_dir (str): directory of the synthetic corpus
+        formats (list): formats in the corpus
+        numbers_of_points (list): numbers of points for dataframe and plot_map
+
+    Returns:
+        list: result per benchmark
+    """
+    benchmarks = [("startup", "--help"), ("walk", None)] + [("extract", media_format) for media_format in formats] \
+        + [("dataframe", points) for points in numbers_of_points] \
+        + [("plot_map", points) for points in numbers_of_points]
+    results = []
+    # spawn: the peak RSS of a forked process would include the memory of this process
+    spawn_context = multiprocessing.get_context("spawn")
+    for name, parameter in benchmarks:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn_context) as executor:
+            result = executor.submit(run_benchmark, name, corpus_dir, parameter).result()
+        peak_rss = result["peak_rss"] / 1e6 if result["peak_rss"] else float("nan")
+        bytes_read = result["bytes_read"] / 1e6 if result["bytes_read"] is not None \
+            else float("nan")
+        print(f"{name:<10} {str(parameter):<8} {result['items']:>8} items "
+              f"{result['seconds']:>9.3f} s {result['items_per_second'] or 0:>11.1f} /s "
+              f"{bytes_read:>9.2f} MB read {peak_rss:>8.1f} MB peak RSS")
+        results.append(result)
+    return results
+
+
+def compare_results(results, earlier_results):
+    """ Prints the change in speed and peak RSS against earlier results.
+
+    Args:
+        results (list): results of this run
+        earlier_results (list): results of an earlier run, from the JSON file
+    """
+    earlier = {(result["benchmark"], result["parameter"]): result for result in earlier_results}
+    print("Compared with earlier results:")
+    for result in results:
+        earlier_result = earlier.get((result["benchmark"], result["parameter"]))
+        if earlier_result is None or not earlier_result["seconds"] or not result["seconds"]:
+            continue
+        speedup = earlier_result["seconds"] / result["seconds"]
+        rss_change = ""
+        if result["peak_rss"] and earlier_result["peak_rss"]:
+            rss_change = f"{(result['peak_rss'] / earlier_result['peak_rss'] - 1) * 100:+.0f}% RSS"
+        print(f"{result['benchmark']:<10} {str(result['parameter']):<8} "
+              f"{speedup:>6.2f}x speed {rss_change}")
+
+
+def main():
+    """ Main function of the benchmark suite.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the readers, the walk, dataframe building and plot_map" \
+                    " of media_gpsplot on a synthetic corpus."
+    )
+    parser.add_argument(
+        "--number", "-n", type=int,
+        help="Number of media files per format in the synthetic corpus. Default: 1000",
+        default=1000
+    )
+    parser.add_argument(
+        "--corpus", "-c", type=str,
+        help="Directory of an existing corpus from make_media_corpus." \
+             " Default: a new corpus in a temporary directory",
+        default=None
+    )
+    parser.add_argument(
+        "--points", "-p", type=str,
+        help=f"Numbers of points for dataframe and plot_map, comma separated." \
+             f" Default: {DEFAULT_POINTS}",
+        default=DEFAULT_POINTS
+    )
+    parser.add_argument(
+        "--output", "-o", type=str,
+        help="JSON file for the results. Default: no JSON file",
+        default=None
+    )
+    parser.add_argument(
+        "--compare", type=str,
+        help="JSON file with results of an earlier run to compare with. Default: none",
+        default=None
+    )
+    args = parser.parse_args()
+
+    numbers_of_points = [int(points) for points in args.points.split(",")]
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        corpus_dir = args.corpus
+        if corpus_dir is None:
+            corpus_dir = temporary_dir
+            make_media_corpus(corpus_dir, args.number)
+        formats = [media_format for media_format in CORPUS_FORMATS
+                   if (Path(corpus_dir) / media_format).is_dir()]
+        results = run_benchmarks(corpus_dir, formats, numbers_of_points)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as json_file:
+            compare_results(results, json.load(json_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+""" Benchmark of plot_map: html file size and generation time against the number of points.
+
+Usage:
+    python benchmark_plot_map.py -p 1000,10000,50000 -r markers,cluster -o benchmark_plot_map.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from media_gpsplot import MARKER_STYLES, plot_map
+
+
+def make_media_files_df(number_of_points, seed=0):
+    """ Makes a dataframe like get_coordinates_from_media_files with random media files.
+
+    Args:
+        number_of_points (int): number of media files
+        seed (int): seed of the random generator
+
+    Returns:
+        dataframe: Dataframe with media files and geolocation data
+    """
+    rng = np.random.default_rng(seed)
+    extensions = rng.choice(list(MARKER_STYLES), size=number_of_points)
+    filenames = [f"/media/photos/{index:08d}.{extension}"
+                 for index, extension in enumerate(extensions)]
+    return pd.DataFrame({
+        "creationdate": pd.Timestamp("2021-08-14") \
+            + pd.to_timedelta(rng.integers(0, 86400 * 365, number_of_points), unit="s"),
+        "latitude": rng.normal(44.7, 0.5, number_of_points),
+        "longitude": rng.normal(5.9, 0.5, number_of_points),
+        "altitude": rng.uniform(0, 2000, number_of_points),
+        "extension": pd.Categorical(extensions),
+    }, index=pd.Index(filenames, name="filename"))
+
+
+def benchmark_plot_map(numbers_of_points, render_modes, logger):
+    """ Runs plot_map for each number of points and render mode.
+
+    Args:
+        numbers_of_points (list): numbers of points to plot
+        render_modes (list): render modes of plot_map
+        logger (logger thing): logger
+
+    Returns:
+        list: dictionary with points, render mode, seconds and bytes per run
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for number_of_points in numbers_of_points:
+            media_files_df = make_media_files_df(number_of_points)
+            for render_mode in render_modes:
+                output_file = os.path.join(output_dir, f"{render_mode}_{number_of_points}.html")
+                start_time = time.perf_counter()
+                plot_map(media_files_df, output_file, logger, render_mode)
+                seconds = time.perf_counter() - start_time
+                result = {"points": number_of_points, "render_mode": render_mode,
+                          "seconds": round(seconds, 3),
+                          "bytes": os.path.getsize(output_file)}
+                print(f"{number_of_points:>8} points  {render_mode:<8} "
+                      f"{result['seconds']:>8.2f} s  {result['bytes'] / 1e6:>8.2f} MB")
+                results.append(result)
+    return results
+
+
+def main():
+    """ Main function of the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description="Measures html file size and generation time of plot_map."
+    )
+    parser.add_argument(
+        "--points", "-p", type=str,
+        help="Numbers of points, comma separated. Default: 1000,10000",
+        default="1000,10000"
+    )
+    parser.add_argument(
+        "--render", "-r", type=str,
+        help="Render modes, comma separated. Default: markers,cluster",
+        default="markers,cluster"
+    )
+    parser.add_argument(
+        "--output", "-o", type=str,
+        help="JSON file for the results. Default: no JSON file",
+        default=None
+    )
+    args = parser.parse_args()
+
+    logger = logging.getLogger()
+    numbers_of_points = [int(points) for points in args.points.split(",")]
+    results = benchmark_plot_map(numbers_of_points, args.render.split(","), logger)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+""" Density grid: the number of media files per cell of a grid over the map, for a heatmap.
+
+    The geolocations are projected to Web Mercator, like the map itself, and counted with
+    one numpy.histogram2d call. The heatmap gets a weighted point per cell that isn't
+    empty, so its size depends on the grid size, not on the number of media files.
+"""
+
+import numpy as np
+from map_tiles import mercator_xy
+
+
+# Cells per side of the density grids, from coarse to fine
+DEFAULT_HEATMAP_GRIDS = (64, 256)
+
+
+def mercator_to_geolocation(x, y):
+    """ Projects Web Mercator coordinates back to latitudes and longitudes.
+
+    Args:
+        x (ndarray): x, from 0 at longitude -180 to 1 at longitude 180
+        y (ndarray): y, from 0 at the north to 1 at the south
+
+    Returns:
+        ndarray: latitudes in degrees
+        ndarray: longitudes in degrees
+    """
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * y))))
+    return latitudes, x * 360.0 - 180.0
+
+
+def density_grid(latitudes, longitudes, grid_size):
+    """ Counts the geolocations per cell of a grid over their bounding box.
+
+    Args:
+        latitudes (ndarray): latitude of every media file
+        longitudes (ndarray): longitude of every media file
+        grid_size (int): number of cells per side of the grid
+
+    Returns:
+        list: [latitude, longitude, weight] of the center of every cell with media files,
+              weight is the number of media files relative to the fullest cell
+    """
+    if len(latitudes) == 0:
+        return []
+    x, y = mercator_xy(latitudes, longitudes)
+    x_range = [x.min(), x.max()]
+    y_range = [y.min(), y.max()]
+    # All media files on one spot: a grid of one cell
+    if x_range[0] == x_range[1]:
+        x_range[1] += 1e-9
+    if y_range[0] == y_range[1]:
+        y_range[1] += 1e-9
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=grid_size, range=[x_range, y_range])
+    x_index, y_index = np.nonzero(counts)
+    cell_latitudes, cell_longitudes = mercator_to_geolocation(
+        (x_edges[x_index] + x_edges[x_index + 1]) / 2,
+        (y_edges[y_index] + y_edges[y_index + 1]) / 2)
+    weights = counts[x_index, y_index] / counts.max()
+    return np.column_stack([np.round(cell_latitudes, 6), np.round(cell_longitudes, 6),
+                            np.round(weights, 4)]).tolist()
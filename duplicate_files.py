@@ -0,0 +1,148 @@
+""" Finds copies of the same media file, like in overlapping backups, before they are read.
+
+    Only files of the same size can be copies. A file with a size that wasn't seen
+    before is passed on right away, without hashing. The files of a size that was seen
+    before are put in buckets by a hash of their first and last PARTIAL_HASH_BYTES bytes,
+    and only the files of a bucket with more than one file get a hash of the whole file.
+    Every lookup is a dictionary lookup, so a folder of many files of the same size, like
+    sidecar files, doesn't make the comparisons quadratic. The first file of a size or a
+    bucket is hashed when the second one comes. Hard links and symlinks to a file that was
+    seen are copies without hashing.
+"""
+
+import hashlib
+import os
+
+
+# Bytes at the start and at the end of a file in the partial hash
+PARTIAL_HASH_BYTES = 64 * 1024
+
+# Bytes read at a time for the full hash
+FULL_HASH_CHUNK = 1024 * 1024
+
+
+class DuplicateFilter:
+    """ Passes on the first file of every set of copies and keeps the paths of the others.
+    """
+    def __init__(self, logger, run_stats=None):
+        """
+        Args:
+            logger (logger thing): logger
+            run_stats (RunStats): counts the copies per format. Default: none
+        """
+        self.logger = logger
+        self.run_stats = run_stats
+        # First file per size. None once the files of the size are in partial hash buckets.
+        self.files_by_size = {}
+        # First file per (size, partial hash). None once the files are in full hash buckets.
+        self.files_by_partial_hash = {}
+        # First file per (size, full hash)
+        self.files_by_full_hash = {}
+        # First file per (device, inode)
+        self.files_by_inode = {}
+        # Paths of the copies, per first file
+        self.duplicates = {}
+        self.duplicate_count = 0
+        self.bytes_hashed = 0
+
+    def read_partial_hash(self, path, size):
+        """ Hashes the first and last PARTIAL_HASH_BYTES bytes of a file.
+
+        Returns:
+            bytes: digest
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as media_file:
+            digest.update(media_file.read(PARTIAL_HASH_BYTES))
+            if size > 2 * PARTIAL_HASH_BYTES:
+                media_file.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+                digest.update(media_file.read(PARTIAL_HASH_BYTES))
+            elif size > PARTIAL_HASH_BYTES:
+                digest.update(media_file.read())
+        self.bytes_hashed += min(size, 2 * PARTIAL_HASH_BYTES)
+        return digest.digest()
+
+    def read_full_hash(self, path, size):
+        """ Hashes a whole file. Small files are whole in the partial hash already.
+
+        Returns:
+            bytes: digest
+        """
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            return self.read_partial_hash(path, size)
+        digest = hashlib.blake2b(digest_size=32)
+        with open(path, "rb") as media_file:
+            while chunk := media_file.read(FULL_HASH_CHUNK):
+                digest.update(chunk)
+        self.bytes_hashed += size
+        return digest.digest()
+
+    def find_original(self, path, file_stat):
+        """ Finds the first file of which a file is a copy.
+
+        Args:
+            path (str): path of the file
+            file_stat (os.stat_result): stat of the file
+
+        Returns:
+            str: path of the first file, or None if the file is not a copy
+        """
+        inode = (file_stat.st_dev, file_stat.st_ino)
+        if inode in self.files_by_inode:
+            return self.files_by_inode[inode]
+        self.files_by_inode[inode] = path
+        size = file_stat.st_size
+        if size not in self.files_by_size:
+            self.files_by_size[size] = path
+            return None
+        first_file = self.files_by_size[size]
+        if first_file is not None:
+            self.files_by_partial_hash[(size, self.read_partial_hash(first_file, size))] = \
+                first_file
+            self.files_by_size[size] = None
+        partial_key = (size, self.read_partial_hash(path, size))
+        if partial_key not in self.files_by_partial_hash:
+            self.files_by_partial_hash[partial_key] = path
+            return None
+        first_file = self.files_by_partial_hash[partial_key]
+        if first_file is not None:
+            self.files_by_full_hash[(size, self.read_full_hash(first_file, size))] = first_file
+            self.files_by_partial_hash[partial_key] = None
+        original = self.files_by_full_hash.setdefault((size, self.read_full_hash(path, size)),
+                                                      path)
+        if original == path:
+            return None
+        self.files_by_inode[inode] = original
+        return original
+
+    def filter(self, media_files):
+        """ Passes on the media files that are not a copy of a media file before them.
+
+        Args:
+            media_files (iterable): (extension, media file) pairs, like from walk_media_files
+
+        Yields:
+            str: extension of media file
+            Path: media file
+        """
+        for extension, media_file in media_files:
+            path = str(media_file)
+            try:
+                original = self.find_original(path, os.stat(path))
+            except OSError as error:
+                # Read like any other media file, which reports the error
+                self.logger.warning('Cannot compare %s: %s', path, error)
+                original = None
+            if original is None:
+                yield extension, media_file
+                continue
+            if original == path:
+                # The same path again, through overlapping media paths
+                continue
+            self.logger.debug('Duplicate of %s: %s', original, path)
+            self.duplicates.setdefault(original, []).append(path)
+            self.duplicate_count += 1
+            if self.run_stats is not None:
+                self.run_stats.count(extension, "duplicates")
+
+# End of class DuplicateFilter
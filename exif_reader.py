@@ -0,0 +1,250 @@
+""" Reads EXIF creationdate and GPS data straight from the file headers.
+
+    Only the bytes of the EXIF block are read, the image itself is never
+    decoded. This is much faster than opening the image with Pillow,
+    especially on network shares.
+
+    read_jpeg_exif returns a dictionary with the same layout as Pillow's Image._getexif():
+    tag numbers as keys and the GPS IFD as a dictionary under GPSInfo (0x8825).
+"""
+
+import struct
+
+from isobmff import BoxFormatError, find_box, iter_file_boxes, read_heif_item_locations, \
+    read_heif_item_references, read_heif_item_types, read_heif_primary_item
+
+
+# Tags we read from IFD0
+TAG_DATETIME = 0x0132
+TAG_GPSINFO = 0x8825
+# Offset of the Exif IFD, with tags like LensModel. Only read for extra tags.
+TAG_EXIF_IFD = 0x8769
+
+# EXIF field types: (struct format character, size in bytes)
+EXIF_TYPES = {
+    1: ("B", 1),   # BYTE
+    2: ("c", 1),   # ASCII
+    3: ("H", 2),   # SHORT
+    4: ("L", 4),   # LONG
+    5: ("L", 8),   # RATIONAL: two LONGs
+    7: ("B", 1),   # UNDEFINED
+    9: ("l", 4),   # SLONG
+    10: ("l", 8),  # SRATIONAL: two SLONGs
+}
+
+# Bytes read from the start of a JPEG file. The EXIF block is almost always
+# in the first APP1 segment, right after the start of the file.
+JPEG_HEADER_SIZE = 16 * 1024
+
+
+class ExifFormatError(ValueError):
+    """ Raised when the EXIF data or file header can't be parsed.
+    """
+
+
+def read_ifd_value(tiff_data, byte_order, field_type, count, value_field, value_offset):
+    """ Reads the value of one IFD entry.
+
+    Args:
+        tiff_data (bytes): TIFF block with EXIF data
+        byte_order (str): '<' or '>'
+        field_type (int): EXIF field type
+        count (int): number of values
+        value_field (bytes): the 4 byte value field of the IFD entry
+        value_offset (int): value field read as offset
+
+    Returns:
+        str, bytes, float, int or tuple: value of the entry
+    """
+    type_format, type_size = EXIF_TYPES[field_type]
+    size = type_size * count
+    if size <= 4:
+        data = value_field[:size]
+    else:
+        data = tiff_data[value_offset:value_offset + size]
+        if len(data) < size:
+            raise ExifFormatError("IFD value outside of EXIF block")
+    if field_type == 2:
+        return data.split(b"\x00", 1)[0].decode("ascii", errors="replace")
+    if field_type in (1, 7):
+        return bytes(data)
+    if field_type in (5, 10):
+        numbers = struct.unpack(f"{byte_order}{2 * count}{type_format}", data)
+        values = tuple(numerator / denominator if denominator else 0.0 \
+                       for numerator, denominator in zip(numbers[0::2], numbers[1::2]))
+    else:
+        values = struct.unpack(f"{byte_order}{count}{type_format}", data)
+    if count == 1:
+        return values[0]
+    return values
+
+
+def read_ifd(tiff_data, byte_order, ifd_offset, wanted_tags=None):
+    """ Reads the entries of one IFD.
+
+    Args:
+        tiff_data (bytes): TIFF block with EXIF data
+        byte_order (str): '<' or '>'
+        ifd_offset (int): offset of the IFD in the TIFF block
+        wanted_tags (set): only read these tags. Default: all tags
+
+    Returns:
+        dict: tag number: value
+    """
+    if ifd_offset + 2 > len(tiff_data):
+        raise ExifFormatError("IFD outside of EXIF block")
+    (entry_count,) = struct.unpack_from(f"{byte_order}H", tiff_data, ifd_offset)
+    if ifd_offset + 2 + entry_count * 12 > len(tiff_data):
+        raise ExifFormatError("IFD entries outside of EXIF block")
+    ifd = {}
+    for entry in range(entry_count):
+        entry_offset = ifd_offset + 2 + entry * 12
+        tag, field_type, count = struct.unpack_from(f"{byte_order}HHL", tiff_data, entry_offset)
+        if wanted_tags is not None and tag not in wanted_tags or field_type not in EXIF_TYPES:
+            continue
+        value_field = tiff_data[entry_offset + 8:entry_offset + 12]
+        (value_offset,) = struct.unpack(f"{byte_order}L", value_field)
+        ifd[tag] = read_ifd_value(tiff_data, byte_order, field_type, count,
+                                  value_field, value_offset)
+    return ifd
+
+
+def parse_tiff_exif(tiff_data, extra_tags=()):
+    """ Parses the DateTime of IFD0 and the GPS IFD from an EXIF TIFF block.
+        Extra tags are looked up in IFD0 and in the Exif IFD. Like Pillow, the tags
+        of the Exif IFD are put next to the tags of IFD0.
+
+    Args:
+        tiff_data (bytes): TIFF block, starting with II or MM
+        extra_tags (iterable): numbers of other tags to read, like 0x0110 (Model)
+
+    Returns:
+        dict: EXIF data, in the layout of Pillow's Image._getexif()
+    """
+    if tiff_data[:4] == b"II*\x00":
+        byte_order = "<"
+    elif tiff_data[:4] == b"MM\x00*":
+        byte_order = ">"
+    else:
+        raise ExifFormatError("No TIFF header in EXIF block")
+    (ifd0_offset,) = struct.unpack_from(f"{byte_order}L", tiff_data, 4)
+    extra_tags = set(extra_tags)
+    wanted_tags = {TAG_DATETIME, TAG_GPSINFO} | extra_tags
+    if extra_tags:
+        wanted_tags.add(TAG_EXIF_IFD)
+    exif = read_ifd(tiff_data, byte_order, ifd0_offset, wanted_tags)
+    if isinstance(exif.get(TAG_GPSINFO), int):
+        exif[TAG_GPSINFO] = read_ifd(tiff_data, byte_order, exif[TAG_GPSINFO])
+    if isinstance(exif.get(TAG_EXIF_IFD), int):
+        exif_ifd = read_ifd(tiff_data, byte_order, exif[TAG_EXIF_IFD], extra_tags)
+        exif.update((tag, value) for tag, value in exif_ifd.items() if tag not in exif)
+    return exif
+
+
+def read_jpeg_exif(mediafile_location_disk, extra_tags=()):
+    """ Reads the EXIF data of a JPEG file without reading the image.
+        Walks the JPEG markers up to the APP1 segment with the EXIF data.
+
+    Args:
+        mediafile_location_disk (str): path and name of JPEG file
+        extra_tags (iterable): numbers of tags to read next to DateTime and the GPS IFD
+
+    Returns:
+        dict: EXIF data, or None if the file has no EXIF data
+    """
+    with open(mediafile_location_disk, "rb") as jpeg_file:
+        header = jpeg_file.read(JPEG_HEADER_SIZE)
+
+        def read_bytes(offset, size):
+            # Read from the header if possible, otherwise from the file
+            if offset + size <= len(header):
+                return header[offset:offset + size]
+            jpeg_file.seek(offset)
+            return jpeg_file.read(size)
+
+        if header[:2] != b"\xff\xd8":
+            raise ExifFormatError("No JPEG start of image marker")
+        position = 2
+        while True:
+            marker_bytes = read_bytes(position, 4)
+            if len(marker_bytes) < 4:
+                raise ExifFormatError("End of file before EXIF block")
+            if marker_bytes[0] != 0xFF:
+                raise ExifFormatError("Invalid JPEG marker")
+            marker = marker_bytes[1]
+            if marker == 0xFF:
+                # Fill byte
+                position += 1
+                continue
+            if marker in (0xDA, 0xD9):
+                # Start of scan or end of image: the image data starts, no EXIF block found
+                return None
+            (segment_length,) = struct.unpack(">H", marker_bytes[2:])
+            if marker == 0xE1:
+                segment = read_bytes(position + 4, segment_length - 2)
+                if segment[:6] == b"Exif\x00\x00":
+                    return parse_tiff_exif(segment[6:], extra_tags)
+            position += 2 + segment_length
+
+
+def read_heic_exif_data(mediafile_location_disk):
+    """ Reads the EXIF block of a HEIC file without reading the image.
+        Finds the Exif item of the primary image through the pitm, iinf, iref
+        and iloc boxes in the meta box, and reads only its bytes.
+
+    Args:
+        mediafile_location_disk (str): path and name of HEIC file
+
+    Returns:
+        bytes: EXIF TIFF block, starting with II or MM, or None if the file has no EXIF data
+    """
+    try:
+        with open(mediafile_location_disk, "rb") as heic_file:
+            meta = None
+            for box_type, payload_start, box_end in iter_file_boxes(heic_file):
+                if box_type == "meta":
+                    heic_file.seek(payload_start)
+                    meta = heic_file.read(box_end - payload_start)
+                    break
+            if meta is None:
+                raise ExifFormatError("No meta box in HEIC file")
+            # meta is a full box: its children start after version and flags
+            children_start = 4
+            item_types = read_heif_item_types(meta, children_start, len(meta))
+            exif_items = [item_id for item_id, item_type in item_types.items() \
+                          if item_type == "Exif"]
+            if not exif_items:
+                return None
+            # Prefer the Exif item that describes the primary image
+            primary_item = read_heif_primary_item(meta, children_start, len(meta))
+            descriptions = read_heif_item_references(meta, children_start, len(meta), "cdsc")
+            exif_item = exif_items[0]
+            for item_id in exif_items:
+                if primary_item in descriptions.get(item_id, []):
+                    exif_item = item_id
+                    break
+            item_locations = read_heif_item_locations(meta, children_start, len(meta))
+            if exif_item not in item_locations:
+                raise ExifFormatError("No location of Exif item in HEIC file")
+            construction_method, extents = item_locations[exif_item]
+            if construction_method == 0:
+                exif_data = b""
+                for extent_offset, extent_length in extents:
+                    heic_file.seek(extent_offset)
+                    exif_data += heic_file.read(extent_length if extent_length else -1)
+            elif construction_method == 1:
+                idat = find_box(meta, ["idat"], children_start)
+                if idat is None:
+                    raise ExifFormatError("No idat box in HEIC file")
+                exif_data = b"".join(meta[idat[0] + extent_offset:
+                                          idat[0] + extent_offset + extent_length]
+                                     for extent_offset, extent_length in extents)
+            else:
+                raise ExifFormatError("Unsupported construction method of Exif item")
+    except BoxFormatError as error:
+        raise ExifFormatError(str(error)) from error
+    # The Exif item starts with the offset of the TIFF header
+    if len(exif_data) < 4:
+        raise ExifFormatError("Exif item too short")
+    (tiff_header_offset,) = struct.unpack(">L", exif_data[:4])
+    return exif_data[4 + tiff_header_offset:]
@@ -0,0 +1,271 @@
+""" Pool of long-running exiftool processes, for formats without a native reader like AVCHD .MTS.
+
+    Each worker is started once with -stay_open True -@ - and gets its
+    commands over stdin. That saves starting exiftool (and Perl) for every file.
+"""
+
+import json
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+# Tags read by ExiftoolPool.read_gps. With -n the composite GPS tags are signed decimals.
+GPS_TAGS = ["-Composite:GPSLatitude", "-Composite:GPSLongitude", "-Composite:GPSAltitude",
+            "-DateTimeOriginal", "-CreateDate"]
+
+# Tags read by ExiftoolPool.read_tracks, per embedded document (-ee -G3). The composite
+# tags aren't made for every document, so the references are read as well.
+TRACK_TAGS = ["-GPSLatitude", "-GPSLatitudeRef", "-GPSLongitude", "-GPSLongitudeRef",
+              "-GPSAltitude", "-GPSAltitudeRef", "-GPSDateTime", "-DateTimeOriginal"]
+
+
+class ExiftoolError(RuntimeError):
+    """ Raised when exiftool stops or gives output that can't be read.
+    """
+
+
+class ExiftoolWorker:
+    """ One exiftool process in -stay_open mode.
+    """
+    def __init__(self, exiftool_command="exiftool"):
+        self.process = subprocess.Popen(
+            [exiftool_command, "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def execute(self, exiftool_arguments):
+        """ Runs one exiftool command and waits for its output.
+
+        Args:
+            exiftool_arguments (list): arguments, like ["-j", "-n", "file.MTS"]
+
+        Returns:
+            bytes: output of exiftool
+        """
+        command = "\n".join(str(argument) for argument in exiftool_arguments)
+        self.process.stdin.write(f"{command}\n-execute\n".encode("utf-8"))
+        self.process.stdin.flush()
+        output = []
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise ExiftoolError("exiftool stopped")
+            if line.strip() == b"{ready}":
+                return b"".join(output)
+            output.append(line)
+
+    def close(self):
+        """ Stops the exiftool process.
+        """
+        try:
+            self.process.stdin.write(b"-stay_open\nFalse\n")
+            self.process.stdin.flush()
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+# End of class ExiftoolWorker
+
+
+class ExiftoolPool:
+    """ Pool of exiftool workers. Files are sent to the workers in batches.
+    """
+    def __init__(self, logger, number_of_workers=1, exiftool_command="exiftool", batch_size=50):
+        self.logger = logger
+        self.exiftool_command = exiftool_command
+        self.batch_size = batch_size
+        self.number_of_workers = max(1, number_of_workers)
+        self.workers = []
+        self.idle_workers = []
+        self.lock = threading.Lock()
+
+    def get_worker(self):
+        """ Gets an idle worker, or starts a new one.
+
+        Returns:
+            ExiftoolWorker: worker
+        """
+        with self.lock:
+            if self.idle_workers:
+                return self.idle_workers.pop()
+        self.logger.debug('Starting exiftool worker: %s', self.exiftool_command)
+        worker = ExiftoolWorker(self.exiftool_command)
+        with self.lock:
+            self.workers.append(worker)
+        return worker
+
+    def execute_json(self, exiftool_arguments, media_files):
+        """ Runs exiftool with JSON output on a batch of media files.
+
+        Args:
+            exiftool_arguments (list): exiftool arguments, without the files
+            media_files (list): media files
+
+        Returns:
+            list: dictionary with tags per media file, None if exiftool gave no output for a file
+        """
+        worker = self.get_worker()
+        try:
+            output = worker.execute(["-j", "-charset", "filename=utf8", *exiftool_arguments,
+                                     *media_files])
+        except (OSError, ExiftoolError):
+            # Don't give a broken worker out again
+            worker.close()
+            with self.lock:
+                self.workers.remove(worker)
+            raise
+        with self.lock:
+            self.idle_workers.append(worker)
+        try:
+            exiftool_results = json.loads(output) if output.strip() else []
+        except ValueError as error:
+            raise ExiftoolError(f"Invalid JSON from exiftool: {error}") from error
+        # exiftool writes paths with forward slashes
+        results_by_file = {result.get("SourceFile"): result for result in exiftool_results}
+        return [results_by_file.get(str(media_file).replace("\\", "/")) for media_file in media_files]
+
+    def map_batches(self, function, media_files):
+        """ Runs function on batches of media files, spread over the workers.
+
+        Args:
+            function (callable): function that gets a batch and returns a list of results
+            media_files (list): media files
+
+        Returns:
+            list: results in the order of media_files
+        """
+        batches = [media_files[start:start + self.batch_size]
+                   for start in range(0, len(media_files), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.number_of_workers) as executor:
+            batch_results = list(executor.map(function, batches))
+        return [result for batch_result in batch_results for result in batch_result]
+
+    def read_gps(self, media_files):
+        """ Reads creationdate and first GPS location of media files.
+
+        Args:
+            media_files (list): media files
+
+        Returns:
+            list: (creationdate, geolocation, error) per media file. geolocation is
+                  (latitude, longitude, altitude) or None, error is None if the file was read.
+        """
+        def read_gps_batch(batch):
+            try:
+                exiftool_results = self.execute_json(["-n", "-ee", *GPS_TAGS], batch)
+            except (OSError, ExiftoolError) as error:
+                self.logger.error('exiftool failed: %r', error)
+                return [(None, None, repr(error))] * len(batch)
+            return [gps_from_exiftool_result(result) for result in exiftool_results]
+
+        return self.map_batches(read_gps_batch, media_files)
+
+    def read_tracks(self, media_files):
+        """ Reads all GPS points of media files, like the GPS point of every frame of a .MTS video.
+
+        Args:
+            media_files (list): media files
+
+        Returns:
+            list: (times, gps_points) per media file, see track_from_exiftool_result.
+                  (None, None) if the file has no GPS points or can't be read.
+        """
+        def read_tracks_batch(batch):
+            try:
+                exiftool_results = self.execute_json(["-n", "-ee", "-G3", *TRACK_TAGS], batch)
+            except (OSError, ExiftoolError) as error:
+                self.logger.error('exiftool failed: %r', error)
+                return [(None, None)] * len(batch)
+            return [track_from_exiftool_result(result) for result in exiftool_results]
+
+        return self.map_batches(read_tracks_batch, media_files)
+
+    def close(self):
+        """ Stops all workers.
+        """
+        with self.lock:
+            workers = self.workers
+            self.workers = []
+            self.idle_workers = []
+        for worker in workers:
+            worker.close()
+
+# End of class ExiftoolPool
+
+
+def gps_from_exiftool_result(exiftool_result):
+    """ Gets creationdate and geolocation from the exiftool output of one file.
+
+    Args:
+        exiftool_result (dict): tags of one file, from exiftool -j -n
+
+    Returns:
+        str: creationdate, like 2021:08:14 11:27:22
+        tuple: latitude, longitude, altitude or None
+        str: error or None
+    """
+    if exiftool_result is None:
+        return None, None, "No output from exiftool"
+    if "Error" in exiftool_result:
+        return None, None, exiftool_result["Error"]
+    creationdate = exiftool_result.get("DateTimeOriginal", exiftool_result.get("CreateDate"))
+    if creationdate is not None:
+        creationdate = str(creationdate)
+    try:
+        geolocation = (float(exiftool_result["GPSLatitude"]),
+                       float(exiftool_result["GPSLongitude"]),
+                       float(exiftool_result.get("GPSAltitude", 0)))
+    except (KeyError, TypeError, ValueError):
+        geolocation = None
+    return creationdate, geolocation, None
+
+
+def track_from_exiftool_result(exiftool_result):
+    """ Gets the GPS points of the embedded documents from the exiftool output of one file.
+
+    Args:
+        exiftool_result (dict): tags of one file, from exiftool -j -n -ee -G3.
+                                Keys are like Doc12:GPSLatitude.
+
+    Returns:
+        ndarray: time per GPS point (datetime64[ms]), NaT if unknown
+        ndarray: latitude, longitude, altitude per GPS point
+        Both are None if there are no GPS points.
+    """
+    if exiftool_result is None or "Error" in exiftool_result:
+        return None, None
+    documents = {}
+    for key, value in exiftool_result.items():
+        document, _, tag = key.rpartition(":")
+        if document.startswith("Doc"):
+            documents.setdefault(document, {})[tag] = value
+    times = []
+    gps_points = []
+    for document in sorted(documents, key=lambda name: [int(part) for part in name[3:].split("-") if part.isdigit()]):
+        tags = documents[document]
+        try:
+            latitude = float(tags["GPSLatitude"])
+            longitude = float(tags["GPSLongitude"])
+            altitude = float(tags.get("GPSAltitude", 0))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if tags.get("GPSLatitudeRef") == "S":
+            latitude = -abs(latitude)
+        if tags.get("GPSLongitudeRef") == "W":
+            longitude = -abs(longitude)
+        if str(tags.get("GPSAltitudeRef")) == "1":
+            altitude = -abs(altitude)
+        # Like 2013:07:01 10:00:00Z. Only the date and time are used.
+        gps_time = str(tags.get("GPSDateTime", tags.get("DateTimeOriginal", "")))[:19]
+        times.append(gps_time[:10].replace(":", "-") + "T" + gps_time[11:] if gps_time else "NaT")
+        gps_points.append((latitude, longitude, altitude))
+    if not gps_points:
+        return None, None
+    try:
+        track_times = np.array(times, dtype="datetime64[ms]")
+    except ValueError:
+        track_times = np.full(len(times), np.datetime64("NaT"), dtype="datetime64[ms]")
+    return track_times, np.array(gps_points, dtype=np.float64)
@@ -0,0 +1,219 @@
+""" Watches directories for new, changed and removed files.
+
+    On Linux the directories are watched with inotify (through ctypes, no extra package):
+    the process sleeps until the kernel reports a change, so it uses no CPU while nothing
+    happens. Elsewhere, or when inotify can't be used, the directories are scanned every
+    POLL_INTERVAL seconds and compared with the previous scan.
+
+    Changes come in bursts, like when a memory card is copied. After the first change
+    the watcher waits until there are no changes for DEBOUNCE_SECONDS, but not longer
+    than MAX_DEBOUNCE_SECONDS, and reports the burst at once.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+
+# Quiet time in seconds that ends a burst of changes
+DEBOUNCE_SECONDS = 0.5
+
+# Maximum time in seconds changes are held back while a burst goes on
+MAX_DEBOUNCE_SECONDS = 2.0
+
+# Seconds between two scans of the polling watcher
+POLL_INTERVAL = 2.0
+
+# inotify event masks, from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE \
+    | IN_DELETE_SELF
+
+# struct inotify_event: wd, mask, cookie, len, followed by the name
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class FileChanges:
+    """ Files changed in a burst.
+
+        changed: paths of new and changed files
+        removed: paths of removed files and directories
+        rescan: True if changes were lost, then everything has to be scanned again
+    """
+    def __init__(self):
+        self.changed = set()
+        self.removed = set()
+        self.rescan = False
+
+    def __bool__(self):
+        return bool(self.changed or self.removed or self.rescan)
+
+# End of class FileChanges
+
+
+class InotifyWatcher:
+    """ Watches directory trees with inotify (Linux).
+    """
+    def __init__(self, directories, logger):
+        self.logger = logger
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.inotify_add_watch = libc.inotify_add_watch
+        self.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.inotify_fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Directory per watch descriptor
+        self.watched_directories = {}
+        for directory in directories:
+            self.watch_tree(directory, None)
+
+    def watch_tree(self, directory, changes):
+        """ Watches a directory and its subdirectories.
+
+        Args:
+            directory (str): directory
+            changes (FileChanges): gets the files already in the directory, for a
+                                   directory that was added while watching. Default: none
+        """
+        for current_directory, _, filenames in os.walk(directory):
+            watch_descriptor = self.inotify_add_watch(self.inotify_fd,
+                                                      os.fsencode(current_directory), WATCH_MASK)
+            if watch_descriptor < 0:
+                error_number = ctypes.get_errno()
+                self.logger.warning('Cannot watch %s: %s', current_directory,
+                                    os.strerror(error_number))
+                continue
+            self.watched_directories[watch_descriptor] = current_directory
+            if changes is not None:
+                changes.changed.update(os.path.join(current_directory, filename)
+                                       for filename in filenames)
+
+    def read_events(self, changes):
+        """ Reads the waiting inotify events into changes.
+
+        Args:
+            changes (FileChanges): changes of the burst
+        """
+        try:
+            data = os.read(self.inotify_fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            watch_descriptor, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + name_length]
+            offset += INOTIFY_EVENT.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                changes.rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self.watched_directories.pop(watch_descriptor, None)
+                continue
+            directory = self.watched_directories.get(watch_descriptor)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name.rstrip(b"\0")))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.watch_tree(path, changes)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changes.removed.add(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changes.changed.add(path)
+                changes.removed.discard(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changes.removed.add(path)
+                changes.changed.discard(path)
+
+    def wait_for_changes(self):
+        """ Sleeps until files change, then collects the burst of changes.
+
+        Returns:
+            FileChanges: changes of the burst
+        """
+        changes = FileChanges()
+        while not changes:
+            select.select([self.inotify_fd], [], [])
+            self.read_events(changes)
+        burst_end = time.monotonic() + MAX_DEBOUNCE_SECONDS
+        while True:
+            timeout = min(DEBOUNCE_SECONDS, burst_end - time.monotonic())
+            if timeout <= 0 or not select.select([self.inotify_fd], [], [], timeout)[0]:
+                return changes
+            self.read_events(changes)
+
+    def close(self):
+        os.close(self.inotify_fd)
+
+# End of class InotifyWatcher
+
+
+class PollingWatcher:
+    """ Watches files by scanning them every POLL_INTERVAL seconds.
+    """
+    def __init__(self, snapshot, logger, interval=POLL_INTERVAL):
+        """
+        Args:
+            snapshot (function): returns {path: (size, mtime_ns)} of the watched files
+            logger (logger thing): logger
+            interval (float): seconds between two scans
+        """
+        self.snapshot = snapshot
+        self.logger = logger
+        self.interval = interval
+        self.files = snapshot()
+
+    def wait_for_changes(self):
+        """ Scans the files until some changed. Changes within one scan form a burst.
+
+        Returns:
+            FileChanges: changes of the burst
+        """
+        changes = FileChanges()
+        while not changes:
+            time.sleep(self.interval)
+            files = self.snapshot()
+            changes.changed.update(path for path, signature in files.items()
+                                   if self.files.get(path) != signature)
+            changes.removed.update(path for path in self.files if path not in files)
+            self.files = files
+        return changes
+
+    def close(self):
+        pass
+
+# End of class PollingWatcher
+
+
+def open_file_watcher(directories, snapshot, logger, polling=False):
+    """ Opens an inotify watcher, or a polling watcher if inotify can't be used.
+
+    Args:
+        directories (list): directories to watch, with their subdirectories
+        snapshot (function): returns {path: (size, mtime_ns)} of the watched files,
+                             for the polling watcher
+        logger (logger thing): logger
+        polling (bool): always use the polling watcher
+
+    Returns:
+        InotifyWatcher or PollingWatcher: file watcher
+    """
+    if not polling:
+        try:
+            return InotifyWatcher([str(directory) for directory in directories], logger)
+        except (OSError, AttributeError) as error:
+            # AttributeError: the C library has no inotify functions
+            logger.warning('inotify not available, polling for changes: %s', error)
+            print(f"inotify not available, polling for changes every {POLL_INTERVAL:g} s")
+    return PollingWatcher(snapshot, logger)
@@ -0,0 +1,213 @@
+""" Converts raw GPS coordinates of many media files to decimals in one NumPy pass.
+
+    The readers of the media files don't convert coordinates themselves. They give
+    a raw geolocation: (latitude, latitude ref, longitude, longitude ref, altitude,
+    altitude ref), as found in the file. A latitude or longitude can be:
+    * degrees, minutes, seconds as EXIF rationals, like ((45, 1), (4, 1), (870, 100))
+    * degrees, minutes, seconds as numbers, like (45.0, 4.0, 8.7)
+    * degrees, minutes, seconds as a string, like '45:4:8.7' (Sony XML)
+    * a signed decimal number, like 45.069 (MP4 videos, exiftool)
+    The altitude is a rational, a number or a string.
+    The refs are 'N', 'S', 'E', 'W' (or bytes) and 0 or 1 for the altitude (1 is below sea level).
+"""
+
+from array import array
+
+import numpy as np
+
+
+# Refs that make a coordinate negative
+NEGATIVE_REFS = {"S", "W", b"S", b"W", 1, "1", b"\x01"}
+
+
+def split_rational(value):
+    """ Splits a rational into numerator and denominator.
+
+    Args:
+        value: (numerator, denominator), a number or a string with a number
+
+    Returns:
+        float: numerator
+        float: denominator
+    """
+    if isinstance(value, (tuple, list)):
+        return float(value[0]), float(value[1])
+    return float(value), 1.0
+
+
+def parse_dms_string(text):
+    """ Parses one degrees, minutes, seconds string.
+
+    Args:
+        text (str): like '45:4:8.7'
+
+    Returns:
+        list: degrees, minutes, seconds. NaN if the string can't be parsed.
+    """
+    try:
+        degrees, minutes, seconds = text.split(":")
+        return [float(degrees), float(minutes), float(seconds)]
+    except ValueError:
+        return [np.nan] * 3
+
+
+def raw_geolocation_from_decimals(geolocation):
+    """ Makes a raw geolocation of a geolocation that is already in decimals.
+
+    Args:
+        geolocation (tuple): latitude, longitude, altitude or None
+
+    Returns:
+        tuple: raw geolocation without refs, or None
+    """
+    if geolocation is None:
+        return None
+    latitude, longitude, altitude = geolocation
+    return latitude, None, longitude, None, altitude, None
+
+
+class RawGeolocationBuffer:
+    """ Collects raw geolocations column by column, and converts them all at once.
+        Per geolocation there are 7 numerators and denominators: degrees, minutes
+        and seconds of the latitude and longitude, and the altitude.
+    """
+    def __init__(self):
+        self.numerators = array('d')
+        self.denominators = array('d')
+        self.signs = array('d')
+        # Degrees, minutes, seconds strings: (position of the degrees, string)
+        self.dms_strings = []
+        self.has_geolocation = array('b')
+
+    def __len__(self):
+        return len(self.has_geolocation)
+
+    def append_coordinate(self, coordinate):
+        """ Adds degrees, minutes and seconds of a latitude or longitude.
+
+        Args:
+            coordinate: latitude or longitude, see the module docstring
+        """
+        if isinstance(coordinate, str):
+            # Parsed later together with the other strings
+            self.dms_strings.append((len(self.numerators), coordinate))
+            self.numerators.extend((0.0, 0.0, 0.0))
+            self.denominators.extend((1.0, 1.0, 1.0))
+        elif isinstance(coordinate, (tuple, list)):
+            for value in coordinate:
+                numerator, denominator = split_rational(value)
+                self.numerators.append(numerator)
+                self.denominators.append(denominator)
+        else:
+            self.numerators.extend((float(coordinate), 0.0, 0.0))
+            self.denominators.extend((1.0, 1.0, 1.0))
+
+    def append(self, raw_geolocation):
+        """ Adds the raw geolocation of one media file.
+
+        Args:
+            raw_geolocation (tuple): raw geolocation, see the module docstring, or None
+        """
+        start = len(self.numerators)
+        strings_start = len(self.dms_strings)
+        try:
+            if raw_geolocation is None:
+                raise ValueError("No geolocation")
+            latitude, latitude_ref, longitude, longitude_ref, altitude, altitude_ref = \
+                raw_geolocation
+            self.append_coordinate(latitude)
+            self.append_coordinate(longitude)
+            altitude_numerator, altitude_denominator = split_rational(altitude or 0)
+            self.numerators.append(altitude_numerator)
+            self.denominators.append(altitude_denominator)
+            if len(self.numerators) != start + 7:
+                raise ValueError("Coordinate without degrees, minutes and seconds")
+        except (TypeError, ValueError, IndexError):
+            # Keep the columns aligned, the geolocation is flagged as missing
+            del self.numerators[start:], self.denominators[start:]
+            del self.dms_strings[strings_start:]
+            self.numerators.extend([np.nan] * 7)
+            self.denominators.extend([1.0] * 7)
+            self.signs.extend((1.0, 1.0, 1.0))
+            self.has_geolocation.append(0)
+            return
+        self.signs.extend((-1.0 if latitude_ref in NEGATIVE_REFS else 1.0,
+                           -1.0 if longitude_ref in NEGATIVE_REFS else 1.0,
+                           -1.0 if altitude_ref in NEGATIVE_REFS else 1.0))
+        self.has_geolocation.append(1)
+
+    def parse_dms_strings(self, numerators):
+        """ Parses all degrees, minutes, seconds strings into the numerators.
+
+        Args:
+            numerators (ndarray): numerators, 7 per geolocation
+        """
+        if not self.dms_strings:
+            return
+        positions = np.array([position for position, _ in self.dms_strings], dtype=np.intp)
+        texts = [text for _, text in self.dms_strings]
+        values = None
+        if all(text.count(":") == 2 for text in texts):
+            # One parse of all strings, string by string only if one of them is not a number
+            try:
+                values = np.array(":".join(texts).split(":"), dtype=np.float64).reshape(-1, 3)
+            except ValueError:
+                values = None
+        if values is None:
+            values = np.array([parse_dms_string(text) for text in texts])
+        for column in range(3):
+            numerators[positions + column] = values[:, column]
+
+    def convert(self):
+        """ Converts all geolocations to decimals.
+
+        Returns:
+            ndarray: latitudes in decimal degrees
+            ndarray: longitudes in decimal degrees
+            ndarray: altitudes in meters
+            ndarray: True for a valid geolocation, False for a missing, unreadable or out
+                     of range one
+            ndarray: True for a geolocation with numbers, also when it is out of range
+        """
+        numerators = np.frombuffer(self.numerators, dtype=np.float64).copy()
+        self.parse_dms_strings(numerators)
+        denominators = np.frombuffer(self.denominators, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = (numerators / denominators).reshape(-1, 7)
+        signs = np.frombuffer(self.signs, dtype=np.float64).reshape(-1, 3)
+        latitudes = (values[:, 0] + values[:, 1] / 60 + values[:, 2] / 3600) * signs[:, 0]
+        longitudes = (values[:, 3] + values[:, 4] / 60 + values[:, 5] / 3600) * signs[:, 1]
+        # Altitudes that are already negative don't have a ref
+        altitudes = np.where(signs[:, 2] < 0, -np.abs(values[:, 6]), values[:, 6])
+        parsed = np.frombuffer(self.has_geolocation, dtype=np.int8).astype(bool) & \
+            np.isfinite(latitudes) & np.isfinite(longitudes)
+        valid = parsed & (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180)
+        altitudes = np.where(np.isfinite(altitudes), altitudes, 0.0)
+        return latitudes, longitudes, altitudes, valid, parsed
+
+# End of class RawGeolocationBuffer
+
+
+def convert_geolocations(raw_geolocations):
+    """ Converts raw geolocations to (latitude, longitude, altitude) tuples in decimals.
+
+    Args:
+        raw_geolocations (list): raw geolocation or None per media file
+
+    Returns:
+        list: (latitude, longitude, altitude) or None per media file
+        list: True per geolocation that was given but out of range
+        list: True per geolocation that was given but can't be read, like '45:4:x'
+    """
+    geolocation_buffer = RawGeolocationBuffer()
+    for raw_geolocation in raw_geolocations:
+        geolocation_buffer.append(raw_geolocation)
+    latitudes, longitudes, altitudes, valid, parsed = geolocation_buffer.convert()
+    geolocations = [(latitude, longitude, altitude) if is_valid else None
+                    for latitude, longitude, altitude, is_valid in
+                    zip(latitudes.tolist(), longitudes.tolist(), altitudes.tolist(),
+                        valid.tolist())]
+    out_of_range = (parsed & ~valid).tolist()
+    unreadable = [raw_geolocation is not None and not is_parsed
+                  for raw_geolocation, is_parsed in zip(raw_geolocations, parsed.tolist())]
+    return geolocations, out_of_range, unreadable
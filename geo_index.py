@@ -0,0 +1,86 @@
+""" Geo index: the table with geolocations of media files, saved in a columnar file.
+
+    With a geo index the map can be made again, with other settings, without
+    reading the media files again. Formats, by extension of the index file:
+    * .feather (Arrow IPC, uncompressed): read with memory mapping, the fastest
+    * .parquet: smaller, for keeping or sharing
+    Both need pyarrow. Coordinates are stored as float64, creationdate as timestamp
+    and extension as a dictionary (categorical) column.
+"""
+
+from pathlib import Path
+
+
+# Columns every geo index has. Extra fields are stored after these.
+GEO_INDEX_COLUMNS = ["filename", "creationdate", "latitude", "longitude", "altitude", "extension"]
+
+GEO_INDEX_FORMATS = (".feather", ".parquet")
+
+
+class GeoIndexError(ValueError):
+    """ Raised when a geo index file can't be written or read.
+    """
+
+
+def get_geo_index_format(index_file):
+    """ Gets the format of a geo index file from its extension.
+
+    Args:
+        index_file (str): geo index file
+
+    Returns:
+        str: '.feather' or '.parquet'
+    """
+    suffix = Path(index_file).suffix.lower()
+    if suffix not in GEO_INDEX_FORMATS:
+        raise GeoIndexError(f"Unknown geo index format {suffix!r}."
+                            f" Use one of {', '.join(GEO_INDEX_FORMATS)}")
+    return suffix
+
+
+def write_geo_index(media_files_df, index_file):
+    """ Writes the dataframe with geolocations to a geo index file.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data,
+                                    indexed by filename
+        index_file (str): geo index file, .feather or .parquet
+    """
+    index_format = get_geo_index_format(index_file)
+    geo_index_df = media_files_df.reset_index()
+    # Extra fields can be a mix of numbers and strings, Arrow needs one type per column
+    for column in geo_index_df.columns.difference(GEO_INDEX_COLUMNS):
+        geo_index_df[column] = geo_index_df[column].map(str) \
+            .where(geo_index_df[column].notna()).astype("string")
+    if index_format == ".feather":
+        # Uncompressed, so it can be memory mapped when it is read
+        geo_index_df.to_feather(index_file, compression="uncompressed")
+    else:
+        geo_index_df.to_parquet(index_file, index=False)
+
+
+def read_geo_index(index_file):
+    """ Reads a geo index file.
+
+    Args:
+        index_file (str): geo index file, .feather or .parquet
+
+    Returns:
+        dataframe: Dataframe with media files and geolocation data, indexed by filename
+    """
+    index_format = get_geo_index_format(index_file)
+    if index_format == ".feather":
+        # pyarrow is only needed for geo index files
+        import pyarrow.feather
+
+        geo_index_df = pyarrow.feather.read_table(index_file, memory_map=True).to_pandas()
+    else:
+        import pandas as pd
+
+        geo_index_df = pd.read_parquet(index_file)
+    missing_columns = [column for column in GEO_INDEX_COLUMNS
+                       if column not in geo_index_df.columns]
+    if missing_columns:
+        raise GeoIndexError(f"Not a geo index, missing columns: {', '.join(missing_columns)}")
+    geo_index_df["extension"] = geo_index_df["extension"].astype("category")
+    return geo_index_df.set_index("filename")
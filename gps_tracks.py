@@ -0,0 +1,137 @@
+""" GPS tracks of videos, as NumPy arrays, and simplification of tracks before plotting.
+
+    Action cams write a GPS point per second or more often. An hour of 10 Hz GPS
+    is 36000 points, far more than a map needs. Tracks are first thinned out by
+    distance and then simplified with Douglas-Peucker, which keeps the shape.
+"""
+
+import numpy as np
+
+
+# Mean radius of the earth in meters
+EARTH_RADIUS = 6371000.0
+
+
+class GPSTrack:
+    """ GPS track of one media file.
+    """
+    def __init__(self, filename, times, latitudes, longitudes, altitudes):
+        self.filename = filename
+        self.times = np.asarray(times, dtype="datetime64[ms]")
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.altitudes = np.asarray(altitudes, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def select(self, mask):
+        """ Makes a track with a subset of the points.
+
+        Args:
+            mask (ndarray): boolean mask or indexes of the points to keep
+
+        Returns:
+            GPSTrack: track with the selected points
+        """
+        return GPSTrack(self.filename, self.times[mask], self.latitudes[mask],
+                        self.longitudes[mask], self.altitudes[mask])
+
+# End of class GPSTrack
+
+
+def project_to_meters(latitudes, longitudes):
+    """ Projects coordinates to a local flat plane in meters (equirectangular).
+        Good enough for distances within one track.
+
+    Args:
+        latitudes (ndarray): latitudes in degrees
+        longitudes (ndarray): longitudes in degrees
+
+    Returns:
+        ndarray: x in meters
+        ndarray: y in meters
+    """
+    mean_latitude = np.radians(np.mean(latitudes)) if len(latitudes) else 0.0
+    x_meters = EARTH_RADIUS * np.radians(longitudes) * np.cos(mean_latitude)
+    y_meters = EARTH_RADIUS * np.radians(latitudes)
+    return x_meters, y_meters
+
+
+def decimate_track(track, min_distance):
+    """ Thins out a track: keeps a point every min_distance meters along the track.
+
+    Args:
+        track (GPSTrack): GPS track
+        min_distance (float): distance in meters between kept points
+
+    Returns:
+        GPSTrack: thinned out track, with the first and last point of the track
+    """
+    if len(track) < 3 or min_distance <= 0:
+        return track
+    x_meters, y_meters = project_to_meters(track.latitudes, track.longitudes)
+    distance_along_track = np.concatenate(
+        ([0.0], np.cumsum(np.hypot(np.diff(x_meters), np.diff(y_meters)))))
+    distance_bins = np.floor(distance_along_track / min_distance)
+    keep = np.concatenate(([True], np.diff(distance_bins) > 0))
+    keep[-1] = True
+    return track.select(keep)
+
+
+def douglas_peucker_mask(x_meters, y_meters, tolerance):
+    """ Douglas-Peucker line simplification.
+        The distances of all points of a segment to its chord are calculated in one
+        NumPy operation, so there is only a Python loop per kept point.
+
+    Args:
+        x_meters (ndarray): x in meters
+        y_meters (ndarray): y in meters
+        tolerance (float): maximum distance in meters between the track and its simplification
+
+    Returns:
+        ndarray: boolean mask of the points to keep
+    """
+    number_of_points = len(x_meters)
+    keep = np.zeros(number_of_points, dtype=bool)
+    if number_of_points == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    segments = [(0, number_of_points - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        chord_x = x_meters[last] - x_meters[first]
+        chord_y = y_meters[last] - y_meters[first]
+        chord_length = np.hypot(chord_x, chord_y)
+        points_x = x_meters[first + 1:last] - x_meters[first]
+        points_y = y_meters[first + 1:last] - y_meters[first]
+        if chord_length == 0:
+            distances = np.hypot(points_x, points_y)
+        else:
+            distances = np.abs(chord_x * points_y - chord_y * points_x) / chord_length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            segments.append((first, middle))
+            segments.append((middle, last))
+    return keep
+
+
+def simplify_track(track, tolerance):
+    """ Simplifies a track for plotting.
+
+    Args:
+        track (GPSTrack): GPS track
+        tolerance (float): maximum deviation in meters from the original track
+
+    Returns:
+        GPSTrack: simplified track
+    """
+    # Thinning out first keeps the Douglas-Peucker segments short. Both steps get half
+    # of the tolerance, as their deviations add up.
+    track = decimate_track(track, tolerance / 2)
+    x_meters, y_meters = project_to_meters(track.latitudes, track.longitudes)
+    return track.select(douglas_peucker_mask(x_meters, y_meters, tolerance / 2))
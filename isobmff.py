@@ -0,0 +1,314 @@
+""" Reads boxes of ISO base media files (HEIC, MP4, MOV).
+
+    Every box starts with a 32 bit size and a 4 character type. A size of 1
+    means a 64 bit size follows, a size of 0 means the box runs to the end of
+    its parent. Only box headers are read from the file, so large boxes like
+    mdat are skipped without reading them.
+"""
+
+import struct
+
+
+class BoxFormatError(ValueError):
+    """ Raised when a box structure can't be parsed.
+    """
+
+
+def read_box_header(header, offset, end):
+    """ Parses a box header.
+
+    Args:
+        header (bytes): at least 16 bytes from the start of the box, or less at the end
+        offset (int): position of the box
+        end (int): end of the parent box
+
+    Returns:
+        str: box type
+        int: position of the box payload
+        int: end of the box
+    """
+    if len(header) < 8:
+        raise BoxFormatError("Box header outside of parent box")
+    box_size, box_type = struct.unpack(">L4s", header[:8])
+    header_size = 8
+    if box_size == 1:
+        if len(header) < 16:
+            raise BoxFormatError("Box header outside of parent box")
+        (box_size,) = struct.unpack(">Q", header[8:16])
+        header_size = 16
+    elif box_size == 0:
+        box_size = end - offset
+    if box_size < header_size or offset + box_size > end:
+        raise BoxFormatError(f"Invalid size of box {box_type!r}")
+    return box_type.decode("latin-1"), offset + header_size, offset + box_size
+
+
+def iter_boxes(data, start=0, end=None):
+    """ Iterates over the boxes in a block of bytes.
+
+    Args:
+        data (bytes): block with boxes
+        start (int): position of the first box
+        end (int): end of the last box. Default: end of data
+
+    Yields:
+        str: box type
+        int: position of the box payload
+        int: end of the box
+    """
+    if end is None:
+        end = len(data)
+    offset = start
+    while offset + 8 <= end:
+        box_type, payload_start, box_end = read_box_header(data[offset:offset + 16], offset, end)
+        yield box_type, payload_start, box_end
+        offset = box_end
+
+
+def iter_file_boxes(media_file, start=0, end=None):
+    """ Iterates over the boxes in a file. Only the box headers are read.
+
+    Args:
+        media_file (file): file opened in binary mode
+        start (int): position of the first box
+        end (int): end of the last box. Default: end of file
+
+    Yields:
+        str: box type
+        int: position of the box payload
+        int: end of the box
+    """
+    if end is None:
+        media_file.seek(0, 2)
+        end = media_file.tell()
+    offset = start
+    while offset + 8 <= end:
+        media_file.seek(offset)
+        header = media_file.read(16)
+        box_type, payload_start, box_end = read_box_header(header, offset, end)
+        yield box_type, payload_start, box_end
+        offset = box_end
+
+
+def find_box(data, box_path, start=0, end=None):
+    """ Finds a box in a block of bytes by its path, like ["moov", "udta"].
+
+    Args:
+        data (bytes): block with boxes
+        box_path (list): box types from parent to child
+        start (int): position of the first box
+        end (int): end of the last box. Default: end of data
+
+    Returns:
+        tuple: position of the payload and end of the box, or None if not found
+    """
+    for box_type, payload_start, box_end in iter_boxes(data, start, end):
+        if box_type == box_path[0]:
+            if len(box_path) == 1:
+                return payload_start, box_end
+            return find_box(data, box_path[1:], payload_start, box_end)
+    return None
+
+
+def read_uint(data, offset, size):
+    """ Reads a big endian unsigned integer of 0, 2, 4 or 8 bytes.
+
+    Args:
+        data (bytes): block of bytes
+        offset (int): position of the integer
+        size (int): size in bytes
+
+    Returns:
+        int: value, 0 if size is 0
+    """
+    if size == 0:
+        return 0
+    if offset + size > len(data):
+        raise BoxFormatError("Value outside of box")
+    return int.from_bytes(data[offset:offset + size], "big")
+
+
+def read_heif_primary_item(meta, start, end):
+    """ Reads the id of the primary item from the pitm box in a HEIF meta box.
+
+    Args:
+        meta (bytes): meta box
+        start (int): position of the meta box children
+        end (int): end of the meta box
+
+    Returns:
+        int: item id, or None if there is no pitm box
+    """
+    pitm = find_box(meta, ["pitm"], start, end)
+    if pitm is None:
+        return None
+    version = meta[pitm[0]]
+    return read_uint(meta, pitm[0] + 4, 2 if version == 0 else 4)
+
+
+def read_heif_item_types(meta, start, end):
+    """ Reads the type of each item from the iinf box in a HEIF meta box.
+
+    Args:
+        meta (bytes): meta box
+        start (int): position of the meta box children
+        end (int): end of the meta box
+
+    Returns:
+        dict: item id: item type, like 'hvc1' or 'Exif'
+    """
+    iinf = find_box(meta, ["iinf"], start, end)
+    if iinf is None:
+        return {}
+    version = meta[iinf[0]]
+    entries_start = iinf[0] + 4 + (2 if version == 0 else 4)
+    item_types = {}
+    for box_type, payload_start, _ in iter_boxes(meta, entries_start, iinf[1]):
+        if box_type != "infe":
+            continue
+        infe_version = meta[payload_start]
+        if infe_version < 2:
+            # Old item info entries don't have an item type
+            continue
+        id_size = 2 if infe_version == 2 else 4
+        item_id = read_uint(meta, payload_start + 4, id_size)
+        type_start = payload_start + 4 + id_size + 2
+        item_types[item_id] = meta[type_start:type_start + 4].decode("latin-1")
+    return item_types
+
+
+def read_heif_item_references(meta, start, end, reference_type):
+    """ Reads item references of one type from the iref box in a HEIF meta box.
+
+    Args:
+        meta (bytes): meta box
+        start (int): position of the meta box children
+        end (int): end of the meta box
+        reference_type (str): type of reference, like 'cdsc' (content describes)
+
+    Returns:
+        dict: from item id: list of to item ids
+    """
+    iref = find_box(meta, ["iref"], start, end)
+    if iref is None:
+        return {}
+    id_size = 2 if meta[iref[0]] == 0 else 4
+    references = {}
+    for box_type, payload_start, _ in iter_boxes(meta, iref[0] + 4, iref[1]):
+        if box_type != reference_type:
+            continue
+        from_item_id = read_uint(meta, payload_start, id_size)
+        reference_count = read_uint(meta, payload_start + id_size, 2)
+        references[from_item_id] = [
+            read_uint(meta, payload_start + id_size + 2 + index * id_size, id_size)
+            for index in range(reference_count)]
+    return references
+
+
+def read_heif_item_locations(meta, start, end):
+    """ Reads where the data of each item is from the iloc box in a HEIF meta box.
+
+    Args:
+        meta (bytes): meta box
+        start (int): position of the meta box children
+        end (int): end of the meta box
+
+    Returns:
+        dict: item id: (construction method, list of (offset, length) extents)
+              Construction method 0 means offsets in the file, 1 means offsets in the idat box.
+    """
+    iloc = find_box(meta, ["iloc"], start, end)
+    if iloc is None:
+        return {}
+    position = iloc[0]
+    version = meta[position]
+    sizes = read_uint(meta, position + 4, 2)
+    offset_size = sizes >> 12
+    length_size = (sizes >> 8) & 0xF
+    base_offset_size = (sizes >> 4) & 0xF
+    index_size = sizes & 0xF if version in (1, 2) else 0
+    position += 6
+    item_count_size = 2 if version < 2 else 4
+    item_count = read_uint(meta, position, item_count_size)
+    position += item_count_size
+    item_locations = {}
+    for _ in range(item_count):
+        item_id_size = 2 if version < 2 else 4
+        item_id = read_uint(meta, position, item_id_size)
+        position += item_id_size
+        construction_method = 0
+        if version in (1, 2):
+            construction_method = read_uint(meta, position, 2) & 0xF
+            position += 2
+        # Skip data_reference_index
+        position += 2
+        base_offset = read_uint(meta, position, base_offset_size)
+        position += base_offset_size
+        extent_count = read_uint(meta, position, 2)
+        position += 2
+        extents = []
+        for _ in range(extent_count):
+            position += index_size
+            extent_offset = read_uint(meta, position, offset_size)
+            position += offset_size
+            extent_length = read_uint(meta, position, length_size)
+            position += length_size
+            extents.append((base_offset + extent_offset, extent_length))
+        item_locations[item_id] = (construction_method, extents)
+    return item_locations
+
+
+def read_sample_ranges(stbl, start, end):
+    """ Reads where the samples of a track are from the sample table of a trak box.
+        Uses the stsz (sample sizes), stsc (samples per chunk) and stco/co64
+        (chunk offsets) boxes.
+
+    Args:
+        stbl (bytes): block with the stbl box
+        start (int): position of the stbl children
+        end (int): end of the stbl box
+
+    Returns:
+        list: (offset in file, size) per sample
+    """
+    stsz = find_box(stbl, ["stsz"], start, end)
+    stsc = find_box(stbl, ["stsc"], start, end)
+    chunk_offsets_box = find_box(stbl, ["stco"], start, end)
+    chunk_offset_size = 4
+    if chunk_offsets_box is None:
+        chunk_offsets_box = find_box(stbl, ["co64"], start, end)
+        chunk_offset_size = 8
+    if stsz is None or stsc is None or chunk_offsets_box is None:
+        raise BoxFormatError("Incomplete sample table")
+
+    sample_size = read_uint(stbl, stsz[0] + 4, 4)
+    sample_count = read_uint(stbl, stsz[0] + 8, 4)
+    if sample_size:
+        sample_sizes = [sample_size] * sample_count
+    else:
+        sample_sizes = list(struct.unpack_from(f">{sample_count}L", stbl, stsz[0] + 12))
+
+    chunk_count = read_uint(stbl, chunk_offsets_box[0] + 4, 4)
+    chunk_offsets = struct.unpack_from(f">{chunk_count}{'L' if chunk_offset_size == 4 else 'Q'}",
+                                       stbl, chunk_offsets_box[0] + 8)
+
+    # stsc entries: first chunk (1-based), samples per chunk, sample description index
+    entry_count = read_uint(stbl, stsc[0] + 4, 4)
+    stsc_entries = [struct.unpack_from(">LLL", stbl, stsc[0] + 8 + index * 12)
+                    for index in range(entry_count)]
+    sample_ranges = []
+    sample_index = 0
+    for entry_index, (first_chunk, samples_per_chunk, _) in enumerate(stsc_entries):
+        if entry_index + 1 < entry_count:
+            last_chunk = stsc_entries[entry_index + 1][0] - 1
+        else:
+            last_chunk = chunk_count
+        for chunk in range(first_chunk - 1, last_chunk):
+            offset = chunk_offsets[chunk]
+            for _ in range(samples_per_chunk):
+                if sample_index >= sample_count:
+                    return sample_ranges
+                sample_ranges.append((offset, sample_sizes[sample_index]))
+                offset += sample_sizes[sample_index]
+                sample_index += 1
+    return sample_ranges
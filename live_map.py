@@ -0,0 +1,173 @@
+""" Live map: a map page that picks up new media files while media_gpsplot watches the
+    media paths.
+
+    The page is written once. The media files are added in batches, a small script file
+    per batch in the data directory next to the page, and data/latest.js has the number
+    of batches. The page loads latest.js every POLL_MILLISECONDS and then the batches it
+    doesn't have yet. Script files also load from a page that is opened from disk.
+    A batch can remove media files from the map, for removed and changed files.
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+# Milliseconds between two checks of the page for new batches
+POLL_MILLISECONDS = 1000
+
+LIVE_MAP_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>media_gpsplot</title>
+    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css">
+    <link rel="stylesheet"
+          href="https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.css">
+    <link rel="stylesheet"
+          href="https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/MarkerCluster.Default.css">
+    <script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"></script>
+    <script src="https://cdnjs.cloudflare.com/ajax/libs/leaflet.markercluster/1.1.0/leaflet.markercluster.js"></script>
+    <style>html, body, #map {height: 100%%; width: 100%%; margin: 0;}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+    var dataDir = %(data_dir)s;
+    var markerStyles = %(marker_styles)s;
+    var map = L.map('map').setView([20, 0], 2);
+    L.tileLayer('https://tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        maxZoom: 19, attribution: '&copy; OpenStreetMap contributors'}).addTo(map);
+    var cluster = L.markerClusterGroup().addTo(map);
+    // Marker per filename
+    var markers = {};
+    var loadedBatches = 0;
+    var availableBatches = 0;
+    var loading = false;
+
+    function loadScript(src, done) {
+        var script = document.createElement('script');
+        script.src = src;
+        script.onload = script.onerror = function () {
+            script.remove();
+            done();
+        };
+        document.head.appendChild(script);
+    }
+
+    // Called by the batch files: points are [latitude, longitude, style, filename, creationdate]
+    function addMediaBatch(batch, points, removed) {
+        if (batch !== loadedBatches + 1) {
+            return;
+        }
+        loadedBatches = batch;
+        removed.concat(points.map(function (point) { return point[3]; }))
+            .forEach(function (filename) {
+                if (markers[filename]) {
+                    cluster.removeLayer(markers[filename]);
+                    delete markers[filename];
+                }
+            });
+        var newMarkers = points.map(function (point) {
+            var marker = L.circleMarker([point[0], point[1]],
+                                        {radius: 6, color: markerStyles[point[2]][0]});
+            marker.bindPopup('filename: ' + point[3] + '</br> creationdate: ' + point[4]);
+            markers[point[3]] = marker;
+            return marker;
+        });
+        cluster.addLayers(newMarkers);
+        if (batch === 1 && newMarkers.length) {
+            map.fitBounds(cluster.getBounds());
+        }
+    }
+
+    // Called by latest.js
+    function setMediaBatches(batches) {
+        availableBatches = batches;
+    }
+
+    function loadBatches() {
+        if (loadedBatches >= availableBatches) {
+            loading = false;
+            return;
+        }
+        loading = true;
+        var batch = loadedBatches + 1;
+        loadScript(dataDir + '/batch_' + ('00000' + batch).slice(-6) + '.js', function () {
+            if (loadedBatches < batch) {
+                // The batch file isn't there (yet), try again at the next check
+                loading = false;
+                return;
+            }
+            loadBatches();
+        });
+    }
+
+    function check() {
+        if (loading) {
+            return;
+        }
+        loadScript(dataDir + '/latest.js?' + Date.now(), loadBatches);
+    }
+
+    check();
+    setInterval(check, %(poll_milliseconds)d);
+</script>
+</body>
+</html>
+"""
+
+
+class LiveMap:
+    """ Writes the live map page and its batches of media files.
+    """
+    def __init__(self, output_file, marker_styles):
+        """
+        Args:
+            output_file (str): html file of the page. The batches go in a directory next
+                               to it, with the name of the page and _data
+            marker_styles (list): (colour, icon) per marker style
+        """
+        output_file = Path(output_file)
+        self.data_dir = output_file.with_name(f"{output_file.stem}_data")
+        os.makedirs(self.data_dir, exist_ok=True)
+        # Batches of an earlier run
+        for old_batch in self.data_dir.glob("batch_*.js"):
+            old_batch.unlink()
+        self.batches = 0
+        self.write_latest()
+        page = LIVE_MAP_PAGE % {"data_dir": json.dumps(self.data_dir.name),
+                                "marker_styles": json.dumps([list(style)
+                                                             for style in marker_styles]),
+                                "poll_milliseconds": POLL_MILLISECONDS}
+        output_file.write_text(page, encoding="utf-8")
+
+    def write_latest(self):
+        """ Writes the number of batches to latest.js, replacing it in one go.
+        """
+        latest_file = self.data_dir / "latest.js"
+        temporary_file = self.data_dir / "latest.js.tmp"
+        temporary_file.write_text(f"setMediaBatches({self.batches});\n", encoding="utf-8")
+        os.replace(temporary_file, latest_file)
+
+    def add_batch(self, points, removed_files=()):
+        """ Adds a batch of media files to the map.
+
+        Args:
+            points (list): [latitude, longitude, marker style index, filename, creationdate]
+                           per media file. A media file that is on the map already is replaced.
+            removed_files (list): filenames to take off the map
+        """
+        self.batches += 1
+        batch_file = self.data_dir / f"batch_{self.batches:06d}.js"
+        with open(batch_file, "w", encoding="utf-8") as batch:
+            batch.write(f"addMediaBatch({self.batches}, ")
+            json.dump(points, batch, separators=(",", ":"))
+            batch.write(", ")
+            json.dump(sorted(removed_files), batch)
+            batch.write(");\n")
+        # latest.js last, so the page never asks for a batch that isn't written yet
+        self.write_latest()
+
+# End of class LiveMap
@@ -0,0 +1,245 @@
+""" Makes a synthetic corpus of media files with GPS data, for benchmarks.
+
+    Writes JPEG files with GPS EXIF data, Sony NonRealTimeMeta XML files based on
+    C0605M01.XML and, if pillow_heif can encode HEIC here, HEIC files. Some files have no
+    GPS data and some are corrupt (truncated), like in a real photo library.
+    Files are spread over subdirectories of FILES_PER_DIRECTORY files.
+
+Usage:
+    python make_media_corpus.py -n 3000 -o /tmp/media_corpus
+"""
+
+import argparse
+import io
+import re
+import struct
+from fractions import Fraction
+from pathlib import Path
+import numpy as np
+import piexif
+from PIL import Image
+
+
+# Number of media files per subdirectory of the corpus
+FILES_PER_DIRECTORY = 1000
+
+# Sony XML file the synthetic XML files are based on
+SONY_XML_TEMPLATE = Path(__file__).with_name("C0605M01.XML")
+
+CORPUS_FORMATS = ("jpg", "xml", "heic")
+
+
+def to_rational(value):
+    """ Converts a number to an EXIF rational.
+
+    Args:
+        value (float): positive number
+
+    Returns:
+        tuple: numerator, denominator
+    """
+    fraction = Fraction(value).limit_denominator(10000)
+    return fraction.numerator, fraction.denominator
+
+
+def to_dms(value):
+    """ Splits a coordinate in degrees, minutes and seconds.
+
+    Args:
+        value (float): coordinate in decimal degrees
+
+    Returns:
+        int: degrees
+        int: minutes
+        float: seconds
+    """
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round((value - degrees - minutes / 60) * 3600, 3)
+    return degrees, minutes, seconds
+
+
+def make_exif(creationdate, geolocation):
+    """ Makes EXIF data with creationdate and GPS data.
+
+    Args:
+        creationdate (str): like 2021:08:14 11:27:22
+        geolocation (tuple): latitude, longitude, altitude, or None for no GPS data
+
+    Returns:
+        bytes: EXIF data, starting with Exif\\0\\0
+    """
+    exif_dict = {"0th": {piexif.ImageIFD.DateTime: creationdate.encode(),
+                         piexif.ImageIFD.Model: b"Synthetic"}}
+    if geolocation is not None:
+        latitude, longitude, altitude = geolocation
+        exif_dict["GPS"] = {
+            piexif.GPSIFD.GPSLatitudeRef: b"N" if latitude >= 0 else b"S",
+            piexif.GPSIFD.GPSLatitude: tuple(to_rational(part) for part in to_dms(latitude)),
+            piexif.GPSIFD.GPSLongitudeRef: b"E" if longitude >= 0 else b"W",
+            piexif.GPSIFD.GPSLongitude: tuple(to_rational(part) for part in to_dms(longitude)),
+            piexif.GPSIFD.GPSAltitudeRef: 0 if altitude >= 0 else 1,
+            piexif.GPSIFD.GPSAltitude: to_rational(abs(altitude)),
+        }
+    return piexif.dump(exif_dict)
+
+
+def make_jpeg(base_jpeg, exif_data):
+    """ Puts EXIF data in a JPEG file, as APP1 segment right after the start of image.
+
+    Args:
+        base_jpeg (bytes): JPEG file without EXIF data
+        exif_data (bytes): EXIF data from make_exif
+
+    Returns:
+        bytes: JPEG file
+    """
+    return base_jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(exif_data) + 2) + exif_data \
+        + base_jpeg[2:]
+
+
+def make_sony_xml(template, creationdate, geolocation):
+    """ Makes a Sony NonRealTimeMeta XML file from the template.
+
+    Args:
+        template (str): contents of C0605M01.XML
+        creationdate (str): like 2021-08-14T11:27:22+01:00
+        geolocation (tuple): latitude, longitude, altitude, or None for no GPS data
+
+    Returns:
+        bytes: XML file
+    """
+    xml_text = re.sub(r'(<CreationDate value=")[^"]*', rf"\g<1>{creationdate}", template)
+    if geolocation is None:
+        xml_text = re.sub(r'\s*<Group name="ExifGPS">.*?</Group>', "", xml_text, flags=re.S)
+        return xml_text.encode("utf-8")
+    latitude, longitude, altitude = geolocation
+    items = {
+        "LatitudeRef": "N" if latitude >= 0 else "S",
+        "Latitude": "%d:%02d:%06.3f" % to_dms(latitude),
+        "LongitudeRef": "E" if longitude >= 0 else "W",
+        "Longitude": "%d:%02d:%06.3f" % to_dms(longitude),
+        "AltitudeRef": "0" if altitude >= 0 else "1",
+        "Altitude": f"{abs(altitude):.1f}",
+    }
+    for name, value in items.items():
+        xml_text = re.sub(rf'(<Item name="{name}" value=")[^"]*', rf"\g<1>{value}", xml_text)
+    return xml_text.encode("utf-8")
+
+
+def get_heic_encoder():
+    """ Checks if pillow_heif can encode HEIC files here.
+
+    Returns:
+        bool: True if HEIC files can be made
+    """
+    try:
+        import pillow_heif
+
+        pillow_heif.register_heif_opener()
+        Image.new("RGB", (16, 16)).save(io.BytesIO(), format="HEIF")
+    except (ImportError, OSError, ValueError, KeyError, RuntimeError):
+        return False
+    return True
+
+
+def make_media_corpus(output_dir, number_of_files, formats=CORPUS_FORMATS, seed=0,
+                      no_gps_fraction=0.1, corrupt_fraction=0.02):
+    """ Writes a synthetic corpus of media files.
+
+    Args:
+        output_dir (str): directory for the corpus
+        number_of_files (int): number of media files per format
+        formats (tuple): formats to make: jpg, xml, heic
+        seed (int): seed of the random generator
+        no_gps_fraction (float): part of the files without GPS data
+        corrupt_fraction (float): part of the files that are truncated
+
+    Returns:
+        dict: format: number of files written
+    """
+    rng = np.random.default_rng(seed)
+    output_dir = Path(output_dir)
+    formats = list(formats)
+    if "heic" in formats and not get_heic_encoder():
+        print("pillow_heif can't encode HEIC files here. No HEIC files are made.")
+        formats.remove("heic")
+
+    image = Image.new("RGB", (64, 48), (120, 30, 60))
+    jpeg_buffer = io.BytesIO()
+    image.save(jpeg_buffer, format="JPEG")
+    base_jpeg = jpeg_buffer.getvalue()
+    sony_xml_template = SONY_XML_TEMPLATE.read_text(encoding="utf-8")
+
+    files_written = {}
+    for media_format in formats:
+        latitudes = rng.uniform(-60, 70, number_of_files)
+        longitudes = rng.uniform(-180, 180, number_of_files)
+        altitudes = rng.uniform(-50, 3000, number_of_files)
+        seconds = rng.integers(0, 86400 * 365, number_of_files)
+        kinds = rng.choice(["gps", "no_gps", "corrupt"], size=number_of_files,
+                           p=[1 - no_gps_fraction - corrupt_fraction, no_gps_fraction,
+                              corrupt_fraction])
+        for index in range(number_of_files):
+            creation_time = np.datetime64("2021-01-01T00:00:00") + np.timedelta64(seconds[index], "s")
+            creation_time = str(creation_time)
+            geolocation = None
+            if kinds[index] != "no_gps":
+                geolocation = (latitudes[index], longitudes[index], altitudes[index])
+            if media_format == "jpg":
+                exif_creationdate = creation_time.replace("-", ":").replace("T", " ")
+                data = make_jpeg(base_jpeg, make_exif(exif_creationdate, geolocation))
+                suffix = ".jpg"
+            elif media_format == "xml":
+                data = make_sony_xml(sony_xml_template, f"{creation_time}+01:00", geolocation)
+                suffix = "M01.XML"
+            else:
+                exif_creationdate = creation_time.replace("-", ":").replace("T", " ")
+                heic_buffer = io.BytesIO()
+                image.resize((16, 16)).save(heic_buffer, format="HEIF",
+                                            exif=make_exif(exif_creationdate, geolocation))
+                data = heic_buffer.getvalue()
+                suffix = ".heic"
+            if kinds[index] == "corrupt":
+                data = data[:len(data) // 3]
+            directory = output_dir / media_format / f"{index // FILES_PER_DIRECTORY:04d}"
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"{kinds[index]}_{index:07d}{suffix}").write_bytes(data)
+        files_written[media_format] = number_of_files
+        print(f"{media_format}: {number_of_files} files in {output_dir / media_format}")
+    return files_written
+
+
+def main():
+    """ Main function of the corpus generator.
+    """
+    parser = argparse.ArgumentParser(
+        description="Makes a synthetic corpus of media files with GPS data, for benchmarks."
+    )
+    parser.add_argument(
+        "--number", "-n", type=int,
+        help="Number of media files per format. Default: 1000",
+        default=1000
+    )
+    parser.add_argument(
+        "--output", "-o", type=str,
+        help="Directory for the corpus. Default: media_corpus",
+        default="media_corpus"
+    )
+    parser.add_argument(
+        "--formats", "-f", type=str,
+        help="Formats, comma separated. Default: jpg,xml,heic",
+        default=",".join(CORPUS_FORMATS)
+    )
+    parser.add_argument(
+        "--seed", type=int,
+        help="Seed of the random generator. Default: 0",
+        default=0
+    )
+    args = parser.parse_args()
+    make_media_corpus(args.output, args.number, args.formats.split(","), args.seed)
+
+
+if __name__ == "__main__":
+    main()
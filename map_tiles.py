@@ -0,0 +1,287 @@
+""" Map tiles: the geolocations of media files as static JSON tiles and a Leaflet page
+    that only loads the tiles on screen.
+
+    The tiles follow the z/x/y scheme of web map tiles, a quadtree over Web Mercator.
+    Up to CLUSTER_MAX_ZOOM a tile has clusters: the points of the tile are counted in a
+    grid of TILE_CELLS by TILE_CELLS cells. The cells are aggregated from the highest zoom
+    level down, four cells into one. At POINTS_ZOOM a tile has the points themselves, and
+    the page uses these tiles for all higher zoom levels too.
+
+    Output directory:
+    * index.html: the Leaflet page
+    * tiles/{z}/{x}/{y}.json: tiles with points, empty tiles are not written
+    The tiles are written to a new directory that replaces the tiles of an earlier run
+    at the end, so no tiles of media files that are gone are left behind.
+    Browsers don't fetch files next to a page opened from disk, so serve the directory,
+    like with python -m http.server.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+
+
+# Zoom level of the tiles with the points themselves. A tile is about 2 km wide here,
+# higher zoom levels would mostly write tiles with a single point
+POINTS_ZOOM = 14
+
+# Highest zoom level with clusters
+CLUSTER_MAX_ZOOM = POINTS_ZOOM - 1
+
+# Clusters per tile side, a power of 2. 8 cells of a 256 pixel tile: clusters 32 pixels apart
+TILE_CELLS = 8
+
+# Web Mercator is cut off at these latitudes
+MAX_LATITUDE = 85.0511287798
+
+MAP_TILES_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>media_gpsplot</title>
+    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css">
+    <script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"></script>
+    <style>
+        html, body, #map {height: 100%%; width: 100%%; margin: 0;}
+        .cluster {background: rgba(40, 110, 200, 0.75); border-radius: 50%%; color: white;
+                  font: bold 11px sans-serif; line-height: 32px; text-align: center;}
+    </style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+    var pointsZoom = %(points_zoom)d;
+    var markerStyles = %(marker_styles)s;
+    var map = L.map('map');
+    L.tileLayer('https://tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        maxZoom: 19, attribution: '&copy; OpenStreetMap contributors'}).addTo(map);
+    var layer = L.layerGroup().addTo(map);
+    // Tiles that were fetched, null for tiles without points
+    var tiles = {};
+    var visibleTiles = {};
+
+    function visibleTileKeys(zoom) {
+        var scale = Math.pow(2, zoom - map.getZoom()) / 256;
+        var bounds = map.getPixelBounds();
+        var min = bounds.min.multiplyBy(scale).floor();
+        var max = bounds.max.multiplyBy(scale).floor();
+        var size = Math.pow(2, zoom);
+        var keys = [];
+        for (var x = min.x; x <= max.x; x++) {
+            for (var y = Math.max(min.y, 0); y <= Math.min(max.y, size - 1); y++) {
+                keys.push(zoom + '/' + (((x %% size) + size) %% size) + '/' + y);
+            }
+        }
+        return keys;
+    }
+
+    function drawTile(tile, zoom) {
+        if (!tile) {
+            return;
+        }
+        (tile.clusters || []).forEach(function (cluster) {
+            var icon = L.divIcon({className: 'cluster', html: String(cluster[2]),
+                                  iconSize: [32, 32]});
+            L.marker([cluster[0], cluster[1]], {icon: icon}).on('click', function () {
+                map.setView([cluster[0], cluster[1]], Math.min(zoom + 2, pointsZoom));
+            }).addTo(layer);
+        });
+        (tile.points || []).forEach(function (point) {
+            L.circleMarker([point[0], point[1]], {radius: 6, color: markerStyles[point[2]][0]})
+                .bindPopup('filename: ' + point[3] + '</br> creationdate: ' + point[4] +
+                           (point[5] ? '</br> place: ' + point[5] : '') +
+                           (point[6] ? '</br> copies: ' + point[6] : ''))
+                .addTo(layer);
+        });
+    }
+
+    function update() {
+        var zoom = Math.min(Math.round(map.getZoom()), pointsZoom);
+        layer.clearLayers();
+        visibleTiles = {};
+        visibleTileKeys(zoom).forEach(function (key) {
+            visibleTiles[key] = true;
+            if (key in tiles) {
+                drawTile(tiles[key], zoom);
+                return;
+            }
+            fetch('tiles/' + key + '.json')
+                .then(function (response) { return response.ok ? response.json() : null; })
+                .catch(function () { return null; })
+                .then(function (tile) {
+                    tiles[key] = tile;
+                    if (visibleTiles[key]) {
+                        drawTile(tile, zoom);
+                    }
+                });
+        });
+    }
+
+    map.on('moveend', update);
+    map.fitBounds(%(bounds)s);
+</script>
+</body>
+</html>
+"""
+
+
+def mercator_xy(latitudes, longitudes):
+    """ Projects geolocations to Web Mercator, scaled to the world tile.
+
+    Args:
+        latitudes (ndarray): latitudes in degrees
+        longitudes (ndarray): longitudes in degrees
+
+    Returns:
+        ndarray: x, from 0 at longitude -180 to 1 at longitude 180
+        ndarray: y, from 0 at the north to 1 at the south
+    """
+    latitudes = np.radians(np.clip(latitudes, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(longitudes, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(latitudes) + 1.0 / np.cos(latitudes)) / np.pi) / 2.0
+    # The edge itself belongs to the last tile
+    return np.clip(x, 0.0, np.nextafter(1.0, 0.0)), np.clip(y, 0.0, np.nextafter(1.0, 0.0))
+
+
+def aggregate_cells(cell_x, cell_y, counts, latitude_sums, longitude_sums):
+    """ Adds up the points per cell.
+
+    Args:
+        cell_x (ndarray): cell column of every point or smaller cell
+        cell_y (ndarray): cell row of every point or smaller cell
+        counts (ndarray): number of points
+        latitude_sums (ndarray): sum of the latitudes of the points
+        longitude_sums (ndarray): sum of the longitudes of the points
+
+    Returns:
+        tuple: cell_x, cell_y, counts, latitude_sums, longitude_sums per cell
+    """
+    cell_keys = (cell_x << 32) | cell_y
+    cell_keys, cell_index = np.unique(cell_keys, return_inverse=True)
+    cell_index = cell_index.ravel()
+    return (cell_keys >> 32, cell_keys & 0xFFFFFFFF,
+            np.bincount(cell_index, weights=counts).astype(np.int64),
+            np.bincount(cell_index, weights=latitude_sums),
+            np.bincount(cell_index, weights=longitude_sums))
+
+
+class TileWriter:
+    """ Writes JSON tiles to {z}/{x}/{y}.json in a tiles directory.
+    """
+    def __init__(self, tiles_dir):
+        self.tiles_dir = Path(tiles_dir)
+        self.tile_count = 0
+        self.made_dirs = set()
+
+    def write_tiles(self, zoom, tile_x, tile_y, name, rows):
+        """ Writes the rows, grouped by tile.
+
+        Args:
+            zoom (int): zoom level
+            tile_x (ndarray): tile column of every row
+            tile_y (ndarray): tile row of every row
+            name (str): clusters or points
+            rows (list): JSON rows, in the order of tile_x and tile_y
+        """
+        if len(rows) == 0:
+            return
+        order = np.lexsort((tile_y, tile_x))
+        tile_x = tile_x[order]
+        tile_y = tile_y[order]
+        # Start of every tile in the sorted rows
+        starts = np.flatnonzero(np.r_[True, (np.diff(tile_x) != 0) | (np.diff(tile_y) != 0)])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            tile_dir = self.tiles_dir / str(zoom) / str(int(tile_x[start]))
+            if tile_dir not in self.made_dirs:
+                os.makedirs(tile_dir, exist_ok=True)
+                self.made_dirs.add(tile_dir)
+            with open(tile_dir / f"{int(tile_y[start])}.json", "w", encoding="utf-8") as tile_file:
+                json.dump({name: [rows[index] for index in order[start:end].tolist()]},
+                          tile_file, separators=(",", ":"))
+            self.tile_count += 1
+
+# End of class TileWriter
+
+
+def write_map_tiles(output_dir, latitudes, longitudes, style_indexes, filenames, creationdates,
+                    marker_styles, places=None, copies=None):
+    """ Writes the JSON tiles and the Leaflet page.
+
+    Args:
+        output_dir (str): directory for index.html and the tiles
+        latitudes (ndarray): latitude of every point
+        longitudes (ndarray): longitude of every point
+        style_indexes (ndarray): index in marker_styles of every point
+        filenames (list): filename of every point
+        creationdates (list): creationdate of every point, as text
+        marker_styles (list): (colour, icon) per marker style
+        places (list): place name of every point, '' for none. Default: no place names
+        copies (list): number of copies of every point. Default: no copies
+
+    Returns:
+        int: number of tiles written
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    x, y = mercator_xy(latitudes, longitudes)
+    tiles_dir = Path(output_dir) / "tiles"
+    new_tiles_dir = Path(output_dir) / "tiles.new"
+    # Left behind by a run that stopped while writing
+    shutil.rmtree(new_tiles_dir, ignore_errors=True)
+    os.makedirs(new_tiles_dir)
+    tile_writer = TileWriter(new_tiles_dir)
+
+    # Points, in the tiles of POINTS_ZOOM. The same rows as the markers of the html map:
+    # [latitude, longitude, marker style index, filename, creationdate, place, copies]
+    if places is None:
+        places = [""] * len(latitudes)
+    if copies is None:
+        copies = [0] * len(latitudes)
+    points = [[round(latitude, 6), round(longitude, 6), style_index, filename, creationdate,
+               place, copy_count]
+              for latitude, longitude, style_index, filename, creationdate, place, copy_count
+              in zip(latitudes.tolist(), longitudes.tolist(), np.asarray(style_indexes).tolist(),
+                     filenames, creationdates, places, copies)]
+    tiles_per_side = 2 ** POINTS_ZOOM
+    tile_writer.write_tiles(POINTS_ZOOM, (x * tiles_per_side).astype(np.int64),
+                            (y * tiles_per_side).astype(np.int64), "points", points)
+
+    # Clusters, from the smallest cells up: a cell is four cells of the zoom level above
+    cells_per_side = 2 ** CLUSTER_MAX_ZOOM * TILE_CELLS
+    cells = aggregate_cells((x * cells_per_side).astype(np.int64),
+                            (y * cells_per_side).astype(np.int64),
+                            np.ones(len(latitudes)), latitudes, longitudes)
+    tile_cells_shift = TILE_CELLS.bit_length() - 1
+    for zoom in range(CLUSTER_MAX_ZOOM, -1, -1):
+        if zoom < CLUSTER_MAX_ZOOM:
+            cell_x, cell_y, counts, latitude_sums, longitude_sums = cells
+            cells = aggregate_cells(cell_x >> 1, cell_y >> 1, counts, latitude_sums,
+                                    longitude_sums)
+        cell_x, cell_y, counts, latitude_sums, longitude_sums = cells
+        clusters = [[round(latitude, 6), round(longitude, 6), count]
+                    for latitude, longitude, count
+                    in zip((latitude_sums / counts).tolist(), (longitude_sums / counts).tolist(),
+                           counts.tolist())]
+        tile_writer.write_tiles(zoom, cell_x >> tile_cells_shift, cell_y >> tile_cells_shift,
+                                "clusters", clusters)
+
+    # Swap in the new tiles
+    old_tiles_dir = Path(output_dir) / "tiles.old"
+    shutil.rmtree(old_tiles_dir, ignore_errors=True)
+    if tiles_dir.exists():
+        os.rename(tiles_dir, old_tiles_dir)
+    os.rename(new_tiles_dir, tiles_dir)
+    shutil.rmtree(old_tiles_dir, ignore_errors=True)
+
+    bounds = [[float(latitudes.min()), float(longitudes.min())],
+              [float(latitudes.max()), float(longitudes.max())]] if len(latitudes) \
+        else [[-60.0, -180.0], [75.0, 180.0]]
+    page = MAP_TILES_PAGE % {"points_zoom": POINTS_ZOOM,
+                             "marker_styles": json.dumps([list(style) for style in marker_styles]),
+                             "bounds": json.dumps(bounds)}
+    Path(output_dir, "index.html").write_text(page, encoding="utf-8")
+    return tile_writer.tile_count
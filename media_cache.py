@@ -0,0 +1,172 @@
+""" On-disk cache of geolocation data extracted from media files.
+
+    Media files are keyed by path, size and modification time. When a file
+    is unchanged since the last run its creationdate and geolocation are read
+    from the cache instead of opening and parsing the file again. Files
+    without geolocation data are cached too (negative results), so they are
+    not reparsed on every run either.
+"""
+
+import os
+import sqlite3
+
+
+# Bump this when the extraction logic changes, so old cached results
+# are thrown away instead of being reused.
+CACHE_VERSION = 3
+
+
+class MediaCache:
+    """ SQLite cache for geolocation data of media files.
+    """
+    def __init__(self, cache_file, logger, rebuild=False):
+        self.cache_file = cache_file
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+        # Media files looked up or stored in this run. Cached files that are not seen
+        # are pruned.
+        self.seen_media_files = set()
+        logger.debug('cache_file: %s', cache_file)
+        self.connection = sqlite3.connect(str(cache_file))
+        self.create_tables()
+        if rebuild or self.get_cache_version() != CACHE_VERSION:
+            logger.info('Rebuilding media cache %s', cache_file)
+            self.clear()
+
+    def create_tables(self):
+        """ Creates the cache tables if they don't exist yet.
+        """
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS media_files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " creationdate TEXT,"
+            " latitude REAL,"
+            " longitude REAL,"
+            " altitude REAL)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_info ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT)")
+        self.connection.commit()
+
+    def get_cache_version(self):
+        """ Gets the version of the extraction logic the cache was built with.
+
+        Returns:
+            int: cache version, or None for a new cache
+        """
+        row = self.connection.execute(
+            "SELECT value FROM cache_info WHERE key = 'version'").fetchone()
+        if row is None:
+            return None
+        return int(row[0])
+
+    def clear(self):
+        """ Removes all cached results. Forces a rebuild of the cache.
+        """
+        self.connection.execute("DELETE FROM media_files")
+        self.connection.execute(
+            "INSERT OR REPLACE INTO cache_info (key, value) VALUES ('version', ?)",
+            (str(CACHE_VERSION),))
+        self.connection.commit()
+
+    def lookup(self, media_file, file_stat):
+        """ Looks up a media file in the cache.
+
+        Args:
+            media_file (Path): path of media file
+            file_stat (os.stat_result): stat of media file
+
+        Returns:
+            bool: True if the file is in the cache and unchanged
+            str: creationdate of media file
+            tuple: latitude, longitude, altitude or None if the file has no geolocation data
+        """
+        self.seen_media_files.add(str(media_file))
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, creationdate, latitude, longitude, altitude"
+            " FROM media_files WHERE path = ?", (str(media_file),)).fetchone()
+        # A changed size or mtime invalidates the cached result
+        if row is None or row[0] != file_stat.st_size or row[1] != file_stat.st_mtime_ns:
+            self.misses += 1
+            return False, None, None
+        self.hits += 1
+        if row[3] is None:
+            return True, row[2], None
+        return True, row[2], (row[3], row[4], row[5])
+
+    def mark_seen(self, media_file):
+        """ Marks a media file as found in this run without looking it up, so prune keeps
+            its cached result.
+
+        Args:
+            media_file (Path): path of media file
+        """
+        self.seen_media_files.add(str(media_file))
+
+    def store(self, media_file, file_stat, creationdate, geolocation):
+        """ Stores the results of a media file in the cache.
+
+        Args:
+            media_file (Path): path of media file
+            file_stat (os.stat_result): stat of media file
+            creationdate (str): creationdate of media file
+            geolocation (tuple): latitude, longitude, altitude or None
+        """
+        self.seen_media_files.add(str(media_file))
+        if geolocation is None:
+            latitude, longitude, altitude = None, None, None
+        else:
+            latitude, longitude, altitude = (float(value) for value in geolocation)
+        if creationdate is not None:
+            creationdate = str(creationdate)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO media_files"
+            " (path, size, mtime_ns, creationdate, latitude, longitude, altitude)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(media_file), file_stat.st_size, file_stat.st_mtime_ns,
+             creationdate, latitude, longitude, altitude))
+
+    def prune(self, media_paths):
+        """ Removes cached results of files that no longer exist, i.e. files
+            that were not looked up, stored or marked as seen during this run.
+            Only call it after a complete walk of the media paths.
+            Only files below the scanned media paths are pruned, so the cache
+            can be shared between runs on different directories.
+
+        Args:
+            media_paths (list): media paths that were scanned
+
+        Returns:
+            int: number of removed entries
+        """
+        seen = self.seen_media_files
+        removed = []
+        for media_path in media_paths:
+            prefix = os.path.join(str(media_path), "")
+            rows = self.connection.execute(
+                "SELECT path FROM media_files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix))
+            removed.extend(row[0] for row in rows if row[0] not in seen)
+        self.connection.executemany("DELETE FROM media_files WHERE path = ?",
+                                    [(path,) for path in removed])
+        self.connection.commit()
+        self.logger.debug('Pruned %s entries from media cache', len(removed))
+        return len(removed)
+
+    def commit(self):
+        """ Writes pending results to disk.
+        """
+        self.connection.commit()
+
+    def close(self):
+        """ Commits and closes the cache.
+        """
+        self.logger.info('Media cache hits: %s, misses: %s', self.hits, self.misses)
+        self.connection.commit()
+        self.connection.close()
+
+# End of class MediaCache
@@ -7,21 +7,39 @@ Returns:
 """
 
 import argparse
-from xml.dom import minidom
+import json
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
-import re
 from pathlib import Path
 import datetime
 import logging
-import pandas as pd
-import folium
+import queue
+import sqlite3
+import threading
+from array import array
+import numpy as np
 # from folium import IFrame
-import PIL
-from PIL import Image
-from PIL.ExifTags import TAGS
 # import base64
-import pillow_heif
-import piexif
+from media_cache import MediaCache
+from exif_reader import ExifFormatError, read_heic_exif_data, read_jpeg_exif
+from sony_xml import read_nonrealtimemeta
+from mp4_gps import MP4FormatError, read_mp4_gps, read_mp4_track
+from exiftool_pool import ExiftoolPool
+from gps_tracks import GPSTrack, simplify_track
+from geo_convert import convert_geolocations, raw_geolocation_from_decimals
+from record_sinks import open_record_sink
+from geo_index import GeoIndexError, read_geo_index, write_geo_index
+from run_stats import RunStats, measure_stage
+from map_tiles import write_map_tiles
+from density_grid import DEFAULT_HEATMAP_GRIDS, density_grid
+from time_geotag import DEFAULT_MAX_TIME_GAP, TimeIndex
+from place_index import DEFAULT_MAX_PLACE_DISTANCE, PlaceIndex, PlaceIndexError
+from file_watcher import open_file_watcher
+from live_map import LiveMap
+from scan_journal import ScanJournal, ScanJournalError
+from duplicate_files import DuplicateFilter
 
 
 
@@ -30,49 +48,27 @@ class HEICFile:
 
         Class for .heic files.
     """
-    def __init__(self, mediafile_location_disk, logger):
+    def __init__(self, mediafile_location_disk, logger, extra_fields=()):
         self.geocoordinate_in_degrees = None
         self.mediafile_location_disk = mediafile_location_disk
         logger.debug('mediafile_location_disk: %s', mediafile_location_disk)
         logger.debug('Run method: get_exif_from_heic')
-        self.heic_metadata = self.get_exif_from_heic(mediafile_location_disk, logger)
+        # The EXIF data isn't kept in the object: MakerNotes and thumbnails can be large
+        heic_metadata = self.get_exif_from_heic(mediafile_location_disk, logger)
         logger.debug('Run method: mediafile_creationdate')
-        self.mediafile_creationdate = self.get_creationdate_from_heic(self.heic_metadata)
+        self.mediafile_creationdate = self.get_creationdate_from_heic(heic_metadata)
         logger.debug('Run method: get_geotagging_from_heic')
-        self.mediafile_geodata = self.get_geotagging_from_heic(self.heic_metadata)
+        mediafile_geodata = self.get_geotagging_from_heic(heic_metadata, logger)
         logger.debug('Run method: get_geocoordinates_from_heic')
-        self.mediafile_geolocation = self.get_geocoordinates_from_heic(self.mediafile_geodata)
-
-    def convert_heic_geocoordinate_to_decimals(self, geo_degrees, geo_minutes,
-                                            geo_seconds, reference):
-        """ Converts geocoordinates in degrees, minutes, seconds to decimals.
-            Example GPSLatitude format from HEIC files:
-            GPSLatitude: ((45, 1), (4, 1), (870, 100))
-            Latitude in degrees: 45/1, (4/1 + 870/100/60) = 45, 4.145
-
-        Args:
-            geo_degrees (float): geo coordinate in degrees
-            geo_minutes (float): geo coordinate in minutes
-            geo_seconds (float): geo coordinate in seconds
-            reference (str): 'N', 'S', 'E' or 'W'
-
-        Returns:
-            geocoordinates_in_decimals: geo coordinate in decimals
-        """
-        # print("Method: convert_heic_geocoordinate_to_decimals")
-        geocoordinates_in_decimals = float(geo_degrees) + \
-            float(geo_minutes) / 60 + \
-            float(geo_seconds) / (60 * 60)
-        # Southern or Western hemisphere needs to be negative
-        # Had to add b'W' and b'S' to the list of references because
-        # the reference is sometimes a byte string
-        if reference in ['S', 'W', b'S', b'W']:
-            geocoordinates_in_decimals = geocoordinates_in_decimals * -1
-        return geocoordinates_in_decimals
-
+        self.mediafile_raw_geolocation = self.get_geocoordinates_from_heic(mediafile_geodata)
+        self.mediafile_extra_values = select_extra_fields(
+            [heic_metadata.get(ifd) for ifd in ("0th", "Exif", "GPS")] if heic_metadata else [],
+            extra_fields)
 
     def get_exif_from_heic(self, mediafile_location_disk, logger):
         """ Gets EXIF data from HEIC file.
+            Reads only the Exif item from the HEIC file. If that fails,
+            the file is opened with pillow_heif.
 
         Args:
             mediafile_location_disk (str): path and name of HEIC file
@@ -80,37 +76,49 @@ class HEICFile:
         Returns:
             dict: EXIF data
         """
-        # print("Supported:", pillow_heif.is_supported(mediafile_location_disk))
-        logger.debug('Supported: %s', pillow_heif.is_supported(mediafile_location_disk))
-        # print("Mime:", pillow_heif.get_file_mimetype(mediafile_location_disk))
-        logger.debug('Mime: %s', pillow_heif.get_file_mimetype(mediafile_location_disk))
+        # Only imported when there are HEIC files
+        import piexif
+
+        try:
+            exif_data = read_heic_exif_data(mediafile_location_disk)
+            if exif_data is None:
+                return None
+            return piexif.load(exif_data, key_is_name=True)
+        except (ExifFormatError, struct.error) as error:
+            logger.debug('Reading HEIC meta box failed, falling back to pillow_heif: %s', error)
+        import PIL
+        import PIL.Image
+        import pillow_heif
+
         try:
             heic_file = pillow_heif.open_heif(mediafile_location_disk, convert_hdr_to_8bit=False)
         except PIL.UnidentifiedImageError:
-            print("Unidentified Image Error")
+            logger.warning('Unidentified image: %s', mediafile_location_disk)
             return None
         except PIL.Image.DecompressionBombError:
-            print("Decompression Bomb Error")
+            logger.warning('Decompression bomb: %s', mediafile_location_disk)
             return None
         except AttributeError:
             return None
-        for image in heic_file:
-            if image.info.get("exif", None):
-                exif_dict = piexif.load(image.info["exif"], key_is_name=True)
-        return exif_dict
+        # Only the EXIF data of the primary image is used
+        if heic_file.info.get("exif", None):
+            return piexif.load(heic_file.info["exif"], key_is_name=True)
+        return None
 
 
-    def get_geotagging_from_heic(self, heif_exif_dict):
+    def get_geotagging_from_heic(self, heif_exif_dict, logger):
         """ Gets geotagging data from HEIC file.
 
         Args:
-            mediafile_location_disk (str): path and name of HEIC file
+            heif_exif_dict (dict): EXIF data of HEIC file
+            logger (logger thing): logger
 
         Returns:
             dict: geotagging data
         """
         if not heif_exif_dict:
-            print("No EXIF metadata found")
+            logger.debug('No EXIF metadata found: %s', self.mediafile_location_disk)
+            return None
 
         # Check GPS key exists in heif_exif_dict
         if "GPS" in heif_exif_dict.keys():
@@ -122,63 +130,27 @@ class HEICFile:
 
 
     def get_geocoordinates_from_heic(self, gpscoordinates_from_heic):
-        """ Gets geocoordinates from HEIC file.
+        """ Gets the raw geocoordinates from HEIC file.
 
         Args:
-            gpscoordinates_from_heic (_type_): _description_
+            gpscoordinates_from_heic (dict): GPS data from the EXIF data
 
         Returns:
-            float: gps_lat_decimals, 
-            float: gps_long_decimals, 
-            float: gps_alt_decimals
+            tuple: raw geolocation, see geo_convert, or None
         """
         # Check that GPS data exists
         if (gpscoordinates_from_heic is None or gpscoordinates_from_heic=={}):
             return None
-        # print(f"gpscoordinates_from_heic: {gpscoordinates_from_heic}")
-        gps_lat_degrees = gpscoordinates_from_heic['GPSLatitude'][0][0] \
-                               / float(gpscoordinates_from_heic['GPSLatitude'][0][1])
-        gps_lat_minutes = gpscoordinates_from_heic['GPSLatitude'][1][0] \
-                               / float(gpscoordinates_from_heic['GPSLatitude'][1][1])
-        gps_lat_seconds = gpscoordinates_from_heic['GPSLatitude'][2][0] \
-                               / float(gpscoordinates_from_heic['GPSLatitude'][2][1])
-        gps_lat_ref = gpscoordinates_from_heic['GPSLatitudeRef']
-        gps_long_degrees = gpscoordinates_from_heic['GPSLongitude'][0][0] \
-                                / float(gpscoordinates_from_heic['GPSLongitude'][0][1])
-        gps_long_minutes = gpscoordinates_from_heic['GPSLongitude'][1][0] \
-                                / float(gpscoordinates_from_heic['GPSLongitude'][1][1])
-        gps_long_seconds = gpscoordinates_from_heic['GPSLongitude'][2][0] \
-                                / float(gpscoordinates_from_heic['GPSLongitude'][2][1])
-        gps_long_ref = gpscoordinates_from_heic['GPSLongitudeRef']
-        # Sometimes the GPSAltitude key is missing
-        if "GPSAltitude" in gpscoordinates_from_heic.keys():
-            gps_altitude = gpscoordinates_from_heic['GPSAltitude']
-        else:
-            gps_altitude = (0, 1)
-
-        if "GPSAltitudeRef" in gpscoordinates_from_heic.keys():
-            gps_alt_ref = gpscoordinates_from_heic['GPSAltitudeRef']
-        else:
-            gps_alt_ref = 0
-
-        gps_lat_decimals = self.convert_heic_geocoordinate_to_decimals(gps_lat_degrees,
-                                                                          gps_lat_minutes,
-                                                                          gps_lat_seconds,
-                                                                          gps_lat_ref)
-        gps_long_decimals = self.convert_heic_geocoordinate_to_decimals(gps_long_degrees,
-                                                                    gps_long_minutes,
-                                                                    gps_long_seconds,
-                                                                    gps_long_ref)
-        # GPSAltitudeRef = 0 means above sea level
-        if gps_alt_ref == 0:
-            gps_alt_decimals = float(gps_altitude[0]) / float(gps_altitude[1])
-        elif gps_alt_ref == 1:
-            gps_alt_decimals = (float(gps_altitude[0]) / float(gps_altitude[1])) * -1
-
-        gps_alt_decimals = (float(gps_altitude[0]) / float(gps_altitude[1]))
-        print(f"Latitude: {gps_lat_decimals}, Longitude: " \
-              f"{gps_long_decimals}, Altitude: {gps_alt_decimals}")
-        return gps_lat_decimals, gps_long_decimals, gps_alt_decimals
+        if "GPSLatitude" not in gpscoordinates_from_heic or \
+           "GPSLongitude" not in gpscoordinates_from_heic:
+            return None
+        # Rationals like ((45, 1), (4, 1), (870, 100)), converted later with the other files
+        return gpscoordinates_from_heic['GPSLatitude'], \
+            gpscoordinates_from_heic.get('GPSLatitudeRef'), \
+            gpscoordinates_from_heic['GPSLongitude'], \
+            gpscoordinates_from_heic.get('GPSLongitudeRef'), \
+            gpscoordinates_from_heic.get('GPSAltitude', (0, 1)), \
+            gpscoordinates_from_heic.get('GPSAltitudeRef', 0)
 
 
     def get_creationdate_from_heic(self, heif_exif_dict):
@@ -190,7 +162,8 @@ class HEICFile:
         Returns:
             str: creationdate of HEIC file
         """
-        if heif_exif_dict['0th'] is not None and "DateTime" in heif_exif_dict['0th'].keys():
+        if heif_exif_dict is not None and heif_exif_dict['0th'] is not None and \
+           "DateTime" in heif_exif_dict['0th'].keys():
             heic_creationdate = heif_exif_dict['0th']["DateTime"].decode('UTF-8')
             return heic_creationdate
 
@@ -200,7 +173,7 @@ class HEICFile:
 class MP4XMLFile:
     """ Class for XML files accompanying MP4 files.  
     """
-    def __init__(self, mediafile_location_disk, logger):
+    def __init__(self, mediafile_location_disk, logger, extra_fields=()):
         self.geocoordinate_in_degrees = None
         self.mediafile_location_disk = mediafile_location_disk
         logger.debug('mediafile_location_disk: %s', mediafile_location_disk)
@@ -210,38 +183,20 @@ class MP4XMLFile:
         logger.debug("Run method: get_creationdate")
         self.mediafile_creationdate = self.get_creationdate(xml_metadata)
         logger.debug("Run method: get_geocoordinates_from_metadata")
-        self.mediafile_geolocation = self.get_geocoordinates_from_metadata(xml_metadata)
-
-    def convert_geocoordinate_to_decimals(self, geocoordinate_in_degrees, reference):
-        """ convert_sony_geocoordinate_to_decimals
-            Converts geocoordinates in degrees, minutes, seconds to decimals.
-
-        Args:
-            geocoordinate_in_degrees (str): string with geocoordinates in degrees, 
-                                            minutes, seconds
-
-        Returns:
-            float: geo coordinate in decimals
-        """
-        # print(f"geocoordinate_in_degrees: {geocoordinate_in_degrees}")
-        degree, minute, second = re.split(':', geocoordinate_in_degrees)
-        geocoordinates_in_decimals = float(degree) + float(minute) / 60 + float(second) / (60 * 60)
-        if reference in ['S', 'W']:
-            geocoordinates_in_decimals = geocoordinates_in_decimals * -1
-        return geocoordinates_in_decimals
+        self.mediafile_raw_geolocation = self.get_geocoordinates_from_metadata(xml_metadata)
+        logger.debug('creationdate: %s, raw geolocation: %s', self.mediafile_creationdate,
+                     self.mediafile_raw_geolocation)
+        # Like the GPS items Speed, Track or DOP
+        self.mediafile_extra_values = select_extra_fields([xml_metadata], extra_fields)
 
     def get_metadata_from_xml(self, mediafile_location_disk):
         """ video_metadata
+            Streams through the XML file until the creationdate and GPS items are read.
 
         Returns:
-            dict: XML data from video file
+            dict: CreationDate and ExifGPS items from XML file
         """
-        print(f"mediafile_location_disk: {mediafile_location_disk}")
-        # print(f"type of mediafile_location_disk: {type(mediafile_location_disk)}")
-        # Convert Path object to string
-        # To prevent this error: AttributeError: 'PosixPath' object has no attribute 'read'
-        mediafile_location_disk_str = str(mediafile_location_disk)
-        video_metadata = minidom.parse(mediafile_location_disk_str)
+        video_metadata = read_nonrealtimemeta(mediafile_location_disk)
         return video_metadata
 
     def get_creationdate(self, video_metadata):
@@ -250,89 +205,34 @@ class MP4XMLFile:
         Returns:
             str: creationdate of video file
         """
-        video_creationdates = video_metadata.getElementsByTagName('CreationDate')
-        for video_creationdate_item in video_creationdates:
-            print(video_creationdate_item.attributes['value'].value)
-            video_creationdate = video_creationdate_item.attributes['value'].value
-        print(f"video_creationdate: {video_creationdate}")
+        video_creationdate = video_metadata.get('CreationDate')
         return video_creationdate
 
     def get_geocoordinates_from_metadata(self, video_metadata):
         """ video_geocoordinates
 
         Returns:
-            tuple: latitude, longitude, altitude of video file
+            tuple: raw geolocation of video file, see geo_convert, or None
         """
-        # Get XML data
-        global altitude_direction
-        gpscoordinates_exist = None
-        video_latitude = None
-        video_longitude = None
-        video_altitude = None
-        video_geolocation = None
-        video_metadata_items = video_metadata.getElementsByTagName('Item')
-        count_latitude_elements = 0
-        for video_metadata_element in video_metadata_items:
-            if video_metadata_element.attributes['name'].value == "AltitudeRef":
-                altitude_direction = video_metadata_element.attributes['value'].value
-
-                # make sure altitude_direction is an integer
-                altitude_direction = int(altitude_direction)
-
-            if video_metadata_element.attributes['name'].value == "Latitude":
-                count_latitude_elements += 1
-                gpscoordinates_exist = True
-                video_latitude = video_metadata_element.attributes['value'].value
-
-            if video_metadata_element.attributes['name'].value == "LatitudeRef":
-                video_latituderef = video_metadata_element.attributes['value'].value
-                print(f"video_latituderef: {video_latituderef}")
-
-            if video_metadata_element.attributes['name'].value == "Longitude":
-                video_longitude = video_metadata_element.attributes['value'].value
-
-            if video_metadata_element.attributes['name'].value == "LongitudeRef":
-                video_longituderef = video_metadata_element.attributes['value'].value
-
-            if video_metadata_element.attributes['name'].value == "Altitude":
-                video_altitude = video_metadata_element.attributes['value'].value
-
-        # print(f"Latitude: {video_latitude}, Longitude: {video_longitude}, Altitude: {video_altitude}, AltitudeRef: {altitude_direction}")
-
-        # print(f"count_latitude_elements: {count_latitude_elements}")
-        if count_latitude_elements == 0:
-            gpscoordinates_exist = False
-
-        print(f"gpscoordinates_exist: {gpscoordinates_exist}")
-        if gpscoordinates_exist is True:
-            if 'video_latitude' in locals() and gpscoordinates_exist is True:
-                latdecimal = self.convert_geocoordinate_to_decimals(video_latitude, video_latituderef)
-                longdecimal = self.convert_geocoordinate_to_decimals(video_longitude, video_longituderef)
-                # Sometimes only the altitude is missing
-                if video_altitude is None:
-                    video_altitude = 0
-
-                if altitude_direction == 0:
-                    video_altitude_float = float(video_altitude)
-                elif altitude_direction == 1:
-                    # Below sea level
-                    video_altitude_float = -float(video_altitude)
-                else:
-                    video_altitude_float = 0
-
-                video_geolocation = (latdecimal, longdecimal, video_altitude_float)
-                print(f"geolocation: {video_geolocation}")
-            return video_geolocation
-        else:
+        gpscoordinates_exist = 'Latitude' in video_metadata
+        if not gpscoordinates_exist:
             return None
 
+        # Degrees, minutes, seconds strings like 45:4:8.70, converted later with the other files
+        video_geolocation = (video_metadata['Latitude'], video_metadata.get('LatitudeRef'),
+                             video_metadata['Longitude'], video_metadata.get('LongitudeRef'),
+                             # Sometimes only the altitude is missing
+                             video_metadata.get('Altitude', 0),
+                             video_metadata.get('AltitudeRef', 0))
+        return video_geolocation
+
 # End of class MP4XMLFile
 
 
 class JpegFile:
     """ JpegFile class
     """
-    def __init__(self, mediafile_location_disk, logger):
+    def __init__(self, mediafile_location_disk, logger, extra_fields=()):
         # self.geocoordinate_in_degrees = None
         # self.mediafile_location_disk = mediafile_location_disk
         # self.mediafile_type = photofile_type
@@ -342,51 +242,54 @@ class JpegFile:
         self.geocoordinate_in_degrees = None
         self.mediafile_location_disk = mediafile_location_disk
         logger.debug('mediafile_location_disk: %s', mediafile_location_disk)
-        print(f"mediafile_location_disk: {mediafile_location_disk}")
         logger.debug('Run JpegFile method: get_exif_from_jpeg')
-        self.mediafile_metadata = self.get_exif_from_jpeg(mediafile_location_disk, logger)
+        # The EXIF data isn't kept in the object, only the fields that are used
+        mediafile_metadata = self.get_exif_from_jpeg(mediafile_location_disk, logger,
+                                                     extra_fields)
         logger.debug('Run JpegFile method: get_exif_labeled')
-        self.jpeg_metadata_labeled = self.get_exif_labeled(self.mediafile_metadata, logger)
+        jpeg_metadata_labeled = self.get_exif_labeled(mediafile_metadata, logger)
         logger.debug('Run JpegFile method: mediafile_creationdate')
-        self.mediafile_creationdate = self.get_creationdate_from_jpeg(self.jpeg_metadata_labeled)
-        # print(f"self.jpeg_metadata_labeled: {self.jpeg_metadata_labeled}")
-        if self.jpeg_metadata_labeled is not None:
-            if 'GPSInfo' in self.jpeg_metadata_labeled:
+        self.mediafile_creationdate = self.get_creationdate_from_jpeg(jpeg_metadata_labeled)
+        # print(f"jpeg_metadata_labeled: {jpeg_metadata_labeled}")
+        if jpeg_metadata_labeled is not None:
+            if 'GPSInfo' in jpeg_metadata_labeled:
                 logger.debug('Run JpegFile method: get_geocoordinates_from_jpeg')
-                self.mediafile_geolocation = self.get_geocoordinates_from_jpeg( \
-                    self.jpeg_metadata_labeled)
+                self.mediafile_raw_geolocation = self.get_geocoordinates_from_jpeg( \
+                    jpeg_metadata_labeled)
             else:
-                self.mediafile_geolocation = None
+                self.mediafile_raw_geolocation = None
+            self.mediafile_extra_values = select_extra_fields(
+                [jpeg_metadata_labeled, jpeg_metadata_labeled.get('GPSInfo')], extra_fields)
         else:
-            self.mediafile_geolocation = None
+            self.mediafile_raw_geolocation = None
+            self.mediafile_extra_values = select_extra_fields([], extra_fields)
 
-    def convert_exif_geocoordinate_to_decimals(self, geocoordinate_in_degrees, reference):
-        """ Convert geocoordinates in degrees, minutes, seconds to decimals.
+    def get_exif_from_jpeg(self, mediafile_location_disk, logger, extra_fields=()):
+        """ Gets EXIF data from JPG file.
+            Reads only the EXIF block from the JPEG header. If that fails,
+            the file is opened with Pillow.
 
         Args:
-            geocoordinate_in_degrees (list): geo coordinate in degrees, minutes, seconds
-            reference (str): 'N', 'S', 'E' or 'W'
-
-        Returns:
-            float: geo coordinate in decimals
-        """ 
-        geocoordinates_in_decimals = float(geocoordinate_in_degrees[0]) + \
-                                     float(geocoordinate_in_degrees[1]) / 60 + \
-                                     float(geocoordinate_in_degrees[2]) / (60 * 60)
-        # Southern or Western hemisphere needs to be negative
-        # Had to add b'W' and b'S' to the list of references because
-        # the reference is sometimes a byte string
-        if reference in ['S', 'W', b'S', b'W']:
-            geocoordinates_in_decimals = geocoordinates_in_decimals * -1
-        return geocoordinates_in_decimals
-
-    def get_exif_from_jpeg(self, mediafile_location_disk, logger):
-        """ Gets EXIF data from JPG file.
+            extra_fields (tuple): names of extra fields to read too, like Model or LensModel
 
         Returns:
             dict: EXIF data
         """
         logger.debug('JpegFile Method: get_exif_from_jpeg')
+        extra_tags = ()
+        if extra_fields:
+            from PIL.ExifTags import TAGS
+
+            # The header reader only reads the tags it is asked for
+            extra_tags = {tag for tag, name in TAGS.items() if name in extra_fields}
+        try:
+            return read_jpeg_exif(mediafile_location_disk, extra_tags)
+        except (ExifFormatError, struct.error) as error:
+            logger.debug('Reading JPEG header failed, falling back to Pillow: %s', error)
+        # Pillow is only imported when the JPEG header can't be read
+        import PIL
+        from PIL import Image
+
         try:
             image = Image.open(mediafile_location_disk)
             image.verify()
@@ -394,10 +297,10 @@ class JpegFile:
             # print(f"jpeg_exif: {jpeg_exif}")
             return jpeg_exif
         except PIL.UnidentifiedImageError:
-            print("Unidentified Image Error")
+            logger.warning('Unidentified image: %s', mediafile_location_disk)
             return None
         except PIL.Image.DecompressionBombError:
-            print("Decompression Bomb Error")
+            logger.warning('Decompression bomb: %s', mediafile_location_disk)
             return None
         except AttributeError:
             return None
@@ -409,10 +312,16 @@ class JpegFile:
             dict: EXIF data with labels
         """
         logger.debug('JpegFile Method: get_exif_labeled')
+        from PIL.ExifTags import TAGS, GPSTAGS
+
         labeled = {}
         if jpeg_metadata is not None:
             for (key, val) in jpeg_metadata.items():
                 labeled[TAGS.get(key)] = val
+            # GPSInfo is a dictionary of its own, with GPS tag numbers as keys
+            if isinstance(labeled.get('GPSInfo'), dict):
+                labeled['GPSInfo'] = {GPSTAGS.get(key, key): val \
+                                      for (key, val) in labeled['GPSInfo'].items()}
             # print(f"labeled: {labeled}")
             return labeled
         else:
@@ -433,105 +342,919 @@ class JpegFile:
             return None
 
     def get_geocoordinates_from_jpeg(self, jpeg_metadata_labeled):
-        """ Gets geocoordinates from JPG file.
+        """ Gets the raw geocoordinates from JPG file.
 
         Returns:
-            float: latitude,
-            float: longitude,
-            float: altitude of JPG file
-        """        
-        # Get XML data
-        photo_latitude = None
-        photo_longitude = None
-        photo_altitude = None
+            tuple: raw geolocation of JPG file, see geo_convert, or None
+        """
+        jpggeotags = jpeg_metadata_labeled['GPSInfo']
+        if not isinstance(jpggeotags, dict) or "GPSLatitude" not in jpggeotags or \
+           "GPSLongitude" not in jpggeotags:
+            return None
+        # Degrees, minutes, seconds, converted later with the other files
+        return jpggeotags['GPSLatitude'], jpggeotags.get('GPSLatitudeRef'), \
+            jpggeotags['GPSLongitude'], jpggeotags.get('GPSLongitudeRef'), \
+            jpggeotags.get('GPSAltitude', 0), jpggeotags.get('GPSAltitudeRef', 0)
+
+# End of class PhotoFile
+
 
+class MP4VideoFile:
+    """ Class for MP4 and MOV video files with GPS data.
+        Reads the GPS data from the video file itself, without exiftool.
+    """
+    def __init__(self, mediafile_location_disk, logger, extra_fields=()):
+        self.geocoordinate_in_degrees = None
+        self.mediafile_location_disk = mediafile_location_disk
+        logger.debug('mediafile_location_disk: %s', mediafile_location_disk)
+        logger.debug('Run MP4VideoFile method: get_gps_from_mp4')
+        # There are no extra fields in MP4 files
+        self.mediafile_extra_values = select_extra_fields([], extra_fields)
+        self.mediafile_creationdate, mediafile_geolocation = \
+            self.get_gps_from_mp4(mediafile_location_disk, logger)
+        self.mediafile_raw_geolocation = raw_geolocation_from_decimals(mediafile_geolocation)
+
+    def get_gps_from_mp4(self, mediafile_location_disk, logger):
+        """ Gets creationdate and geocoordinates from MP4 file.
+
+        Returns:
+            str: creationdate of MP4 file (UTC)
+            tuple: latitude, longitude, altitude or None
+        """
         try:
-            jpggeotags = jpeg_metadata_labeled['GPSInfo']
-            photo_latitude = \
-                self.convert_exif_geocoordinate_to_decimals(jpggeotags['GPSLatitude'],
-                                                            jpggeotags['GPSLatitudeRef'])
-            photo_longitude = \
-                self.convert_exif_geocoordinate_to_decimals(jpggeotags['GPSLongitude'],
-                                                            jpggeotags['GPSLongitudeRef'])
-            if jpggeotags["GPSAltitudeRef"] == b'\x00':
-                photo_altitude = float(jpggeotags["GPSAltitude"])
-            else:
-                # Below sea level
-                photo_altitude = -float(jpggeotags["GPSAltitude"])
-            return photo_latitude, photo_longitude, photo_altitude
-        except:
-            pass
+            return read_mp4_gps(mediafile_location_disk)
+        except MP4FormatError as error:
+            logger.warning('MP4 format error in %s: %s', mediafile_location_disk, error)
+            return None, None
 
-# End of class PhotoFile
+# End of class MP4VideoFile
 
-def get_coordinates_from_media_files(media_files, extension, logger):
-    """ Gets geocoordinates for media files.
+def select_extra_fields(metadata_dicts, extra_fields):
+    """ Picks the extra fields from the metadata of a media file.
 
     Args:
-        media_files (list): List of media files
+        metadata_dicts (list): dictionaries with metadata, searched in order. None is skipped.
+        extra_fields (tuple): names of the extra fields, like Model or LensModel
+
+    Returns:
+        tuple: value per extra field, None if the media file doesn't have it
+    """
+    extra_values = []
+    for extra_field in extra_fields:
+        value = None
+        for metadata in metadata_dicts:
+            if isinstance(metadata, dict) and extra_field in metadata:
+                value = metadata[extra_field]
+                break
+        # Only small plain values are kept
+        if isinstance(value, bytes):
+            value = value.rstrip(b"\x00").decode("utf-8", errors="replace")
+        elif isinstance(value, tuple) and len(value) == 2 and all(isinstance(number, int)
+                                                                 for number in value):
+            # EXIF rational
+            value = value[0] / value[1] if value[1] else None
+        elif value is not None and not isinstance(value, (str, int, float)):
+            value = str(value)
+        extra_values.append(value)
+    return tuple(extra_values)
+
+
+def get_media_object(media_file, extension, logger, extra_fields=()):
+    """ Creates an object of the class that belongs to the extension.
+
+    Args:
+        media_file (Path): media file
         extension (str): File extension.
         logger (logger thing): logger
+        extra_fields (tuple): names of metadata fields to keep next to the geolocation
 
     Returns:
-        dataframe: Dataframe with geocoordinates from XML files
+        object: HEICFile, MP4XMLFile, JpegFile or MP4VideoFile object
     """
-    logger.info('Method: get_coordinates_from_media_files')
-    extension_with_dot = f".{extension}"
-    # Filter files with specific extension
-    filtered_media_files = [media_file for media_file in media_files \
-                        if media_file.suffix.lower() == extension_with_dot]
-    # Create list of objects of class depending on extension
     if extension == "xml" or extension == "XML":
-        filtered_media_objects = [MP4XMLFile(media_file, logger) \
-                                  for media_file in filtered_media_files]
+        return MP4XMLFile(media_file, logger, extra_fields)
     elif extension == "heic" or extension == "HEIC":
-        filtered_media_objects = [HEICFile(media_file, logger) \
-                                  for media_file in filtered_media_files]
+        return HEICFile(media_file, logger, extra_fields)
     elif extension == "jpeg" or extension == "jpg":
-        filtered_media_objects = [JpegFile(media_file, logger) \
-                                  for media_file in filtered_media_files]
-
-    # Create list of filenames for the index of the data frame
-    filtered_media_files_list = [media_file.mediafile_location_disk \
-                                 for media_file in filtered_media_objects]
-    logging.debug('filtered_media_files_list: %s', filtered_media_files_list)
-
-    # Create dataframe for media files with geolocation data
-    media_files_df = pd.DataFrame(columns=["creationdate", "latitude", "longitude", "altitude"], \
-                                  index=[filtered_media_files_list])
-    # Go through filtered media files and add geolocation data to dataframe
-    for media_file_object in filtered_media_objects:
-        logger.debug('media_file_object.mediafile_geolocation: %s' \
-                     , media_file_object.mediafile_geolocation)
-        # If mediafile_geolocation is NaN, skip this file
-        if media_file_object.mediafile_geolocation is None:
-            print(f"Skipping {media_file_object.mediafile_location_disk}")
-            logger.debug('Skipping %s', media_file_object.mediafile_location_disk)
+        return JpegFile(media_file, logger, extra_fields)
+    elif extension in ("mp4", "mov"):
+        return MP4VideoFile(media_file, logger, extra_fields)
+
+
+def walk_media_files(media_paths, media_file_extensions, logger, follow_symlinks=False,
+                     unreadable_paths=None):
+    """ Walks through the media paths once and yields the media files it finds.
+        Uses os.scandir, so the file type of each entry is known without an extra stat.
+        It is a generator, so media files can be read while the walk is still going on.
+
+    Args:
+        media_paths (list): directories with media files
+        media_file_extensions (list): extensions of media files to look for. Case insensitive.
+        logger (logger thing): logger
+        follow_symlinks (bool): follow symbolic links to files and directories
+        unreadable_paths (list): gets the directories and files that couldn't be read,
+                                 so the walk is not complete. Default: they are only logged
+
+    Yields:
+        str: extension of media file in lower case, without dot
+        Path: media file
+    """
+    logger.info('Method: walk_media_files')
+    if unreadable_paths is None:
+        unreadable_paths = []
+    suffixes = {f".{extension.lower()}" for extension in media_file_extensions}
+    # Directories already visited, to prevent loops through symlinks
+    visited_directories = set()
+    directories = list(reversed(media_paths))
+    while directories:
+        directory = directories.pop()
+        if follow_symlinks:
+            try:
+                directory_stat = os.stat(directory)
+            except OSError as error:
+                logger.warning('Cannot read directory %s: %s', directory, error)
+                unreadable_paths.append(directory)
+                continue
+            directory_key = (directory_stat.st_dev, directory_stat.st_ino)
+            if directory_key in visited_directories:
+                continue
+            visited_directories.add(directory_key)
+        try:
+            with os.scandir(directory) as directory_entries:
+                entries = sorted(directory_entries, key=lambda entry: entry.name)
+        except OSError as error:
+            logger.warning('Cannot read directory %s: %s', directory, error)
+            unreadable_paths.append(directory)
+            continue
+        subdirectories = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    subdirectories.append(entry.path)
+                    continue
+                suffix = os.path.splitext(entry.name)[1].lower()
+                if suffix in suffixes and entry.is_file(follow_symlinks=follow_symlinks):
+                    yield suffix[1:], Path(entry.path)
+            except OSError as error:
+                logger.warning('Cannot read %s: %s', entry.path, error)
+                unreadable_paths.append(entry.path)
+        # Depth first, in name order
+        directories.extend(reversed(subdirectories))
+
+
+# Number of media files the walk can be ahead of the reading
+WALK_QUEUE_SIZE = 10000
+
+
+def prefetch(items, queue_size):
+    """ Runs a generator in a background thread, through a bounded queue.
+        The generator can get at most queue_size items ahead of the consumer,
+        so memory stays bounded when the consumer is slower.
+
+    Args:
+        items (iterable): items, like the media files from walk_media_files
+        queue_size (int): maximum number of items waiting in the queue
+
+    Yields:
+        items in the same order
+    """
+    item_queue = queue.Queue(maxsize=queue_size)
+    end_of_items = object()
+
+    def produce():
+        try:
+            for item in items:
+                item_queue.put(item)
+        except Exception as error:  # pylint: disable=broad-except
+            # Raised again in the consumer
+            item_queue.put((end_of_items, error))
+            return
+        item_queue.put((end_of_items, None))
+
+    # A daemon thread doesn't keep the program running if the consumer stops early
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = item_queue.get()
+        if isinstance(item, tuple) and len(item) == 2 and item[0] is end_of_items:
+            if item[1] is not None:
+                raise item[1]
+            return
+        yield item
+
+
+def extract_media_file(media_file, extension, extra_fields=()):
+    """ Reads creationdate and geolocation of one media file.
+        Runs in the worker processes and threads of get_coordinates_from_media_files,
+        so errors are caught here. One bad file doesn't stop the whole run.
+        Only the values are returned, the media file object with its metadata is released.
+
+    Args:
+        media_file (Path): media file
+        extension (str): File extension.
+        extra_fields (tuple): names of metadata fields to keep next to the geolocation
+
+    Returns:
+        str: creationdate of media file
+        tuple: raw geolocation, see geo_convert, or None
+        str: error message or None if the file was read successfully
+        tuple: value per extra field
+    """
+    logger = logging.getLogger()
+    try:
+        media_file_object = get_media_object(media_file, extension, logger, extra_fields)
+        return media_file_object.mediafile_creationdate, \
+            media_file_object.mediafile_raw_geolocation, None, \
+            media_file_object.mediafile_extra_values
+    except Exception as error:  # pylint: disable=broad-except
+        # Logged with the other errors by read_media_files, in the main process
+        logger.debug('Error reading %s: %r', media_file, error)
+        return None, None, repr(error), (None,) * len(extra_fields)
+
+
+# Extensions that are read in a thread pool instead of a process pool
+IO_BOUND_EXTENSIONS = {"xml", "mp4", "mov"}
+# Extensions that are read with exiftool
+EXIFTOOL_EXTENSIONS = {"mts"}
+
+
+class MediaProcessPool:
+    """ Process pool for the CPU-bound media files, started once per scan instead of once
+        per batch. The worker processes are only started when they are needed.
+        A pool with a worker process that died is replaced by a new one.
+    """
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.executor = None
+
+    def map(self, function, *iterables, chunksize=1):
+        """ Runs function in the worker processes, like ProcessPoolExecutor.map.
+
+        Yields:
+            results in the order of the iterables
+
+        Raises:
+            BrokenProcessPool: when a worker process died, the next map gets a new pool
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.jobs)
+        try:
+            yield from self.executor.map(function, *iterables, chunksize=chunksize)
+        except BrokenProcessPool:
+            self.close()
+            raise
+
+    def close(self):
+        """ Stops the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+# End of class MediaProcessPool
+
+
+def extract_media_files(media_files, extension, jobs, exiftool_pool=None, extra_fields=(),
+                        process_pool=None):
+    """ Reads creationdate and geolocation of media files, in parallel if jobs > 1.
+        HEIC and JPEG decoding is CPU-bound and runs in a process pool.
+        Sony XML files are small and for videos only a few boxes are read. That is
+        I/O-bound, so they run in a thread pool.
+        Formats without a reader of our own, like .MTS, are read by the exiftool pool.
+
+    Args:
+        media_files (list): media files with the same extension
+        extension (str): File extension.
+        jobs (int): number of parallel workers
+        exiftool_pool (ExiftoolPool): exiftool workers for EXIFTOOL_EXTENSIONS
+        extra_fields (tuple): names of metadata fields to keep next to the geolocation
+        process_pool (MediaProcessPool): process pool of the scan. Default: a pool for
+                                         this call only
+
+    Returns:
+        list: (creationdate, raw geolocation, error, extra values) per media file,
+              in the order of media_files
+    """
+    no_extra_values = (None,) * len(extra_fields)
+    if extension.lower() in EXIFTOOL_EXTENSIONS:
+        if exiftool_pool is None:
+            return [(None, None, "No exiftool pool", no_extra_values)] * len(media_files)
+        return [(creationdate, raw_geolocation_from_decimals(geolocation), error, no_extra_values)
+                for creationdate, geolocation, error in exiftool_pool.read_gps(media_files)]
+    extensions = [extension] * len(media_files)
+    extra_fields_per_file = [extra_fields] * len(media_files)
+    if jobs <= 1 or len(media_files) <= 1:
+        return list(map(extract_media_file, media_files, extensions, extra_fields_per_file))
+    if extension.lower() in IO_BOUND_EXTENSIONS:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(extract_media_file, media_files, extensions,
+                                     extra_fields_per_file))
+    # Hand out files in chunks to keep the overhead of the process pool low
+    chunksize = max(1, len(media_files) // (jobs * 4))
+    results = []
+    own_process_pool = process_pool is None
+    if own_process_pool:
+        process_pool = MediaProcessPool(jobs)
+    try:
+        results.extend(process_pool.map(extract_media_file, media_files, extensions,
+                                        extra_fields_per_file, chunksize=chunksize))
+    except BrokenProcessPool as error:
+        # A worker process died, like from a crash in an image library.
+        # The media files without a result fail, the rest of the scan goes on.
+        logging.getLogger().error('Worker process died reading %s files: %r',
+                                  extension, error)
+        results.extend([(None, None, f"Worker process died: {error!r}", no_extra_values)]
+                       * (len(media_files) - len(results)))
+    finally:
+        if own_process_pool:
+            process_pool.close()
+    return results
+
+
+class MediaRecord:
+    """ Immutable record of one media file: only path, format, creationdate and
+        geolocation, plus the values of the extra fields that were asked for.
+        With __slots__ a record takes a few hundred bytes, whatever the size of the
+        metadata in the file.
+    """
+    __slots__ = ("path", "extension", "creationdate", "latitude", "longitude", "altitude",
+                 "extra_values")
+
+    def __init__(self, path, extension, creationdate, geolocation, extra_values=()):
+        set_slot = super().__setattr__
+        set_slot("path", str(path))
+        set_slot("extension", extension.lower())
+        set_slot("creationdate", creationdate)
+        if geolocation is None:
+            geolocation = (None, None, None)
+        set_slot("latitude", geolocation[0])
+        set_slot("longitude", geolocation[1])
+        set_slot("altitude", geolocation[2])
+        set_slot("extra_values", tuple(extra_values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MediaRecord is immutable")
+
+    def __repr__(self):
+        return f"MediaRecord({self.path!r}, {self.creationdate!r}, {self.geolocation!r})"
+
+    @property
+    def geolocation(self):
+        """ latitude, longitude, altitude or None
+        """
+        if self.latitude is None:
+            return None
+        return self.latitude, self.longitude, self.altitude
+
+# End of class MediaRecord
+
+
+def read_media_files(media_files, extension, logger, media_cache=None, jobs=1,
+                     exiftool_pool=None, extra_fields=(), run_stats=None, scan_journal=None,
+                     process_pool=None):
+    """ Reads creationdate and geolocation of media files with one extension.
+
+    Args:
+        media_files (list): List of media files with this extension
+        extension (str): File extension.
+        logger (logger thing): logger
+        media_cache (MediaCache): cache with results of earlier runs. Only files that
+                                  are new or changed since the last run are read.
+        jobs (int): number of media files that are read in parallel
+        exiftool_pool (ExiftoolPool): exiftool workers for formats like .MTS
+        extra_fields (tuple): names of metadata fields to keep next to the geolocation.
+                              The cache doesn't have them, so all media files are read.
+        run_stats (RunStats): statistics of the run, counted per extension. Default: none
+        scan_journal (ScanJournal): journal of the scan. Media files in it are not read
+                                    again, the others are stored in it. Default: none
+        process_pool (MediaProcessPool): process pool of the scan for HEIC and JPEG.
+                                         Default: a pool per call
+
+    Returns:
+        list: MediaRecord per media file
+    """
+    logger.info('Method: read_media_files')
+    # Checked once, so the loops don't call the logger for every file
+    debug = logger.isEnabledFor(logging.DEBUG)
+    # Get creationdate and geolocation for each file, from the cache if possible
+    media_file_results = [None] * len(media_files)
+    missed_media_files = []
+    missed_positions = []
+    missed_stats = []
+    # Media records that go in the journal, with the error
+    journal_records = []
+    for position, media_file in enumerate(media_files):
+        file_stat = None
+        if media_cache is not None or scan_journal is not None:
+            try:
+                file_stat = media_file.stat()
+            except OSError as error:
+                # Like removed since the walk
+                logger.warning('Cannot read %s: %s', media_file, error)
+                continue
+        if scan_journal is not None:
+            journal_entry = scan_journal.lookup(media_file, file_stat)
+            if journal_entry is not None:
+                creationdate, geolocation, extra_values, _ = journal_entry
+                media_file_results[position] = MediaRecord(media_file, extension, creationdate,
+                                                           geolocation, extra_values)
+                if media_cache is not None:
+                    media_cache.mark_seen(media_file)
+                continue
+        if media_cache is not None and extra_fields:
+            # The cache has no extra fields, so the file is read again. It still exists,
+            # so prune keeps its cached result.
+            media_cache.mark_seen(media_file)
+        elif media_cache is not None:
+            cache_hit, creationdate, geolocation = media_cache.lookup(media_file, file_stat)
+            if cache_hit:
+                if debug:
+                    logger.debug('Cache hit: %s', media_file)
+                media_file_results[position] = MediaRecord(media_file, extension, creationdate,
+                                                           geolocation)
+                journal_records.append((media_file_results[position], file_stat, None))
+                continue
+        missed_media_files.append(media_file)
+        missed_positions.append(position)
+        missed_stats.append(file_stat)
+
+    with measure_stage(run_stats, f"read {extension}"):
+        extracted = extract_media_files(missed_media_files, extension, jobs, exiftool_pool,
+                                        extra_fields, process_pool)
+    # Coordinates of the whole batch are converted to decimals in one go
+    with measure_stage(run_stats, "convert"):
+        geolocations, out_of_range, unreadable = convert_geolocations(
+            [raw_geolocation for _, raw_geolocation, _, _ in extracted])
+    errors = 0
+    for media_file, position, file_stat, (creationdate, _, error, extra_values), geolocation, \
+            is_out_of_range, is_unreadable in zip(missed_media_files, missed_positions,
+                                                  missed_stats, extracted, geolocations,
+                                                  out_of_range, unreadable):
+        if is_out_of_range:
+            logger.warning('Geolocation out of range in %s', media_file)
+        if is_unreadable:
+            logger.warning("Geolocation can't be read in %s", media_file)
+        if error is not None:
+            errors += 1
+            logger.warning('Error reading %s: %s', media_file, error)
+        elif media_cache is not None:
+            # Failed files are not cached, so they are tried again next run
+            media_cache.store(media_file, file_stat, creationdate, geolocation)
+        media_file_results[position] = MediaRecord(media_file, extension, creationdate,
+                                                   geolocation, extra_values)
+        journal_records.append((media_file_results[position], file_stat, error))
+    if media_cache is not None:
+        media_cache.commit()
+    if scan_journal is not None:
+        for media_record, file_stat, error in journal_records:
+            scan_journal.store(media_record, file_stat, error)
+        # Checkpoint: a scan that stops after this reads this batch not again
+        scan_journal.commit()
+    if run_stats is not None:
+        run_stats.count(extension, "files", len(media_files))
+        run_stats.count(extension, "cache_hits",
+                        len(journal_records) - len(missed_media_files))
+        run_stats.count(extension, "files_read", len(missed_media_files))
+        run_stats.count(extension, "errors", errors)
+        run_stats.count(extension, "out_of_range", int(np.count_nonzero(out_of_range)))
+        run_stats.count(extension, "unreadable_geolocation", int(np.count_nonzero(unreadable)))
+
+    # Without the media files that couldn't be read
+    return [media_record for media_record in media_file_results if media_record is not None]
+
+
+# Number of media files with the same extension that are read together
+MEDIA_FILE_BATCH_SIZE = 1000
+# The first batch of each extension is small, so the first results come quickly.
+# Batches double in size after that, up to MEDIA_FILE_BATCH_SIZE.
+FIRST_BATCH_SIZE = 50
+
+
+class MediaRecordBuilder:
+    """ Collects media files with geolocation data column by column.
+        The dataframe is built once at the end, instead of adding a row per file.
+    """
+    def __init__(self, extra_fields=()):
+        self.filenames = []
+        self.extensions = []
+        self.creationdates = []
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.altitudes = array('d')
+        self.extra_columns = {extra_field: [] for extra_field in extra_fields}
+
+    def append(self, media_record):
+        """ Adds a media file with geolocation data.
+
+        Args:
+            media_record (MediaRecord): media file with geolocation
+        """
+        self.filenames.append(media_record.path)
+        self.extensions.append(media_record.extension)
+        self.creationdates.append(media_record.creationdate)
+        self.latitudes.append(float(media_record.latitude))
+        self.longitudes.append(float(media_record.longitude))
+        self.altitudes.append(float(media_record.altitude))
+        for extra_column, value in zip(self.extra_columns.values(), media_record.extra_values):
+            extra_column.append(value)
+
+    def to_dataframe(self):
+        """ Builds the dataframe.
+
+        Returns:
+            dataframe: creationdate (datetime64), latitude, longitude, altitude (float64),
+                       extension and the extra fields, indexed by filename
+        """
+        # pandas takes a while to import, it is only needed from here on
+        import pandas as pd
+
+        return pd.DataFrame({
+            "creationdate": parse_creationdates(self.creationdates),
+            "latitude": np.frombuffer(self.latitudes, dtype=np.float64),
+            "longitude": np.frombuffer(self.longitudes, dtype=np.float64),
+            "altitude": np.frombuffer(self.altitudes, dtype=np.float64),
+            "extension": pd.Categorical(self.extensions),
+            **{extra_field: np.array(values, dtype=object)
+               for extra_field, values in self.extra_columns.items()},
+        }, index=pd.Index(self.filenames, name="filename"))
+
+# End of class MediaRecordBuilder
+
+
+def parse_creationdates(creationdates):
+    """ Converts creationdates to datetimes.
+        EXIF dates look like 2021:08:14 11:27:22, Sony XML dates like
+        2021-08-14T11:27:22+01:00. The UTC offset is dropped, so all
+        creationdates are in local time of the camera, like EXIF dates.
+
+    Args:
+        creationdates (list): creationdates as strings, or None
+
+    Returns:
+        DatetimeIndex: creationdates, NaT if missing or invalid
+    """
+    import pandas as pd
+
+    creationdates = pd.Series(creationdates, dtype=object).astype("string")
+    # Both formats can have a UTC offset after the time
+    creationdates = creationdates.str.slice(0, 19)
+    exif_dates = pd.to_datetime(creationdates, format="%Y:%m:%d %H:%M:%S", errors="coerce")
+    iso_dates = pd.to_datetime(creationdates, format="%Y-%m-%dT%H:%M:%S", errors="coerce")
+    return pd.DatetimeIndex(exif_dates.fillna(iso_dates))
+
+
+def iter_media_records(media_files, extensions, logger, media_cache=None, jobs=1,
+                       batch_size=MEDIA_FILE_BATCH_SIZE, exiftool_pool=None, extra_fields=(),
+                       run_stats=None, scan_journal=None, process_pool=None):
+    """ Reads media files batch by batch while they are found, and yields their records.
+        Only the media files of the batches being filled are kept in memory.
+
+    Args:
+        media_files (iterable): (extension, media file) pairs, like from walk_media_files
+        extensions (list): File extensions to read. Other media files are ignored.
+        logger (logger thing): logger
+        media_cache (MediaCache): cache with results of earlier runs
+        jobs (int): number of media files that are read in parallel
+        batch_size (int): maximum number of media files with the same extension that are
+                          read together, while the rest of the media files are being found
+        exiftool_pool (ExiftoolPool): exiftool workers for formats like .MTS
+        extra_fields (tuple): names of metadata fields to keep next to the geolocation
+        run_stats (RunStats): statistics of the run. Default: none
+        scan_journal (ScanJournal): journal of the scan. Default: none
+        process_pool (MediaProcessPool): process pool of the scan. Default: a pool per batch
+
+    Yields:
+        MediaRecord: record per media file, with or without geolocation
+    """
+    logger.info('Method: iter_media_records')
+    # Media files per extension, read as soon as a batch is full
+    media_file_batches = {extension: [] for extension in extensions}
+    batch_limits = {extension: min(FIRST_BATCH_SIZE, batch_size) for extension in extensions}
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for extension, media_file in media_files:
+        if debug:
+            logger.debug('media_file: %s', media_file)
+        if extension not in media_file_batches:
+            continue
+        batch = media_file_batches[extension]
+        batch.append(media_file)
+        if len(batch) >= batch_limits[extension]:
+            yield from read_media_files(batch, extension, logger, media_cache, jobs,
+                                        exiftool_pool, extra_fields, run_stats, scan_journal,
+                                        process_pool)
+            media_file_batches[extension] = []
+            batch_limits[extension] = min(batch_limits[extension] * 2, batch_size)
+    for extension, batch in media_file_batches.items():
+        if batch:
+            yield from read_media_files(batch, extension, logger, media_cache, jobs,
+                                        exiftool_pool, extra_fields, run_stats, scan_journal,
+                                        process_pool)
+
+
+def get_coordinates_from_media_files(media_files, extensions, logger, media_cache=None, jobs=1,
+                                     batch_size=MEDIA_FILE_BATCH_SIZE, exiftool_pool=None,
+                                     extra_fields=(), record_sink=None, run_stats=None,
+                                     unlocated_records=None, scan_journal=None,
+                                     process_pool=None):
+    """ Gets geocoordinates for media files.
+        The walk runs in a background thread, a bounded queue ahead of the reading.
+
+    Args:
+        media_files (iterable): (extension, media file) pairs, like from walk_media_files
+        extensions (list): File extensions to read. Other media files are ignored.
+        logger (logger thing): logger
+        media_cache (MediaCache): cache with results of earlier runs. Only files that
+                                  are new or changed since the last run are read.
+        jobs (int): number of media files that are read in parallel
+        batch_size (int): number of media files with the same extension that are read
+                          together, while the rest of the media files are being found
+        exiftool_pool (ExiftoolPool): exiftool workers for formats like .MTS
+        extra_fields (tuple): names of metadata fields that get a column in the dataframe
+        record_sink (object): sink from record_sinks that gets every media record
+                              as soon as it is read. Default: no sink
+        run_stats (RunStats): statistics of the run. Default: none
+        unlocated_records (list): gets the media records without geolocation, for
+                                  geotag_by_time. Default: they are dropped
+        scan_journal (ScanJournal): journal of the scan, for resuming it. Default: none
+        process_pool (MediaProcessPool): process pool of the scan. Default: a pool per batch
+
+    Returns:
+        dataframe: Dataframe with geocoordinates from media files
+    """
+    logger.info('Method: get_coordinates_from_media_files')
+    # Only media files with geolocation are kept, in compact columns for the map
+    media_records = MediaRecordBuilder(extra_fields)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    info = logger.isEnabledFor(logging.INFO)
+    for media_record in iter_media_records(prefetch(media_files, WALK_QUEUE_SIZE), extensions,
+                                           logger, media_cache, jobs, batch_size,
+                                           exiftool_pool, extra_fields, run_stats,
+                                           scan_journal, process_pool):
+        if debug:
+            logger.debug('media_record: %s', media_record)
+        if record_sink is not None:
+            record_sink.write(media_record)
+        # Files without geolocation data are not plotted
+        if media_record.latitude is None:
+            if run_stats is not None:
+                run_stats.count(media_record.extension, "no_geolocation")
+            if info:
+                logger.info('Skipping %s', media_record.path)
+            if unlocated_records is not None:
+                unlocated_records.append(media_record)
         else:
-            # Add geo data to dataframe
-            logger.debug('media_file_xml.mediafile_geolocation: %s', \
-                         media_file_object.mediafile_geolocation)
-            media_files_df = pd.concat([media_files_df, pd.DataFrame([[ \
-                media_file_object.mediafile_creationdate, \
-                media_file_object.mediafile_geolocation[0], \
-                media_file_object.mediafile_geolocation[1], \
-                media_file_object.mediafile_geolocation[2]]], \
-                columns=["creationdate", "latitude", "longitude", "altitude"], \
-                index=[media_file_object.mediafile_location_disk])])
-
-    logger.debug('media_files_df: %s', media_files_df)
+            media_records.append(media_record)
+
+    with measure_stage(run_stats, "dataframe"):
+        media_files_df = media_records.to_dataframe()
+    if debug:
+        logger.debug('media_files_df: %s', media_files_df)
     return media_files_df
 
 
-def plot_map(media_files_df, output_file, logger):
+# Extensions of videos that can have a GPS track
+TRACK_EXTENSIONS = {"mp4", "mov", "mts"}
+
+# Maximum deviation in meters of a simplified track from the full track
+DEFAULT_TRACK_TOLERANCE = 5.0
+
+
+def read_mp4_track_file(media_file):
+    """ Reads the GPS track of an MP4 or MOV video.
+
+    Args:
+        media_file (str): media file
+
+    Returns:
+        ndarray: time per GPS point, or None
+        ndarray: latitude, longitude, altitude per GPS point, or None
+    """
+    try:
+        return read_mp4_track(media_file)
+    except (OSError, MP4FormatError) as error:
+        logging.getLogger().warning('Error reading GPS track of %s: %s', media_file, error)
+        return None, None
+
+
+def read_media_tracks(media_files_df, logger, jobs=1, exiftool_pool=None,
+                      tolerance=DEFAULT_TRACK_TOLERANCE):
+    """ Reads the full GPS tracks of the videos with a geolocation and simplifies them.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        logger (logger thing): logger
+        jobs (int): number of videos that are read in parallel
+        exiftool_pool (ExiftoolPool): exiftool workers for .MTS videos
+        tolerance (float): maximum deviation in meters of a simplified track from the full track
+
+    Returns:
+        list: GPSTrack per video with more than one GPS point
+    """
+    logger.info('Method: read_media_tracks')
+    video_files = media_files_df[media_files_df['extension'].isin(TRACK_EXTENSIONS)]
+    mp4_files = list(video_files.index[video_files['extension'] != "mts"])
+    mts_files = list(video_files.index[video_files['extension'] == "mts"])
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        track_arrays = list(executor.map(read_mp4_track_file, mp4_files))
+    if mts_files and exiftool_pool is not None:
+        track_arrays.extend(exiftool_pool.read_tracks(mts_files))
+    else:
+        track_arrays.extend([(None, None)] * len(mts_files))
+
+    gps_tracks = []
+    for media_file, (times, gps_points) in zip(mp4_files + mts_files, track_arrays):
+        if gps_points is None or len(gps_points) < 2:
+            continue
+        gps_track = GPSTrack(media_file, times, gps_points[:, 0], gps_points[:, 1],
+                             gps_points[:, 2])
+        simplified_track = simplify_track(gps_track, tolerance)
+        logger.debug('GPS track %s: %s points, %s after simplification',
+                     media_file, len(gps_track), len(simplified_track))
+        gps_tracks.append(simplified_track)
+    print(f"GPS tracks: {len(gps_tracks)}")
+    return gps_tracks
+
+
+def add_tracks(my_map, gps_tracks, media_files_df, logger):
+    """ Adds a line per GPS track to a map.
+
+    Args:
+        my_map (folium.Map): map
+        gps_tracks (list): GPSTrack per video
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        logger (logger thing): logger
+    """
+    logger.info('Method: add_tracks')
+    import folium
+
+    for gps_track in gps_tracks:
+        marker_colour, _ = MARKER_STYLES.get(media_files_df.at[gps_track.filename, 'extension'],
+                                             DEFAULT_MARKER_STYLE)
+        locations = np.column_stack((gps_track.latitudes, gps_track.longitudes)).tolist()
+        folium.PolyLine(locations, color=marker_colour, weight=3, opacity=0.8,
+                        tooltip=gps_track.filename).add_to(my_map)
+
+
+def add_heatmap(my_map, media_files_df, grid_sizes, logger):
+    """ Adds a density heatmap layer per grid size to the map. The layers can be
+        switched on and off next to the markers. Only the coarsest one is shown at first.
+
+    Args:
+        my_map (folium.Map): map
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        grid_sizes (tuple): cells per side of the density grids, see density_grid
+        logger (logger thing): logger
+    """
+    logger.info('Method: add_heatmap')
+    from folium.plugins import HeatMap
+
+    latitudes = media_files_df['latitude'].to_numpy()
+    longitudes = media_files_df['longitude'].to_numpy()
+    for position, grid_size in enumerate(sorted(grid_sizes)):
+        heat_points = density_grid(latitudes, longitudes, grid_size)
+        logger.debug('Density grid %s: %s cells with media files', grid_size, len(heat_points))
+        # The weights are already relative to the fullest cell
+        HeatMap(heat_points, name=f"Density {grid_size}x{grid_size}",
+                show=position == 0).add_to(my_map)
+
+
+# Marker colour and icon per extension
+MARKER_STYLES = {
+    "heic": ('red', 'camera'),
+    "jpg": ('darkred', 'camera'),
+    "jpeg": ('darkred', 'camera'),
+    "mp4": ('blue', 'facetime-video'),
+    "mov": ('blue', 'facetime-video'),
+    "xml": ('blue', 'facetime-video'),
+    "mts": ('darkblue', 'facetime-video'),
+}
+DEFAULT_MARKER_STYLE = ('lightgray', 'question-sign')
+
+# Javascript that creates a marker for a row of the FastMarkerCluster data:
+# [latitude, longitude, marker style index, filename, creationdate, place, copies]
+MARKER_CLUSTER_CALLBACK = """(function () {
+    var markerStyles = %s;
+    return function (row) {
+        var style = markerStyles[row[2]];
+        var icon = L.AwesomeMarkers.icon(
+            {markerColor: style[0], iconColor: 'white', icon: style[1], prefix: 'glyphicon'});
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+        marker.bindPopup('filename: ' + row[3] + '</br> creationdate: ' + row[4] +
+                         (row[5] ? '</br> place: ' + row[5] : '') +
+                         (row[6] ? '</br> copies: ' + row[6] : ''));
+        return marker;
+    };
+})()"""
+
+
+def get_marker_style_indexes(media_files_df):
+    """ Gets the marker style of every media file, as an index in a list of marker styles.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+
+    Returns:
+        list: marker styles, (colour, icon) with the default style last
+        series: index of the marker style of every media file
+    """
+    marker_styles = list(MARKER_STYLES.values()) + [DEFAULT_MARKER_STYLE]
+    style_indexes = {extension: index for index, extension in enumerate(MARKER_STYLES)}
+    style_index = media_files_df['extension'].astype(object).map(style_indexes) \
+        .fillna(len(marker_styles) - 1).astype(int)
+    return marker_styles, style_index
+
+
+def get_marker_rows(media_files_df):
+    """ Gets the data of the markers as compact rows, for markers made in the browser.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+
+    Returns:
+        list: marker styles, (colour, icon) with the default style last
+        list: [latitude, longitude, marker style index, filename, creationdate] per media file
+    """
+    marker_styles, style_index = get_marker_style_indexes(media_files_df)
+    creationdates = media_files_df['creationdate'].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+    marker_rows = [list(row) for row in zip(media_files_df['latitude'].round(6).tolist(),
+                                            media_files_df['longitude'].round(6).tolist(),
+                                            style_index.tolist(),
+                                            media_files_df.index.tolist(),
+                                            creationdates.tolist())]
+    return marker_styles, marker_rows
+
+
+def get_copy_counts(media_files_df):
+    """ Gets the number of copies of every media file, from the column duplicates.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+
+    Returns:
+        series: number of other paths of the same media file, 0 without duplicates column
+    """
+    # pandas is already imported for the dataframe
+    import pandas as pd
+
+    if 'duplicates' not in media_files_df.columns:
+        return pd.Series(0, index=media_files_df.index)
+    return media_files_df['duplicates'].map(
+        lambda duplicates: len(duplicates.split(os.pathsep)) if isinstance(duplicates, str) else 0)
+
+
+def get_place_names(media_files_df):
+    """ Gets the place name of every media file, from the column place.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+
+    Returns:
+        list: place name of every media file, '' without a place or place column
+    """
+    if 'place' not in media_files_df.columns:
+        return [''] * len(media_files_df)
+    return media_files_df['place'].fillna('').tolist()
+
+
+def add_marker_cluster(my_map, media_files_df, logger):
+    """ Adds all media files as one clustered layer to the map.
+        The points are written once as a compact data array and the markers are
+        created in the browser, so the html file stays small for large numbers of files.
+
+    Args:
+        my_map (folium.Map): map
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        logger (logger thing): logger
+    """
+    logger.info('Method: add_marker_cluster')
+    from folium.plugins import FastMarkerCluster
+
+    marker_styles, marker_data = get_marker_rows(media_files_df)
+    copies = get_copy_counts(media_files_df).tolist()
+    marker_data = [row + [place, copy_count] for row, place, copy_count
+                   in zip(marker_data, get_place_names(media_files_df), copies)]
+    callback = MARKER_CLUSTER_CALLBACK % json.dumps([list(style) for style in marker_styles])
+    FastMarkerCluster(marker_data, callback=callback, name="Media files").add_to(my_map)
+
+
+def plot_map(media_files_df, output_file, logger, render_mode="markers", gps_tracks=None,
+             heatmap_grids=None):
     """ Plots a map with markers for media files with geolocation data.
 
     Args:
         media_files_df (dataframe): Dataframe with media files and geolocation data
         output_file (str): Name of output file
         logger (logger thing): logger
+        render_mode (str): "markers" for a separate marker per media file,
+                           "cluster" for clustered markers created in the browser
+        gps_tracks (list): GPSTrack per video, drawn as lines. Default: no tracks
+        heatmap_grids (tuple): cells per side of the density heatmap layers.
+                               Default: no heatmap
     """
     logger.info('Method: plot_map')
+    # folium is only imported when a map is made
+    import folium
+
     # Find center of folium map
     latitude_mean = media_files_df['latitude'].mean()
     longitude_mean = media_files_df['longitude'].mean()
@@ -539,78 +1262,453 @@ def plot_map(media_files_df, output_file, logger):
     # Make folium map
     my_map = folium.Map(location=[latitude_mean, longitude_mean], zoom_start=12)
 
+    if gps_tracks:
+        add_tracks(my_map, gps_tracks, media_files_df, logger)
+
+    if heatmap_grids:
+        add_heatmap(my_map, media_files_df, heatmap_grids, logger)
+
+    if render_mode == "cluster":
+        add_marker_cluster(my_map, media_files_df, logger)
+        if heatmap_grids:
+            folium.LayerControl().add_to(my_map)
+        my_map.save(f'{output_file}')
+        return
+
+    # With a heatmap the markers are a layer that can be switched off
+    marker_layer = my_map
+    if heatmap_grids:
+        marker_layer = folium.FeatureGroup(name="Media files").add_to(my_map)
+
     # Create folium markers. With filename and creationdate in popup.
+    debug = logger.isEnabledFor(logging.DEBUG)
+    has_places = 'place' in media_files_df.columns
+    copies = get_copy_counts(media_files_df)
     for index, georow in media_files_df.iterrows():
-        # Get extension of filename from the (POSIX) index
-        # print(f"index: {index}")
-        extension = str(index).split(".")[1].split("'")[0].lower()
-        # print(f"extension: {extension}")
-
-        if extension == "heic":
-            marker_colour = 'red'
-            marker_icon = 'camera'
-        elif extension == "jpg" or \
-             extension == "jpeg":
-            marker_colour = 'darkred'
-            marker_icon = 'camera'
-        elif extension == "mp4":
-            marker_colour = 'blue'
-            marker_icon = 'facetime-video'
-        elif extension == "mp4" or extension == "xml":
-            marker_colour = 'blue'
-            marker_icon = 'facetime-video'
-        elif extension == "mts":
-            marker_colour = 'darkblue'
-            marker_icon = 'facetime-video'
-        else:
-            marker_colour = 'lightgray'
-            marker_icon = 'question-sign'
-        logger.debug('marker_colour: %s, marker_icon: %s', marker_colour, marker_icon)
-        logger.debug('georow[latitude]: %s, georow[longitude]: %s, georow[creationdate]: %s', \
-                        georow['latitude'], georow['longitude'], georow['creationdate'])
-
-        if pd.isna(georow['latitude']) or \
-           pd.isna(georow['longitude']) or \
-           georow['latitude'] == "nan" or \
-           georow['longitude'] == "nan":
-            print(f"Skipping {index}")
-            logger.debug('Skipping %s', index)
-        else:
-            folium.Marker([georow['latitude'], georow['longitude']],
-                          popup=f"filename: {index}</br> " \
-                                f"creationdate: {georow['creationdate']}", \
-                          icon=folium.Icon(color=marker_colour, \
-                                            icon_color='white', \
-                                            icon=marker_icon) \
-                        ).add_to(my_map)
-
+        marker_colour, marker_icon = MARKER_STYLES.get(georow['extension'], DEFAULT_MARKER_STYLE)
+        if debug:
+            logger.debug('marker_colour: %s, marker_icon: %s', marker_colour, marker_icon)
+            logger.debug('georow[latitude]: %s, georow[longitude]: %s, georow[creationdate]: %s', \
+                            georow['latitude'], georow['longitude'], georow['creationdate'])
+
+        popup = f"filename: {index}</br> creationdate: {georow['creationdate']}"
+        if has_places and isinstance(georow['place'], str):
+            popup += f"</br> place: {georow['place']}"
+        if copies[index]:
+            popup += f"</br> copies: {copies[index]}"
+        folium.Marker([georow['latitude'], georow['longitude']],
+                      popup=popup, \
+                      icon=folium.Icon(color=marker_colour, \
+                                        icon_color='white', \
+                                        icon=marker_icon) \
+                    ).add_to(marker_layer)
+
+    if heatmap_grids:
+        folium.LayerControl().add_to(my_map)
     my_map.save(f'{output_file}')
 
 
-def main():
-    """ Main function of the program.
+def plot_map_tiles(media_files_df, output_dir, logger):
+    """ Writes the media files as JSON map tiles with a Leaflet page, for very large numbers
+        of media files. The page only loads the tiles on screen, see map_tiles.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        output_dir (str): directory for index.html and the tiles
+        logger (logger thing): logger
     """
+    logger.info('Method: plot_map_tiles')
+    marker_styles, style_index = get_marker_style_indexes(media_files_df)
+    creationdates = media_files_df['creationdate'].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+    tile_count = write_map_tiles(output_dir, media_files_df['latitude'].to_numpy(),
+                                 media_files_df['longitude'].to_numpy(), style_index.to_numpy(),
+                                 [str(filename) for filename in media_files_df.index],
+                                 creationdates.tolist(), marker_styles,
+                                 get_place_names(media_files_df),
+                                 get_copy_counts(media_files_df).tolist())
+    print(f"Map tiles: {tile_count} tiles in {output_dir}."
+          f" Serve it with: python -m http.server -d {output_dir}")
+    logger.debug('Map tiles: %s tiles in %s', tile_count, output_dir)
+
+
+def parse_extra_fields(extra_fields):
+    """ Splits the --extra-fields argument.
 
-    basedir = os.path.abspath(os.path.dirname(__file__))
+    Args:
+        extra_fields (str): names of metadata fields, comma separated
 
+    Returns:
+        tuple: names of the extra fields
+    """
+    return tuple(extra_field.strip() for extra_field in extra_fields.split(",")
+                 if extra_field.strip())
 
-    # Set up logging
-    logger = logging.getLogger()
-    formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
 
-    file_handler = logging.FileHandler(f'{basedir}/log/media_gpsplot3_' \
-                                    f'{datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")}.log')
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
+# Extensions with creationdates in UTC (the mvhd box), not in local time of the camera
+UTC_CREATIONDATE_EXTENSIONS = {"mp4", "mov"}
 
-    logger.addHandler(file_handler)
-    logger.setLevel(logging.DEBUG)
 
-    logger.debug('Start of media_gpsplot3.py')
-    logger.debug('===============================')
-    logger.debug('basedir: %s', basedir)
+def geotag_by_time(unlocated_records, media_files_df, gps_tracks, logger, clock_offset=0.0,
+                   utc_offset=0.0, max_gap=DEFAULT_MAX_TIME_GAP, extra_fields=()):
+    """ Gives media files without geolocation the position of media files and GPS track
+        points from around the same time, see time_geotag.
+
+    Args:
+        unlocated_records (list): MediaRecord per media file without geolocation
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        gps_tracks (list): GPSTrack per video. Default: none
+        logger (logger thing): logger
+        clock_offset (float): seconds added to the creationdates of the media files without
+                              geolocation, for a camera clock that is off
+        utc_offset (float): hours added to the times in UTC, of GPS tracks and of MP4 and
+                            MOV creationdates, to get the local time of the other
+                            creationdates
+        max_gap (float): maximum time in seconds between a media file and a position
+        extra_fields (tuple): names of the extra fields of the media records
+
+    Returns:
+        dataframe: Dataframe with the media files that got a geolocation
+    """
+    logger.info('Method: geotag_by_time')
+    # Everything in local time of the cameras
+    utc_to_local = np.timedelta64(int(round(utc_offset * 3600000)), "ms")
+    located_utc = media_files_df['extension'].isin(UTC_CREATIONDATE_EXTENSIONS).to_numpy()
+    sources = [(media_files_df['creationdate'].to_numpy(dtype="datetime64[ms]") +
+                np.where(located_utc, utc_to_local, np.timedelta64(0, "ms")),
+                media_files_df['latitude'].to_numpy(), media_files_df['longitude'].to_numpy(),
+                media_files_df['altitude'].to_numpy())]
+    for gps_track in gps_tracks or []:
+        sources.append((np.asarray(gps_track.times, dtype="datetime64[ms]") + utc_to_local,
+                        gps_track.latitudes, gps_track.longitudes, gps_track.altitudes))
+    time_index = TimeIndex.from_sources(sources)
+    logger.debug('Time index: %s positions', len(time_index))
+
+    unlocated_utc = np.array([media_record.extension in UTC_CREATIONDATE_EXTENSIONS
+                              for media_record in unlocated_records], dtype=bool)
+    media_times = parse_creationdates([media_record.creationdate
+                                       for media_record in unlocated_records]) \
+        .to_numpy(dtype="datetime64[ms]") + \
+        np.where(unlocated_utc, utc_to_local, np.timedelta64(0, "ms")) + \
+        np.timedelta64(int(round(clock_offset * 1000)), "ms")
+    latitudes, longitudes, altitudes, matched = time_index.locate(media_times, max_gap)
+
+    geotagged_records = MediaRecordBuilder(extra_fields)
+    for position in np.flatnonzero(matched).tolist():
+        media_record = unlocated_records[position]
+        geotagged_records.append(MediaRecord(
+            media_record.path, media_record.extension, media_record.creationdate,
+            (latitudes[position], longitudes[position], altitudes[position]),
+            media_record.extra_values))
+    print(f"Geotagged by time: {len(geotagged_records.filenames)}"
+          f" of {len(unlocated_records)} media files without geolocation")
+    return geotagged_records.to_dataframe()
+
+
+def add_places(media_files_df, place_index, logger,
+               max_distance=DEFAULT_MAX_PLACE_DISTANCE):
+    """ Adds the column place to the dataframe: the nearest place of every media file in
+        the gazetteer of the place index, looked up for all media files at once.
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        place_index (PlaceIndex): place index of a gazetteer
+        logger (logger thing): logger
+        max_distance (float): maximum distance in kilometers to the place
+    """
+    logger.info('Method: add_places')
+    media_files_df['place'] = place_index.lookup(media_files_df['latitude'].to_numpy(),
+                                                 media_files_df['longitude'].to_numpy(),
+                                                 max_distance)
+    print(f"Places: {media_files_df['place'].notna().sum()} of {len(media_files_df)}"
+          " media files near a place")
+
+
+def add_duplicates(media_files_df, duplicate_filter, logger):
+    """ Adds the column duplicates to the dataframe: the other paths of every media file
+        that was found more than once, separated like PATH (os.pathsep).
+
+    Args:
+        media_files_df (dataframe): Dataframe with media files and geolocation data
+        duplicate_filter (DuplicateFilter): duplicate filter of the scan
+        logger (logger thing): logger
+    """
+    logger.info('Method: add_duplicates')
+    # pandas is already imported for the dataframe
+    import pandas as pd
+
+    duplicates = duplicate_filter.duplicates
+    media_files_df['duplicates'] = pd.Series(
+        [os.pathsep.join(duplicates[filename]) if filename in duplicates else None
+         for filename in media_files_df.index], index=media_files_df.index, dtype="string")
+    print(f"Duplicate media files: {duplicate_filter.duplicate_count} skipped,"
+          f" {duplicate_filter.bytes_hashed / 1e6:.2f} MB hashed to find them")
+
+
+# Media files to look for, and the order in which their extensions are read
+MEDIA_FILE_EXTENSIONS = ["jpg", "jpeg", "heic", "mp4", "mov", "xml", "MTS"]
+READ_EXTENSIONS = ["heic", "xml", "jpg", "jpeg", "mp4", "mov", "mts"]
+
+
+def get_media_paths(args, logger):
+    """ Gets the media paths of the arguments that are directories.
+
+    Args:
+        args (Namespace): arguments of the program
+        logger (logger thing): logger
+
+    Returns:
+        list: media paths, resolved
+    """
+    media_paths = args.media_path.split(",")
+    media_paths = [Path(media_path) for media_path in media_paths]
+    media_paths = [media_path.resolve() for media_path in media_paths]
+    media_paths = [media_path for media_path in media_paths if media_path.is_dir()]
+    print(f"Media paths: {media_paths}")
+    logger.debug('Media paths: %s', media_paths)
+
+    if len(media_paths) == 0:
+        print("No valid media paths given. Exiting.")
+        logger.debug('No valid media paths given. Exiting.')
+        exit()
+    return media_paths
+
+
+def get_journal_file(args):
+    """ Gets the journal file of the scan. Without --journal or --resume there is none.
+        The default journal is next to the media cache.
+
+    Args:
+        args (Namespace): arguments of the program
+
+    Returns:
+        str: journal file, or None
+    """
+    if args.journal is None and not args.resume:
+        return None
+    if args.journal:
+        return args.journal
+    return os.path.join(os.path.dirname(os.path.abspath(args.cache)),
+                        "media_gpsplot_journal.sqlite")
+
+
+def scan_media_paths(args, exiftool_pool, logger, run_stats=None, unlocated_records=None,
+                     duplicate_filter=None):
+    """ Finds and reads the media files in the media paths of the arguments.
+
+    Args:
+        args (Namespace): arguments of the program
+        exiftool_pool (ExiftoolPool): exiftool workers for formats like .MTS
+        logger (logger thing): logger
+        run_stats (RunStats): statistics of the run. Default: only counted for the summary
+        unlocated_records (list): gets the media records without geolocation.
+                                  Default: they are dropped
+        duplicate_filter (DuplicateFilter): skips copies of media files before they are
+                                            read and keeps their paths. Default: none
+
+    Returns:
+        dataframe: Dataframe with geocoordinates from media files
+    """
+    # Get media file paths
+    media_paths = get_media_paths(args, logger)
+
+    # Media files to look for
+    media_file_extensions = MEDIA_FILE_EXTENSIONS
+    logger.debug('media_file_extensions: %s', media_file_extensions)
+
+    if run_stats is None:
+        # Only counted for the summary of the files that couldn't be read
+        run_stats = RunStats()
+
+    if args.no_cache:
+        media_cache = None
+    else:
+        media_cache = MediaCache(args.cache, logger, rebuild=args.rebuild_cache)
+
+    extra_fields = parse_extra_fields(args.extra_fields)
+
+    record_sink = None
+    if args.records:
+        try:
+            record_sink = open_record_sink(args.records, extra_fields)
+        except (ValueError, ImportError, OSError) as error:
+            print(f"Cannot write records to {args.records}: {error}. Exiting.")
+            logger.debug('Cannot write records to %s: %s', args.records, error)
+            exit()
+
+    scan_journal = None
+    journal_file = get_journal_file(args)
+    if journal_file is not None:
+        try:
+            scan_journal = ScanJournal(journal_file, logger, media_paths, extra_fields,
+                                       resume=args.resume)
+        except (ScanJournalError, sqlite3.Error) as error:
+            print(f"Cannot use journal {journal_file}: {error}. Exiting.")
+            logger.debug('Cannot use journal %s: %s', journal_file, error)
+            exit()
+    resumed_scan = scan_journal is not None and scan_journal.resuming
+
+    # Find media files and read them while the walk is going on
+    unreadable_paths = []
+    media_files = walk_media_files(media_paths, media_file_extensions, logger,
+                                   follow_symlinks=args.follow_symlinks,
+                                   unreadable_paths=unreadable_paths)
+    if duplicate_filter is not None:
+        # Runs in the walk thread, so hashing overlaps with reading
+        media_files = duplicate_filter.filter(media_files)
+    # One process pool for all batches
+    process_pool = MediaProcessPool(args.jobs)
+    try:
+        media_geocoord_df = get_coordinates_from_media_files(media_files, READ_EXTENSIONS,
+                                                             logger, media_cache, args.jobs,
+                                                             exiftool_pool=exiftool_pool,
+                                                             extra_fields=extra_fields,
+                                                             record_sink=record_sink,
+                                                             run_stats=run_stats,
+                                                             unlocated_records=unlocated_records,
+                                                             scan_journal=scan_journal,
+                                                             process_pool=process_pool)
+    except BaseException:
+        # Everything up to the last batch is in the journal
+        if scan_journal is not None:
+            scan_journal.close()
+            print(f"Scan stopped. Continue it with --resume, the journal is {journal_file}")
+        raise
+    finally:
+        process_pool.close()
+        if record_sink is not None:
+            record_sink.close()
+
+    if scan_journal is not None:
+        failures = scan_journal.failures()
+        if scan_journal.resumed:
+            print(f"Media files from the journal: {scan_journal.resumed}")
+        if failures:
+            print(f"Failed media files: {len(failures)}, with the reason in {journal_file}")
+        scan_journal.close(complete=True)
+
+    # The media files themselves are in the log, not on the screen
+    errors = run_stats.total("errors")
+    out_of_range = run_stats.total("out_of_range")
+    unreadable_geolocation = run_stats.total("unreadable_geolocation")
+    if errors or out_of_range or unreadable_geolocation:
+        print(f"Media files with errors: {errors}, geolocation out of range: {out_of_range},"
+              f" geolocation can't be read: {unreadable_geolocation}. See the log in"
+              f" {args.log_dir}")
+
+    if media_cache is not None:
+        if duplicate_filter is not None:
+            # The copies still exist, their cached results are kept for runs without --dedup
+            for copies in duplicate_filter.duplicates.values():
+                for copy in copies:
+                    media_cache.mark_seen(copy)
+        if unreadable_paths:
+            # Files below them were not seen, but they may still exist
+            logger.info('Media cache not pruned, %s paths could not be read',
+                        len(unreadable_paths))
+        elif resumed_scan:
+            # Media files from the journal are not looked up in the cache
+            logger.info('Media cache not pruned after a resumed scan')
+        else:
+            # Forget files that were deleted since the last run
+            media_cache.prune(media_paths)
+        media_cache.close()
+    return media_geocoord_df
+
+
+def watch_media_paths(args, exiftool_pool, logger):
+    """ Watches the media paths and adds new and changed media files to a live map,
+        until Ctrl+C. Only the media files that changed are read, see live_map.
+
+    Args:
+        args (Namespace): arguments of the program
+        exiftool_pool (ExiftoolPool): exiftool workers for formats like .MTS
+        logger (logger thing): logger
+    """
+    logger.info('Method: watch_media_paths')
+    media_paths = get_media_paths(args, logger)
+    media_cache = None
+    if not args.no_cache:
+        media_cache = MediaCache(args.cache, logger, rebuild=args.rebuild_cache)
+    extra_fields = parse_extra_fields(args.extra_fields)
+    suffixes = {f".{extension.lower()}" for extension in MEDIA_FILE_EXTENSIONS}
+
+    def snapshot():
+        """ Size and modification time of the media files, for the polling watcher.
+        """
+        files = {}
+        for _, media_file in walk_media_files(media_paths, MEDIA_FILE_EXTENSIONS, logger,
+                                              follow_symlinks=args.follow_symlinks):
+            try:
+                file_stat = media_file.stat()
+            except OSError:
+                continue
+            files[str(media_file)] = (file_stat.st_size, file_stat.st_mtime_ns)
+        return files
+
+    def read_changes(media_files):
+        """ Reads media files and returns their marker rows.
+        """
+        media_files_df = get_coordinates_from_media_files(media_files, READ_EXTENSIONS, logger,
+                                                          media_cache, args.jobs,
+                                                          exiftool_pool=exiftool_pool,
+                                                          extra_fields=extra_fields,
+                                                          process_pool=process_pool)
+        return get_marker_rows(media_files_df)
+
+    # One process pool for the whole watch
+    process_pool = MediaProcessPool(args.jobs)
+    # The watch starts before the first walk, so no media file is missed in between
+    watcher = open_file_watcher(media_paths, snapshot, logger, polling=args.poll)
+    marker_styles, marker_rows = read_changes(walk_media_files(
+        media_paths, MEDIA_FILE_EXTENSIONS, logger, follow_symlinks=args.follow_symlinks))
+    live_map = LiveMap(args.output, marker_styles)
+    live_map.add_batch(marker_rows)
+    # Media files on the map, to find the ones in removed directories
+    mapped_files = {marker_row[3] for marker_row in marker_rows}
+    print(f"Media files on the map: {len(mapped_files)}. Watching for changes,"
+          " press Ctrl+C to stop.")
+
+    try:
+        while True:
+            changes = watcher.wait_for_changes()
+            if changes.rescan:
+                # Changes were lost: everything again, the cache has the unchanged files
+                media_files = walk_media_files(media_paths, MEDIA_FILE_EXTENSIONS, logger,
+                                               follow_symlinks=args.follow_symlinks)
+                removed_files = set(mapped_files)
+            else:
+                media_files = [(os.path.splitext(path)[1].lower()[1:], Path(path))
+                               for path in sorted(changes.changed)
+                               if os.path.splitext(path)[1].lower() in suffixes
+                               and os.path.isfile(path)]
+                removed_files = {mapped_file for mapped_file in mapped_files
+                                 if any(mapped_file == removed_path
+                                        or mapped_file.startswith(removed_path + os.sep)
+                                        for removed_path in changes.removed)}
+                # A changed media file can have lost its geolocation
+                removed_files.update(str(media_file) for _, media_file in media_files
+                                     if str(media_file) in mapped_files)
+            _, marker_rows = read_changes(media_files)
+            mapped_files.difference_update(removed_files)
+            mapped_files.update(marker_row[3] for marker_row in marker_rows)
+            live_map.add_batch(marker_rows, removed_files)
+            print(f"Map updated: {len(marker_rows)} added, {len(removed_files)} removed,"
+                  f" {len(mapped_files)} media files on the map")
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        watcher.close()
+        process_pool.close()
+        if media_cache is not None:
+            media_cache.close()
 
 
+def main():
+    """ Main function of the program.
+    """
+
+    basedir = os.path.abspath(os.path.dirname(__file__))
+
     parser = argparse.ArgumentParser(
         description="This program gets geolocations from media files" \
                     " and plots them on a map in html format."
@@ -626,46 +1724,317 @@ def main():
         help=("HTML file with map of media file geocoordinates. Default: media_gpsplot.html"),
         default="media_gpsplot.html"
     )
+    parser.add_argument(
+        "--cache", "-c", type=str,
+        help=("Cache file with geolocations of media files from earlier runs." \
+              " Default: media_gpsplot_cache.sqlite"),
+        default="media_gpsplot_cache.sqlite"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Don't use the cache. All media files are read."
+    )
+    parser.add_argument(
+        "--rebuild-cache", action="store_true",
+        help="Throw away the cache and read all media files again."
+    )
+    parser.add_argument(
+        "--journal", type=str, nargs="?", const="",
+        help="Keep a journal of the scan, with every media record and the reason of every" \
+             " failed media file, saved after every batch, so the scan can be resumed with" \
+             " --resume. Default file: media_gpsplot_journal.sqlite next to the cache file",
+        default=None
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue the scan in the journal, after a crash or Ctrl+C. Media files in the" \
+             " journal that didn't change are not read again. Use the same media paths and" \
+             " extra fields. A complete scan is started again."
+    )
+    parser.add_argument(
+        "--dedup", action="store_true",
+        help="Read media files that are in more than one place, like in overlapping" \
+             " backups, only once. Copies are found by size and content hash and listed in" \
+             " the duplicates column."
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int,
+        help="Number of media files that are read in parallel. Default: 1",
+        default=1
+    )
+    parser.add_argument(
+        "--follow-symlinks", action="store_true",
+        help="Follow symbolic links to media files and directories."
+    )
+    parser.add_argument(
+        "--exiftool", type=str,
+        help="exiftool command, used for .MTS videos. Default: exiftool",
+        default="exiftool"
+    )
+    parser.add_argument(
+        "--render", type=str, choices=["markers", "cluster", "tiles"],
+        help="markers: a separate marker per media file. cluster: clustered markers," \
+             " created in the browser from one data array. Use this for large numbers" \
+             " of media files. tiles: a directory with JSON tiles per zoom level and a" \
+             " Leaflet page that only loads the tiles on screen, for very large numbers" \
+             " of media files. The output is then a directory, without .html." \
+             " Default: markers",
+        default="markers"
+    )
+    parser.add_argument(
+        "--tracks", action="store_true",
+        help="Read the full GPS tracks of videos and draw them as lines on the map."
+    )
+    parser.add_argument(
+        "--track-tolerance", type=float,
+        help="Maximum deviation in meters of a drawn track from the full GPS track." \
+             f" Default: {DEFAULT_TRACK_TOLERANCE}",
+        default=DEFAULT_TRACK_TOLERANCE
+    )
+    parser.add_argument(
+        "--extra-fields", type=str,
+        help="Metadata fields to keep next to the geolocation, comma separated," \
+             " like Model,LensModel. The cache is not used for lookups then." \
+             " Default: none",
+        default=""
+    )
+    parser.add_argument(
+        "--records", type=str,
+        help="File that gets a record of every media file while the media files are read:" \
+             " .csv, .jsonl (JSON Lines) or .parquet (needs pyarrow). Default: none",
+        default=None
+    )
+    parser.add_argument(
+        "--index", type=str,
+        help="Write the geolocations to a geo index file: .feather or .parquet (needs" \
+             " pyarrow). The map can be made again from it with --from-index. Default: none",
+        default=None
+    )
+    parser.add_argument(
+        "--from-index", type=str,
+        help="Make the map from a geo index file, without reading media files. Default: none",
+        default=None
+    )
+    parser.add_argument(
+        "--geotag-by-time", action="store_true",
+        help="Give media files without geolocation the position of media files and GPS" \
+             " tracks from around the same time. GPS tracks of videos are read for this," \
+             " they are only drawn with --tracks."
+    )
+    parser.add_argument(
+        "--clock-offset", type=float,
+        help="Seconds added to the creationdates of the media files without geolocation," \
+             " for a camera clock that is off. Default: 0",
+        default=0.0
+    )
+    parser.add_argument(
+        "--utc-offset", type=float,
+        help="Hours added to the times in UTC, of GPS tracks and of MP4 and MOV videos," \
+             " to get the local time of the cameras. Default: 0",
+        default=0.0
+    )
+    parser.add_argument(
+        "--max-time-gap", type=float,
+        help="Maximum time in seconds between a media file without geolocation and the" \
+             f" position it gets. Default: {DEFAULT_MAX_TIME_GAP:g}",
+        default=DEFAULT_MAX_TIME_GAP
+    )
+    parser.add_argument(
+        "--places", type=str,
+        help="Gazetteer for place names in the popups: a GeoNames dump like cities1000.txt" \
+             " or a CSV file with name, latitude, longitude and country_code. Needs scipy." \
+             " The place index is cached next to it. Default: no place names",
+        default=None
+    )
+    parser.add_argument(
+        "--places-cache", type=str,
+        help="Directory of the cached place index. Default: the gazetteer file with .places",
+        default=None
+    )
+    parser.add_argument(
+        "--max-place-distance", type=float,
+        help="Maximum distance in km from a media file to its place." \
+             f" Default: {DEFAULT_MAX_PLACE_DISTANCE:g}",
+        default=DEFAULT_MAX_PLACE_DISTANCE
+    )
+    parser.add_argument(
+        "--heatmap", action="store_true",
+        help="Add density heatmap layers to the map, that can be switched on and off next" \
+             " to the markers. Not for --render tiles."
+    )
+    parser.add_argument(
+        "--heatmap-grids", type=str,
+        help="Cells per side of the density grids of the heatmap layers, comma separated." \
+             f" Default: {','.join(str(grid) for grid in DEFAULT_HEATMAP_GRIDS)}",
+        default=",".join(str(grid) for grid in DEFAULT_HEATMAP_GRIDS)
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Keep watching the media paths and add new and changed media files to a live" \
+             " map, until Ctrl+C. The map page reloads its data by itself. Uses inotify" \
+             " on Linux, otherwise the media paths are scanned every 2 seconds."
+    )
+    parser.add_argument(
+        "--poll", action="store_true",
+        help="With --watch, scan the media paths every 2 seconds instead of using inotify," \
+             " like for network drives."
+    )
+    parser.add_argument(
+        "--log-level", type=str, choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Level of the messages in the log file. DEBUG logs every media file," \
+             " which slows down large runs. Default: WARNING",
+        default="WARNING"
+    )
+    parser.add_argument(
+        "--log-dir", type=str,
+        help="Directory of the log files. Default: media_gpsplot/log in the user cache" \
+             " directory, like ~/.cache/media_gpsplot/log",
+        default=os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                             "media_gpsplot", "log")
+    )
+    parser.add_argument(
+        "--stats", type=str,
+        help="Write statistics of the run to a JSON file: wall time and bytes read per" \
+             " stage, and per format files, cache hits, errors and files per second." \
+             " Default: none",
+        default=None
+    )
+    parser.add_argument(
+        "--profile", type=str,
+        help="Write a cProfile profile of the run to a file, for pstats or snakeviz." \
+             " Default: none",
+        default=None
+    )
     args = parser.parse_args()
+    if args.dedup and (args.watch or args.from_index):
+        parser.error("--dedup can't be used with --watch or --from-index")
+
+    # Set up logging. Below the log level the logger calls return right away
+    logger = logging.getLogger()
+    formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s')
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    # With delay the log file is only made when there is something to log
+    file_handler = logging.FileHandler(f'{args.log_dir}/media_gpsplot3_' \
+                                    f'{datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")}.log',
+                                       delay=True)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(file_handler)
+    logger.setLevel(args.log_level)
+
+    logger.debug('Start of media_gpsplot3.py')
+    logger.debug('===============================')
+    logger.debug('basedir: %s', basedir)
     logger.debug('args: %s', args)
 
-    # Get media file paths
-    media_paths = args.media_path.split(",")
-    media_paths = [Path(media_path) for media_path in media_paths]
-    media_paths = [media_path.resolve() for media_path in media_paths]
-    media_paths = [media_path for media_path in media_paths if media_path.is_dir()]
-    print(f"Media paths: {media_paths}")
-    logger.debug('Media paths: %s', media_paths)
+    run_stats = RunStats() if args.stats else None
+    profiler = None
+    if args.profile:
+        # cProfile is only needed for --profile
+        import cProfile
 
-    if len(media_paths) == 0:
-        print("No valid media paths given. Exiting.")
-        logger.debug('No valid media paths given. Exiting.')
-        exit()
+        profiler = cProfile.Profile()
+        profiler.enable()
 
-    # Media files to look for
-    media_file_extensions = ["jpg", "jpeg", "heic", "mp4", "xml", "MTS"]
-    logger.debug('media_file_extensions: %s', media_file_extensions)
+    # exiftool workers are only started when files like .MTS are found
+    exiftool_pool = ExiftoolPool(logger, args.jobs, args.exiftool)
 
-    # Get media files
-    media_files = []
-    for media_path in media_paths:
-        for media_file_extension in media_file_extensions:
-            media_files.extend(media_path.glob(f"**/*.{media_file_extension}"))
-            media_files.extend(media_path.glob(f"**/*.{media_file_extension.upper()}"))
-
-    media_files = [media_file for media_file in media_files if media_file.is_file()]
-    print(f"Media files: {media_files}")
-    logger.debug('media_files: %s', media_files)
-    heic_geocoord_df = get_coordinates_from_media_files(media_files, "heic", logger)
-    print(f"HEIC geocoordinates dataframe: {heic_geocoord_df}")
-    xml_geocoord_df = get_coordinates_from_media_files(media_files, "xml", logger)
-    print(f"XML geocoordinates dataframe: {xml_geocoord_df}")
-    media_geocoord_df = pd.concat([heic_geocoord_df, xml_geocoord_df])
-    jpeg_geocoord_df = get_coordinates_from_media_files(media_files, "jpg", logger)
-    print(f"JPEG geocoordinates dataframe: {jpeg_geocoord_df}")
-    media_geocoord_df = pd.concat([media_geocoord_df, jpeg_geocoord_df])
-
-    plot_map(media_geocoord_df, args.output, logger)
+    # Media files without geolocation are only kept for geotagging by time
+    unlocated_records = None
+    if args.geotag_by_time and not args.from_index:
+        unlocated_records = []
+    elif args.geotag_by_time:
+        print("Geotagging by time needs the media files, it is skipped with --from-index.")
+
+    duplicate_filter = None
+    if args.dedup:
+        duplicate_filter = DuplicateFilter(logger, run_stats)
+
+    if args.watch:
+        watch_media_paths(args, exiftool_pool, logger)
+        exiftool_pool.close()
+        return
+
+    if args.from_index:
+        try:
+            with measure_stage(run_stats, "index"):
+                media_geocoord_df = read_geo_index(args.from_index)
+        except (GeoIndexError, ImportError, OSError) as error:
+            print(f"Cannot read geo index {args.from_index}: {error}. Exiting.")
+            logger.debug('Cannot read geo index %s: %s', args.from_index, error)
+            exit()
+        print(f"Media geocoordinates from geo index: {len(media_geocoord_df)}")
+    else:
+        with measure_stage(run_stats, "scan"):
+            media_geocoord_df = scan_media_paths(args, exiftool_pool, logger, run_stats,
+                                                 unlocated_records, duplicate_filter)
+
+    gps_tracks = None
+    if args.tracks or unlocated_records:
+        with measure_stage(run_stats, "tracks"):
+            gps_tracks = read_media_tracks(media_geocoord_df, logger, args.jobs, exiftool_pool,
+                                           args.track_tolerance)
+    exiftool_pool.close()
+
+    if unlocated_records:
+        # pandas is already imported for the dataframe
+        import pandas as pd
+
+        with measure_stage(run_stats, "geotag"):
+            geotagged_df = geotag_by_time(unlocated_records, media_geocoord_df, gps_tracks,
+                                          logger, args.clock_offset, args.utc_offset,
+                                          args.max_time_gap, parse_extra_fields(args.extra_fields))
+        media_geocoord_df = pd.concat([media_geocoord_df, geotagged_df])
+        media_geocoord_df['extension'] = media_geocoord_df['extension'].astype("category")
+    if not args.tracks:
+        gps_tracks = None
+
+    if duplicate_filter is not None:
+        # After geotagging, so geotagged media files get their copies too
+        add_duplicates(media_geocoord_df, duplicate_filter, logger)
+
+    if args.places:
+        try:
+            with measure_stage(run_stats, "places"):
+                place_index = PlaceIndex.open(args.places, logger, args.places_cache)
+                add_places(media_geocoord_df, place_index, logger, args.max_place_distance)
+        except (PlaceIndexError, ImportError, OSError) as error:
+            print(f"Cannot read gazetteer {args.places}: {error}")
+            logger.debug('Cannot read gazetteer %s: %s', args.places, error)
+
+    if args.index and not args.from_index:
+        try:
+            with measure_stage(run_stats, "index"):
+                write_geo_index(media_geocoord_df, args.index)
+        except (GeoIndexError, ImportError, OSError) as error:
+            print(f"Cannot write geo index {args.index}: {error}")
+            logger.debug('Cannot write geo index %s: %s', args.index, error)
+    print(f"Media files on the map: {len(media_geocoord_df)}")
+
+    heatmap_grids = None
+    if args.heatmap:
+        heatmap_grids = tuple(int(grid) for grid in args.heatmap_grids.split(","))
+    if args.render == "tiles":
+        if gps_tracks:
+            print("GPS tracks are not drawn on map tiles.")
+        output_dir = Path(args.output)
+        if output_dir.suffix.lower() == ".html":
+            output_dir = output_dir.with_suffix("")
+        with measure_stage(run_stats, "plot_map"):
+            plot_map_tiles(media_geocoord_df, output_dir, logger)
+    else:
+        with measure_stage(run_stats, "plot_map"):
+            plot_map(media_geocoord_df, args.output, logger, args.render, gps_tracks,
+                     heatmap_grids)
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"Profile written to {args.profile}")
+    if run_stats is not None:
+        run_stats.print_summary()
+        run_stats.write_json(args.stats)
 
 if __name__ == "__main__":
     main()
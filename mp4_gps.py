@@ -0,0 +1,358 @@
+""" Reads GPS data from MP4 and MOV videos without exiftool.
+
+    Only the moov box and the GPS samples are read from the video file.
+    Supported GPS data:
+    * ISO 6709 location in moov/udta/©xyz (Android, older iPhones)
+    * 3GPP location in moov/udta/loci
+    * ISO 6709 location in the QuickTime metadata keys of moov/meta (iPhone)
+    * GoPro GPMF timed metadata track (GPS5 and GPS9)
+"""
+
+import datetime
+import re
+import struct
+
+import numpy as np
+
+from isobmff import BoxFormatError, find_box, iter_boxes, iter_file_boxes, read_sample_ranges, \
+    read_uint
+
+
+# ISO 6709 location in decimal degrees, like +52.3700+004.8900+010.000/
+ISO6709_PATTERN = re.compile(r"([+-]\d+(?:\.\d*)?)([+-]\d+(?:\.\d*)?)([+-]\d+(?:\.\d*)?)?")
+
+# Seconds between the QuickTime epoch (1904-01-01) and the Unix epoch
+QUICKTIME_EPOCH_OFFSET = 2082844800
+
+# QuickTime metadata key with the location
+APPLE_LOCATION_KEY = "com.apple.quicktime.location.ISO6709"
+
+# GoPro GPMF GPS streams: key: number of 32 bit values per sample
+GPMF_GPS_KEYS = {b"GPS5": 5, b"GPS9": 7}
+
+# Duration of a GPMF sample in milliseconds
+GPMF_SAMPLE_DURATION = 1000
+
+# Number of GPMF samples read to find a GPS fix
+GPMF_MAX_SAMPLES_FOR_FIX = 60
+
+
+class MP4FormatError(ValueError):
+    """ Raised when the MP4 file can't be parsed.
+    """
+
+
+def parse_iso6709(location):
+    """ Parses an ISO 6709 location in decimal degrees.
+
+    Args:
+        location (str): location like +52.3700+004.8900+010.000/
+
+    Returns:
+        tuple: latitude, longitude, altitude or None if the location can't be parsed
+    """
+    match = ISO6709_PATTERN.match(location.strip())
+    if match is None:
+        return None
+    latitude = float(match.group(1))
+    longitude = float(match.group(2))
+    altitude = float(match.group(3)) if match.group(3) else 0.0
+    if abs(latitude) > 90 or abs(longitude) > 180:
+        return None
+    return latitude, longitude, altitude
+
+
+def read_creationdate(moov, start, end):
+    """ Reads the creation time from the mvhd box.
+
+    Args:
+        moov (bytes): moov box
+        start (int): position of the moov children
+        end (int): end of the moov box
+
+    Returns:
+        str: creationdate in UTC, like 2021-08-14T11:27:22, or None
+    """
+    mvhd = find_box(moov, ["mvhd"], start, end)
+    if mvhd is None:
+        return None
+    version = moov[mvhd[0]]
+    creation_time = read_uint(moov, mvhd[0] + 4, 8 if version == 1 else 4)
+    if creation_time <= QUICKTIME_EPOCH_OFFSET:
+        # Not set by the camera
+        return None
+    creationdate = datetime.datetime.fromtimestamp(creation_time - QUICKTIME_EPOCH_OFFSET,
+                                                   datetime.timezone.utc)
+    return creationdate.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def read_udta_location(moov, start, end):
+    """ Reads the ISO 6709 location from moov/udta/©xyz.
+
+    Returns:
+        tuple: latitude, longitude, altitude or None
+    """
+    xyz = find_box(moov, ["udta", "\xa9xyz"], start, end)
+    if xyz is None:
+        return None
+    # 16 bit string length and 16 bit language code before the string
+    length = read_uint(moov, xyz[0], 2)
+    location = moov[xyz[0] + 4:xyz[0] + 4 + length].decode("utf-8", errors="replace")
+    return parse_iso6709(location)
+
+
+def read_loci_location(moov, start, end):
+    """ Reads the location from the 3GPP moov/udta/loci box.
+
+    Returns:
+        tuple: latitude, longitude, altitude or None
+    """
+    loci = find_box(moov, ["udta", "loci"], start, end)
+    if loci is None:
+        return None
+    # Version, flags and language, then the place name as null terminated string and the role
+    name_end = moov.find(b"\x00", loci[0] + 6, loci[1])
+    if name_end < 0:
+        return None
+    longitude, latitude, altitude = struct.unpack_from(">3l", moov, name_end + 2)
+    # 16.16 fixed point numbers
+    return latitude / 65536, longitude / 65536, altitude / 65536
+
+
+def read_quicktime_metadata(moov, start, end):
+    """ Reads the QuickTime metadata keys and values from moov/meta.
+
+    Returns:
+        dict: key: value as string
+    """
+    # iPhones write it in moov, other software in moov/udta
+    meta = find_box(moov, ["meta"], start, end) or find_box(moov, ["udta", "meta"], start, end)
+    if meta is None:
+        return {}
+    children_start = meta[0]
+    # In MP4 files meta is a full box, in QuickTime files it isn't
+    if moov[children_start + 4:children_start + 8] != b"hdlr":
+        children_start += 4
+    keys_box = find_box(moov, ["keys"], children_start, meta[1])
+    ilst = find_box(moov, ["ilst"], children_start, meta[1])
+    if keys_box is None or ilst is None:
+        return {}
+    keys = []
+    position = keys_box[0] + 8
+    for _ in range(read_uint(moov, keys_box[0] + 4, 4)):
+        key_size = read_uint(moov, position, 4)
+        keys.append(moov[position + 8:position + key_size].decode("utf-8", errors="replace"))
+        position += key_size
+    metadata = {}
+    for item_type, payload_start, item_end in iter_boxes(moov, ilst[0], ilst[1]):
+        # The type of an item is the 1-based index of its key
+        key_index = int.from_bytes(item_type.encode("latin-1"), "big") - 1
+        data = find_box(moov, ["data"], payload_start, item_end)
+        if data is None or not 0 <= key_index < len(keys):
+            continue
+        # Type indicator and locale before the value
+        value = moov[data[0] + 8:data[1]]
+        metadata[keys[key_index]] = value.decode("utf-8", errors="replace")
+    return metadata
+
+
+def find_gpmf_sample_ranges(moov, start, end):
+    """ Finds the samples of the GoPro GPMF metadata track.
+
+    Returns:
+        list: (offset in file, size) per sample, or None if there is no GPMF track
+    """
+    for box_type, payload_start, box_end in iter_boxes(moov, start, end):
+        if box_type != "trak":
+            continue
+        stbl = find_box(moov, ["mdia", "minf", "stbl"], payload_start, box_end)
+        if stbl is None:
+            continue
+        stsd = find_box(moov, ["stsd"], stbl[0], stbl[1])
+        # Sample description entries start after version, flags and entry count
+        if stsd is None or moov[stsd[0] + 12:stsd[0] + 16] != b"gpmd":
+            continue
+        return read_sample_ranges(moov, stbl[0], stbl[1])
+    return None
+
+
+def iter_gpmf(data, start=0, end=None):
+    """ Iterates over the KLV entries of GoPro GPMF data.
+
+    Yields:
+        bytes: key, like DEVC, STRM, SCAL or GPS5
+        str: value type, '\\x00' for nested entries
+        int: size of one value
+        int: number of values
+        int: position of the value data
+    """
+    if end is None:
+        end = len(data)
+    position = start
+    while position + 8 <= end:
+        key = data[position:position + 4]
+        value_type = chr(data[position + 4])
+        value_size = data[position + 5]
+        repeat = struct.unpack_from(">H", data, position + 6)[0]
+        yield key, value_type, value_size, repeat, position + 8
+        # Data is padded to 32 bits
+        position += 8 + (value_size * repeat + 3) // 4 * 4
+
+
+def parse_gpmf_time(value):
+    """ Parses a GPMF GPSU time.
+
+    Args:
+        value (bytes): UTC time like 210814112722.100 (yymmddhhmmss.sss)
+
+    Returns:
+        numpy.datetime64: time in milliseconds, or None if the time can't be parsed
+    """
+    try:
+        gps_time = datetime.datetime.strptime(value.decode("ascii"), "%y%m%d%H%M%S.%f")
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return np.datetime64(gps_time, "ms")
+
+
+def read_gpmf_gps(data, start=0, end=None):
+    """ Reads the GPS points of one GPMF sample.
+
+    Args:
+        data (bytes): GPMF sample
+        start (int): position of the first KLV entry
+        end (int): end of the last KLV entry
+
+    Returns:
+        numpy.datetime64: GPS time of the first point, or None
+        ndarray: latitude, longitude, altitude per GPS point. Empty if there is no GPS fix.
+    """
+    gps_time = None
+    gps_points = [np.empty((0, 3))]
+    scale = None
+    gps_fix = None
+    for key, value_type, value_size, repeat, value_start in iter_gpmf(data, start, end):
+        if value_type == "\x00":
+            # Nested DEVC or STRM: SCAL and GPSF apply to one stream only
+            stream_time, stream_points = read_gpmf_gps(
+                data, value_start, value_start + value_size * repeat)
+            if gps_time is None:
+                gps_time = stream_time
+            gps_points.append(stream_points)
+        elif key == b"SCAL":
+            scale_format = {"l": "l", "L": "L", "s": "h", "S": "H"}.get(value_type)
+            if scale_format is None:
+                continue
+            count = value_size * repeat // struct.calcsize(f">{scale_format}")
+            scale = struct.unpack_from(f">{count}{scale_format}", data, value_start)
+        elif key == b"GPSF":
+            gps_fix = struct.unpack_from(">L", data, value_start)[0]
+        elif key == b"GPSU":
+            gps_time = parse_gpmf_time(data[value_start:value_start + value_size])
+        elif key in GPMF_GPS_KEYS:
+            if gps_fix is not None and gps_fix < 2 or scale is None:
+                # No 2D or 3D fix
+                continue
+            if len(scale) == 1:
+                scale = scale * GPMF_GPS_KEYS[key]
+            # All points of the sample at once: rows of 32 bit values, the first 3 are used
+            values = np.frombuffer(data, dtype=">i4", count=repeat * value_size // 4,
+                                   offset=value_start).reshape(repeat, value_size // 4)
+            gps_points.append(values[:, :3] / np.array(scale[:3], dtype=np.float64))
+    return gps_time, np.concatenate(gps_points)
+
+
+def read_moov(mp4_file):
+    """ Reads the moov box of an MP4 file.
+
+    Args:
+        mp4_file (file): MP4 file opened in binary mode
+
+    Returns:
+        bytes: moov box payload
+    """
+    for box_type, payload_start, box_end in iter_file_boxes(mp4_file):
+        if box_type == "moov":
+            mp4_file.seek(payload_start)
+            return mp4_file.read(box_end - payload_start)
+    raise MP4FormatError("No moov box in MP4 file")
+
+
+def read_mp4_gps(mediafile_location_disk):
+    """ Reads the creationdate and the first GPS location of an MP4 or MOV file.
+
+    Args:
+        mediafile_location_disk (str): path and name of MP4 file
+
+    Returns:
+        str: creationdate in UTC, or None
+        tuple: latitude, longitude, altitude or None if the video has no GPS data
+    """
+    try:
+        with open(mediafile_location_disk, "rb") as mp4_file:
+            moov = read_moov(mp4_file)
+            creationdate = read_creationdate(moov, 0, len(moov))
+            geolocation = read_udta_location(moov, 0, len(moov))
+            if geolocation is None:
+                geolocation = read_loci_location(moov, 0, len(moov))
+            if geolocation is None:
+                quicktime_metadata = read_quicktime_metadata(moov, 0, len(moov))
+                if APPLE_LOCATION_KEY in quicktime_metadata:
+                    geolocation = parse_iso6709(quicktime_metadata[APPLE_LOCATION_KEY])
+            if geolocation is None:
+                sample_ranges = find_gpmf_sample_ranges(moov, 0, len(moov)) or []
+                for sample_offset, sample_size in sample_ranges[:GPMF_MAX_SAMPLES_FOR_FIX]:
+                    mp4_file.seek(sample_offset)
+                    _, gps_points = read_gpmf_gps(mp4_file.read(sample_size))
+                    if len(gps_points):
+                        geolocation = tuple(float(value) for value in gps_points[0])
+                        break
+    except MP4FormatError:
+        raise
+    except (BoxFormatError, struct.error, ValueError, IndexError) as error:
+        # ValueError and IndexError: GPMF data or a sample table that is cut short
+        raise MP4FormatError(str(error)) from error
+    return creationdate, geolocation
+
+
+def read_mp4_track(mediafile_location_disk):
+    """ Reads all GPS points of the GoPro GPMF track of an MP4 file.
+        Every GPMF sample has the points of about one second. The points in a
+        sample are spread evenly over that second, starting at the GPSU time.
+
+    Args:
+        mediafile_location_disk (str): path and name of MP4 file
+
+    Returns:
+        ndarray: time per GPS point (datetime64[ms])
+        ndarray: latitude, longitude, altitude per GPS point
+        Both are None if the video has no GPS track.
+    """
+    times = []
+    gps_points = []
+    try:
+        with open(mediafile_location_disk, "rb") as mp4_file:
+            moov = read_moov(mp4_file)
+            sample_ranges = find_gpmf_sample_ranges(moov, 0, len(moov))
+            if not sample_ranges:
+                return None, None
+            creationdate = read_creationdate(moov, 0, len(moov))
+            start_time = np.datetime64(creationdate or "1970-01-01T00:00:00", "ms")
+            for sample_index, (sample_offset, sample_size) in enumerate(sample_ranges):
+                mp4_file.seek(sample_offset)
+                gps_time, sample_points = read_gpmf_gps(mp4_file.read(sample_size))
+                if not len(sample_points):
+                    continue
+                if gps_time is None:
+                    gps_time = start_time + np.timedelta64(sample_index * GPMF_SAMPLE_DURATION, "ms")
+                offsets = np.arange(len(sample_points)) * GPMF_SAMPLE_DURATION // len(sample_points)
+                times.append(gps_time + offsets.astype("timedelta64[ms]"))
+                gps_points.append(sample_points)
+    except MP4FormatError:
+        raise
+    except (BoxFormatError, struct.error, ValueError, IndexError) as error:
+        # ValueError and IndexError: GPMF data or a sample table that is cut short
+        raise MP4FormatError(str(error)) from error
+    if not gps_points:
+        return None, None
+    return np.concatenate(times), np.concatenate(gps_points)
@@ -1,51 +1,36 @@
-import subprocess
+import logging
 import pandas as pd
 import os
 from folium import Map, Marker, Icon
-from xml.etree import ElementTree as ET
+from exiftool_pool import ExiftoolPool
 
 
 class MP4File:
-    def __init__(self, mp4file_location_disk, mp4file_ext):
+    def __init__(self, mp4file_location_disk, mp4file_ext, exiftool_pool):
         self.geocoordinate_in_degrees = None
         self.mp4file_location_disk = mp4file_location_disk
         self.mp4file_ext = mp4file_ext
+        self.exiftool_pool = exiftool_pool
 
     def mp4file_metadata(self):
-        exiftool_command = ["exiftool", "-ee", "-m", "-p", "C:\\Program Files\\Exiftool\\fmt_files\\gpx.fmt",
-                            self.mp4file_location_disk]
-        exif_metadata = subprocess.run(exiftool_command, stdout=subprocess.PIPE)
-        exif_metadata_decoded = exif_metadata.stdout.decode('utf-8')
-        # print(exif_metadata_decoded)
-        exif_metadata_root = ET.fromstring(exif_metadata_decoded)
-        lat = None
-        lon = None
-        elevation = None
-        measurement_time = None
-
-        for exif_element in exif_metadata_root.iter():
-            # print(f"exif_element: {exif_element}")
-            if lat is not None and lon is not None and measurement_time is not None:
-                print(f"lat: {lat}, lon: {lon}, elevation: {elevation}, measurement_time: {measurement_time}")
-                break
-            elif "trkpt" in exif_element.tag:
-                lat = exif_element.attrib['lat']
-                lon = exif_element.attrib['lon']
-            elif "ele" in exif_element.tag:
-                elevation = exif_element.text
-            elif "time" in exif_element.tag:
-                measurement_time = exif_element.text
-
-        print(f"Geolocation file:{self.mp4file_location_disk}: lat: {lat}, lon: {lon}, elevation: {elevation},"
+        # The exiftool pool keeps exiftool running, so there is no process start per file
+        measurement_time, geolocation, error = \
+            self.exiftool_pool.read_gps([self.mp4file_location_disk])[0]
+        if error is not None:
+            print(f"Error reading {self.mp4file_location_disk}: {error}")
+            return None
+        print(f"Geolocation file:{self.mp4file_location_disk}: geolocation: {geolocation},"
               f" measurement_time: {measurement_time}")
-        if lat is not None and lon is not None and elevation is None:
-            # print("Got lat, lon, but no elevation")
-            return lat, lon, 0, measurement_time
-        elif lat is not None and lon is not None and elevation is not None:
-            # print("Got lat, lon, and elevation")
+        if geolocation is not None:
+            lat, lon, elevation = geolocation
             return lat, lon, elevation, measurement_time
-        else:
-            pass
+
+    def mp4file_track(self):
+        # All GPS points of the video, not only the first one
+        times, gps_points = self.exiftool_pool.read_tracks([self.mp4file_location_disk])[0]
+        if gps_points is not None:
+            print(f"GPS track file:{self.mp4file_location_disk}: {len(gps_points)} points")
+        return times, gps_points
 
 
 if __name__ == "__main__":
@@ -56,6 +41,7 @@ if __name__ == "__main__":
     mp4videodf = pd.DataFrame(columns=['filename', 'creationdate', 'latitude', 'longitude', 'altitude'])
     mp4video_ext = ".MTS"
 
+    mp4video_files = []
     for root, dirs, filenames in os.walk(mp4video_location_disk):
         # print(f"root: {root}, dirs: {dirs}, filenames: {filenames}")
         for filename in filenames:
@@ -64,14 +50,20 @@ if __name__ == "__main__":
                     (path_and_file_in_video_dir.endswith(mp4video_ext)
                      or path_and_file_in_video_dir.endswith(mp4video_ext.lower())):
                 print(f"path_and_file_in_video_dir: {path_and_file_in_video_dir}")
-
-                try:
-                    mp4file = MP4File(path_and_file_in_video_dir, mp4video_ext)
-                    latitude, longitude, altitude, frametime = mp4file.mp4file_metadata()
-                    mp4videodf.loc[path_and_file_in_video_dir, :] = [filename, pd.to_datetime(frametime),
-                                                                     float(latitude), float(longitude), float(altitude)]
-                except TypeError:
-                    pass
+                mp4video_files.append(path_and_file_in_video_dir)
+
+    # Send the files in batches to a few long-running exiftool processes
+    exiftool_pool = ExiftoolPool(logging.getLogger(), number_of_workers=os.cpu_count())
+    mp4video_gps = exiftool_pool.read_gps(mp4video_files)
+    exiftool_pool.close()
+
+    for path_and_file_in_video_dir, (frametime, geolocation, error) in zip(mp4video_files, mp4video_gps):
+        if error is not None or geolocation is None:
+            continue
+        latitude, longitude, altitude = geolocation
+        mp4videodf.loc[path_and_file_in_video_dir, :] = [os.path.basename(path_and_file_in_video_dir),
+                                                         pd.to_datetime(frametime and frametime[:19], format="%Y:%m:%d %H:%M:%S"),
+                                                         float(latitude), float(longitude), float(altitude)]
 
     print(mp4videodf)
 
@@ -0,0 +1,173 @@
+""" Place index: offline reverse geocoding of geolocations with a local gazetteer.
+
+    The gazetteer is a GeoNames dump, like cities1000.txt from
+    https://download.geonames.org/export/dump/ (tab separated, no header), or a CSV file
+    with the columns name, latitude, longitude and optionally country_code.
+    The places are put in a KD-tree (scipy.spatial.cKDTree) on unit sphere coordinates,
+    so the nearest place in straight line distance is the nearest place on earth.
+
+    Reading a gazetteer takes a while, so the place index is cached in a directory next
+    to it: the place names and their unit sphere coordinates as .npy files that are memory
+    mapped. Building the KD-tree from the coordinates is fast, so it is not cached, and
+    nothing in the cache is unpickled. The cache is made again when the gazetteer changes.
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+import numpy as np
+from gps_tracks import EARTH_RADIUS
+
+
+# Bump this when the cache files change
+PLACE_INDEX_VERSION = 2
+
+# Maximum distance in kilometers from a media file to its place
+DEFAULT_MAX_PLACE_DISTANCE = 50.0
+
+# Columns of a GeoNames dump that are used: geonameid, name, ..., latitude, longitude,
+# feature class, feature code, country code
+GEONAMES_COLUMNS = {1: "name", 4: "latitude", 5: "longitude", 8: "country_code"}
+
+
+class PlaceIndexError(ValueError):
+    """ Raised when a gazetteer or a place index can't be read.
+    """
+
+
+def unit_vectors(latitudes, longitudes):
+    """ Converts geolocations to points on the unit sphere.
+
+    Args:
+        latitudes (ndarray): latitudes in degrees
+        longitudes (ndarray): longitudes in degrees
+
+    Returns:
+        ndarray: x, y, z per geolocation, shape (n, 3)
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_latitudes = np.cos(latitudes)
+    return np.column_stack((cos_latitudes * np.cos(longitudes),
+                            cos_latitudes * np.sin(longitudes), np.sin(latitudes)))
+
+
+def read_gazetteer(gazetteer_file):
+    """ Reads the places of a gazetteer.
+
+    Args:
+        gazetteer_file (str): GeoNames dump or CSV file
+
+    Returns:
+        ndarray: place names, like Grenoble, FR
+        ndarray: latitudes
+        ndarray: longitudes
+    """
+    # pandas is only needed to build the place index
+    import pandas as pd
+
+    with open(gazetteer_file, encoding="utf-8") as gazetteer:
+        first_line = gazetteer.readline()
+    if first_line.split("\t", 1)[0].isdigit():
+        places = pd.read_csv(gazetteer_file, sep="\t", header=None, quoting=csv.QUOTE_NONE,
+                             usecols=list(GEONAMES_COLUMNS), dtype={1: str, 8: str},
+                             keep_default_na=False, na_values={4: [""], 5: [""]},
+                             encoding="utf-8").rename(columns=GEONAMES_COLUMNS)
+    else:
+        places = pd.read_csv(gazetteer_file, dtype={"name": str, "country_code": str},
+                             keep_default_na=False, na_values={"latitude": [""],
+                                                               "longitude": [""]},
+                             encoding="utf-8")
+    missing_columns = [column for column in ("name", "latitude", "longitude")
+                       if column not in places.columns]
+    if missing_columns:
+        raise PlaceIndexError(f"Not a gazetteer, missing columns: {', '.join(missing_columns)}")
+    places = places.dropna(subset=["latitude", "longitude"])
+    names = places["name"]
+    if "country_code" in places.columns:
+        names = names.where(places["country_code"] == "", names + ", " + places["country_code"])
+    return names.to_numpy(dtype=str), places["latitude"].to_numpy(dtype=np.float64), \
+        places["longitude"].to_numpy(dtype=np.float64)
+
+
+class PlaceIndex:
+    """ Nearest place of geolocations, from a KD-tree over the places of a gazetteer.
+    """
+    def __init__(self, tree, place_names):
+        self.tree = tree
+        self.place_names = place_names
+
+    @classmethod
+    def open(cls, gazetteer_file, logger, cache_dir=None):
+        """ Opens the place index of a gazetteer, from the cache if it is up to date.
+
+        Args:
+            gazetteer_file (str): GeoNames dump or CSV file
+            logger (logger thing): logger
+            cache_dir (str): directory of the cached place index.
+                             Default: the gazetteer file name with .places
+
+        Returns:
+            PlaceIndex: place index
+        """
+        # scipy is only needed for place names
+        from scipy.spatial import cKDTree
+
+        if cache_dir is None:
+            cache_dir = f"{gazetteer_file}.places"
+        cache_dir = Path(cache_dir)
+        gazetteer_stat = os.stat(gazetteer_file)
+        source = {"version": PLACE_INDEX_VERSION, "gazetteer": os.path.abspath(gazetteer_file),
+                  "size": gazetteer_stat.st_size, "mtime_ns": gazetteer_stat.st_mtime_ns}
+        try:
+            with open(cache_dir / "source.json", encoding="utf-8") as source_file:
+                cached_source = json.load(source_file)
+        except (OSError, ValueError):
+            cached_source = None
+        if cached_source == source:
+            logger.debug('Place index from cache %s', cache_dir)
+            # Plain arrays only: np.load doesn't unpickle objects
+            coordinates = np.load(cache_dir / "coordinates.npy", mmap_mode="r")
+            return cls(cKDTree(coordinates), np.load(cache_dir / "places.npy", mmap_mode="r"))
+
+        logger.info('Building place index of %s', gazetteer_file)
+        names, latitudes, longitudes = read_gazetteer(gazetteer_file)
+        coordinates = unit_vectors(latitudes, longitudes)
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_dir / "places.npy", names)
+        np.save(cache_dir / "coordinates.npy", coordinates)
+        # The KD-tree of version 1 of the cache
+        (cache_dir / "kdtree.pickle").unlink(missing_ok=True)
+        # Written last, so a cache that was not written completely is built again
+        with open(cache_dir / "source.json", "w", encoding="utf-8") as source_file:
+            json.dump(source, source_file)
+        return cls(cKDTree(coordinates), np.load(cache_dir / "places.npy", mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.place_names)
+
+    def lookup(self, latitudes, longitudes, max_distance=DEFAULT_MAX_PLACE_DISTANCE):
+        """ Finds the nearest place of every geolocation, in one query.
+
+        Args:
+            latitudes (ndarray): latitudes in degrees
+            longitudes (ndarray): longitudes in degrees
+            max_distance (float): maximum distance in kilometers to the place
+
+        Returns:
+            ndarray: place name per geolocation, None if no place is near enough
+        """
+        places = np.full(len(latitudes), None, dtype=object)
+        if len(latitudes) == 0 or len(self.place_names) == 0:
+            return places
+        # Straight line distance through the unit sphere for the distance over the earth
+        max_chord = 2.0 * np.sin(min(max_distance * 1000.0 / EARTH_RADIUS, np.pi) / 2.0)
+        _, place_positions = self.tree.query(unit_vectors(latitudes, longitudes), k=1,
+                                             distance_upper_bound=max_chord * (1 + 1e-9))
+        # Without a place near enough the position is the number of places
+        found = place_positions < len(self.place_names)
+        places[found] = self.place_names[place_positions[found]]
+        return places
+
+# End of class PlaceIndex
@@ -1,14 +1,8 @@
-from xml.dom import minidom
 import os
-import re
 import pandas as pd
 import folium
-
-
-def geoconv_degr_dec(geodegree):
-    degree, minute, second = re.split(':', geodegree)
-    geodecim = float(degree) + float(minute) / 60 + float(second) / (60 * 60)
-    return geodecim
+from geo_convert import convert_geolocations
+from sony_xml import read_nonrealtimemeta
 
 
 geodf = pd.DataFrame(columns=['xmlfilename', 'creationdate', 'latitude', 'longitude', 'altitude'])
@@ -20,31 +14,19 @@ for filename in os.listdir(path_of_the_directory):
     sonyfile = os.path.join(path_of_the_directory, filename)
     if os.path.isfile(sonyfile) and sonyfile.endswith(ext):
         print(sonyfile)
-        sonyxml = minidom.parse(sonyfile)
-        CreationDate = sonyxml.getElementsByTagName('CreationDate')
-        for createdate in CreationDate:
-            print(createdate.attributes['value'].value)
-            creationdate = createdate.attributes['value'].value
-
-        Items = sonyxml.getElementsByTagName('Item')
-        for elem in Items:
-            if elem.attributes['name'].value == "LatitudeRef":
-                latitude_direction = elem.attributes['value'].value
-            if elem.attributes['name'].value == "LongitudeRef":
-                longitude_direction = elem.attributes['value'].value
-
-            if elem.attributes['name'].value == "Latitude":
-                latitude = elem.attributes['value'].value
-
-            if elem.attributes['name'].value == "Longitude":
-                longitude = elem.attributes['value'].value
-
-            if elem.attributes['name'].value == "Altitude":
-                altitude = elem.attributes['value'].value
-
-        if 'latitude' in locals():
-            latdecimal = geoconv_degr_dec(latitude)
-            longdecimal = geoconv_degr_dec(longitude)
+        sony_metadata = read_nonrealtimemeta(sonyfile)
+        creationdate = sony_metadata.get('CreationDate')
+        print(creationdate)
+
+        if 'Latitude' in sony_metadata:
+            raw_geolocation = (sony_metadata['Latitude'], sony_metadata.get('LatitudeRef'),
+                               sony_metadata['Longitude'], sony_metadata.get('LongitudeRef'),
+                               sony_metadata.get('Altitude', 0), sony_metadata.get('AltitudeRef', 0))
+            geolocations, _, _ = convert_geolocations([raw_geolocation])
+            if geolocations[0] is None:
+                print(f"Geolocation can't be read in {sonyfile}")
+                continue
+            latdecimal, longdecimal, altitude = geolocations[0]
             print(f"latitude, longitude: {latdecimal}, {longdecimal}")
             print(f"altitude: {altitude}")
             geodf.loc[filename, :] = [filename, pd.to_datetime(creationdate), latdecimal, longdecimal, altitude]
@@ -0,0 +1,157 @@
+""" Writes media records to a file while the media files are being read.
+
+    Records are written as they come, so memory doesn't grow with the number of
+    media files and the first results are on disk right away. The format
+    follows the extension of the output file:
+    * .csv
+    * .jsonl (JSON Lines, one record per line)
+    * .parquet (needs pyarrow), written in row groups of PARQUET_ROW_GROUP_SIZE records
+"""
+
+import csv
+import json
+from pathlib import Path
+
+
+# Number of records in a Parquet row group
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Columns of a media record, before the extra fields
+RECORD_COLUMNS = ["filename", "extension", "creationdate", "latitude", "longitude", "altitude"]
+
+
+def record_values(media_record):
+    """ Gets the values of a media record in the order of the columns.
+
+    Args:
+        media_record (MediaRecord): media record
+
+    Returns:
+        list: filename, extension, creationdate, latitude, longitude, altitude, extra values
+    """
+    return [media_record.path, media_record.extension, media_record.creationdate,
+            media_record.latitude, media_record.longitude, media_record.altitude,
+            *media_record.extra_values]
+
+
+class CSVRecordSink:
+    """ Writes media records to a CSV file.
+    """
+    def __init__(self, output_file, extra_fields=()):
+        self.output_file = open(output_file, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.output_file)
+        self.writer.writerow(RECORD_COLUMNS + list(extra_fields))
+
+    def write(self, media_record):
+        """ Writes a media record as a row. None is written as an empty field.
+
+        Args:
+            media_record (MediaRecord): media record
+        """
+        self.writer.writerow(record_values(media_record))
+
+    def close(self):
+        """ Closes the CSV file.
+        """
+        self.output_file.close()
+
+# End of class CSVRecordSink
+
+
+class JSONLinesRecordSink:
+    """ Writes media records to a JSON Lines file, one JSON object per record.
+    """
+    def __init__(self, output_file, extra_fields=()):
+        self.output_file = open(output_file, "w", encoding="utf-8")
+        self.columns = RECORD_COLUMNS + list(extra_fields)
+
+    def write(self, media_record):
+        """ Writes a media record as a line. None is written as null.
+
+        Args:
+            media_record (MediaRecord): media record
+        """
+        self.output_file.write(json.dumps(dict(zip(self.columns, record_values(media_record))),
+                                          default=str))
+        self.output_file.write("\n")
+
+    def close(self):
+        """ Closes the JSON Lines file.
+        """
+        self.output_file.close()
+
+# End of class JSONLinesRecordSink
+
+
+class ParquetRecordSink:
+    """ Writes media records to a Parquet file, a row group at a time.
+    """
+    def __init__(self, output_file, extra_fields=()):
+        # pyarrow is only needed for Parquet output
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.columns = RECORD_COLUMNS + list(extra_fields)
+        self.schema = pyarrow.schema(
+            [("filename", pyarrow.string()), ("extension", pyarrow.string()),
+             ("creationdate", pyarrow.string()), ("latitude", pyarrow.float64()),
+             ("longitude", pyarrow.float64()), ("altitude", pyarrow.float64())] +
+            [(extra_field, pyarrow.string()) for extra_field in extra_fields])
+        self.writer = pyarrow.parquet.ParquetWriter(output_file, self.schema)
+        self.rows = []
+
+    def write(self, media_record):
+        """ Adds a media record to the row group being collected, and writes the row
+            group when it is full.
+
+        Args:
+            media_record (MediaRecord): media record
+        """
+        values = record_values(media_record)
+        # Extra fields can be numbers or strings, in Parquet they are strings
+        values[len(RECORD_COLUMNS):] = [None if value is None else str(value)
+                                        for value in values[len(RECORD_COLUMNS):]]
+        self.rows.append(values)
+        if len(self.rows) >= PARQUET_ROW_GROUP_SIZE:
+            self.write_row_group()
+
+    def write_row_group(self):
+        """ Writes the collected records as one row group.
+        """
+        if not self.rows:
+            return
+        columns = [list(column) for column in zip(*self.rows)]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(column, type=field.type)
+             for column, field in zip(columns, self.schema)], schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        """ Writes the last row group and closes the Parquet file.
+        """
+        self.write_row_group()
+        self.writer.close()
+
+# End of class ParquetRecordSink
+
+
+RECORD_SINKS = {".csv": CSVRecordSink, ".jsonl": JSONLinesRecordSink,
+                ".parquet": ParquetRecordSink}
+
+
+def open_record_sink(output_file, extra_fields=()):
+    """ Opens a record sink for the format of the output file.
+
+    Args:
+        output_file (str): output file, with extension .csv, .jsonl or .parquet
+        extra_fields (tuple): names of the extra fields of the media records
+
+    Returns:
+        object: CSVRecordSink, JSONLinesRecordSink or ParquetRecordSink
+    """
+    suffix = Path(output_file).suffix.lower()
+    if suffix not in RECORD_SINKS:
+        raise ValueError(f"Unknown record output format {suffix!r}."
+                         f" Use one of {', '.join(RECORD_SINKS)}")
+    return RECORD_SINKS[suffix](output_file, extra_fields)
@@ -0,0 +1,149 @@
+""" Statistics of a run of media_gpsplot: wall time and bytes read per stage, and per format
+    the number of files, cache hits, errors and files per second.
+
+    Bytes read are the bytes this process read with read system calls (/proc/self/io,
+    Linux only). Files read in a process pool (HEIC and JPEG with --jobs > 1) are read by
+    the worker processes and are not counted.
+"""
+
+import contextlib
+import json
+import time
+
+
+# Counters per format
+FORMAT_COUNTERS = ("files", "cache_hits", "files_read", "errors", "no_geolocation",
+                   "out_of_range", "unreadable_geolocation", "duplicates")
+
+
+def read_io_counters():
+    """ Reads the bytes read by this process so far, from /proc/self/io (Linux).
+
+    Returns:
+        int: bytes read with read system calls, or None if unknown
+    """
+    try:
+        with open("/proc/self/io", encoding="ascii") as io_file:
+            for line in io_file:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class RunStats:
+    """ Collects the statistics of a run.
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.stages = {}
+        self.formats = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ Measures wall time and bytes read of a stage. Stages can be nested and a
+            stage that runs more than once, like reading a batch, is added up.
+
+        Args:
+            name (str): name of the stage, like walk and read or read jpg
+        """
+        start_time = time.perf_counter()
+        bytes_read_before = read_io_counters()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            bytes_read_after = read_io_counters()
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "bytes_read": 0})
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+            if bytes_read_before is None or bytes_read_after is None:
+                stage["bytes_read"] = None
+            elif stage["bytes_read"] is not None:
+                stage["bytes_read"] += bytes_read_after - bytes_read_before
+
+    def count(self, extension, counter, number=1):
+        """ Adds to a counter of a format.
+
+        Args:
+            extension (str): extension of the format, like jpg
+            counter (str): one of FORMAT_COUNTERS
+            number (int): number to add
+        """
+        counters = self.formats.setdefault(extension, dict.fromkeys(FORMAT_COUNTERS, 0))
+        counters[counter] += number
+
+    def total(self, counter):
+        """ Adds up a counter over all formats.
+
+        Args:
+            counter (str): one of FORMAT_COUNTERS
+
+        Returns:
+            int: total of the counter
+        """
+        return sum(counters[counter] for counters in self.formats.values())
+
+    def summary(self):
+        """ Makes the summary of the run.
+
+        Returns:
+            dict: total_seconds, stages and formats
+        """
+        formats = {}
+        for extension, counters in self.formats.items():
+            read_seconds = self.stages.get(f"read {extension}", {}).get("seconds", 0.0)
+            formats[extension] = {
+                **counters,
+                "read_seconds": round(read_seconds, 4),
+                "files_per_second": round(counters["files_read"] / read_seconds, 1) \
+                    if read_seconds > 0 else None,
+            }
+        return {
+            "total_seconds": round(time.perf_counter() - self.start_time, 4),
+            "stages": {name: {**stage, "seconds": round(stage["seconds"], 4)}
+                       for name, stage in self.stages.items()},
+            "formats": formats,
+        }
+
+    def print_summary(self):
+        """ Prints the summary of the run.
+        """
+        summary = self.summary()
+        print(f"Total: {summary['total_seconds']:.2f} s")
+        for name, stage in summary["stages"].items():
+            bytes_read = "" if stage["bytes_read"] is None \
+                else f"{stage['bytes_read'] / 1e6:>9.2f} MB read"
+            print(f"  {name:<16} {stage['seconds']:>9.3f} s {bytes_read}")
+        for extension, counters in summary["formats"].items():
+            files_per_second = counters["files_per_second"] or 0
+            print(f"  {extension:<5} {counters['files']:>8} files"
+                  f" {counters['cache_hits']:>8} cache hits {counters['errors']:>6} errors"
+                  f" {files_per_second:>10.1f} files/s")
+
+    def write_json(self, stats_file):
+        """ Writes the summary of the run to a JSON file.
+
+        Args:
+            stats_file (str): JSON file
+        """
+        with open(stats_file, "w", encoding="utf-8") as json_file:
+            json.dump(self.summary(), json_file, indent=2)
+
+# End of class RunStats
+
+
+def measure_stage(run_stats, name):
+    """ Measures a stage if there are run statistics.
+
+    Args:
+        run_stats (RunStats): run statistics, or None
+        name (str): name of the stage
+
+    Returns:
+        context manager
+    """
+    if run_stats is None:
+        return contextlib.nullcontext()
+    return run_stats.stage(name)
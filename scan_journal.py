@@ -0,0 +1,181 @@
+""" Journal of a scan, so a scan that stopped can be resumed.
+
+    Every media record of the scan is written to the journal, also of media files that
+    failed, with the reason. The journal is committed after every batch of media files,
+    so after a crash or Ctrl+C at most one batch is read again. With resume, media files
+    in the journal are not read again, failed ones neither, unless their size or
+    modification time changed since. A scan that went through all media files has
+    nothing to resume.
+
+    Unlike the media cache the journal has the extra fields and the failures, and it
+    belongs to one scan of one set of media paths.
+"""
+
+import json
+import sqlite3
+
+
+# Bump this when the journal tables change
+JOURNAL_VERSION = 2
+
+
+class ScanJournalError(ValueError):
+    """ Raised when a journal can't be used to resume a scan.
+    """
+
+
+class ScanJournal:
+    """ SQLite journal with the media records of a scan.
+    """
+    def __init__(self, journal_file, logger, media_paths, extra_fields=(), resume=False):
+        """
+        Args:
+            journal_file (str): SQLite file of the journal
+            logger (logger thing): logger
+            media_paths (list): media paths of the scan
+            extra_fields (tuple): names of the extra fields of the media records
+            resume (bool): continue the scan in the journal instead of starting a new one.
+                           A complete scan is not continued, a new one is started.
+        """
+        self.journal_file = journal_file
+        self.logger = logger
+        self.resumed = 0
+        self.connection = sqlite3.connect(str(journal_file))
+        self.create_info_table()
+        scan = {"version": JOURNAL_VERSION, "media_paths": [str(path) for path in media_paths],
+                "extra_fields": list(extra_fields)}
+        # True if the scan in the journal is continued
+        self.resuming = False
+        if resume:
+            journal_scan = self.get_info("scan")
+            if journal_scan is None:
+                raise ScanJournalError(f"No scan to resume in {journal_file}")
+            if json.loads(journal_scan) != scan:
+                raise ScanJournalError(f"The scan in {journal_file} has other media paths or"
+                                       " extra fields, or is from an older version")
+            if self.get_info("complete") == "1":
+                print(f"The scan in {journal_file} is complete, nothing to resume."
+                      " Starting a new scan.")
+                logger.info('Scan in journal %s is complete, starting a new scan', journal_file)
+            else:
+                logger.info('Resuming scan from journal %s', journal_file)
+                self.resuming = True
+        if not self.resuming:
+            # The table of an older version can have other columns
+            self.connection.execute("DROP TABLE IF EXISTS media_records")
+            self.set_info("scan", json.dumps(scan))
+        self.create_records_table()
+        self.set_info("complete", "0")
+        self.connection.commit()
+
+    def create_info_table(self):
+        """ Creates the journal info table if it doesn't exist yet.
+        """
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS journal_info ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT)")
+        self.connection.commit()
+
+    def create_records_table(self):
+        """ Creates the media records table if it doesn't exist yet.
+        """
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS media_records ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER,"
+            " mtime_ns INTEGER,"
+            " extension TEXT NOT NULL,"
+            " creationdate TEXT,"
+            " latitude REAL,"
+            " longitude REAL,"
+            " altitude REAL,"
+            " extra_values TEXT,"
+            " error TEXT)")
+        self.connection.commit()
+
+    def get_info(self, key):
+        """ Gets a value of the journal info, like scan or complete.
+
+        Returns:
+            str: value, or None if it isn't set
+        """
+        row = self.connection.execute(
+            "SELECT value FROM journal_info WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_info(self, key, value):
+        """ Sets a value of the journal info. It is written at the next commit.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO journal_info (key, value) VALUES (?, ?)", (key, value))
+
+    def lookup(self, media_file, file_stat):
+        """ Looks up a media file in the journal.
+
+        Args:
+            media_file (Path): path of media file
+            file_stat (os.stat_result): stat of media file
+
+        Returns:
+            tuple: creationdate, geolocation (or None), extra values, error (or None),
+                   or None if the media file isn't in the journal or changed since
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, creationdate, latitude, longitude, altitude, extra_values,"
+            " error FROM media_records WHERE path = ?", (str(media_file),)).fetchone()
+        # Like in the media cache, a changed size or mtime means the file is read again
+        if row is None or row[0] != file_stat.st_size or row[1] != file_stat.st_mtime_ns:
+            return None
+        self.resumed += 1
+        geolocation = None if row[3] is None else (row[3], row[4], row[5])
+        return row[2], geolocation, tuple(json.loads(row[6])), row[7]
+
+    def store(self, media_record, file_stat, error=None):
+        """ Stores a media record in the journal. It is written at the next commit.
+
+        Args:
+            media_record (MediaRecord): media record
+            file_stat (os.stat_result): stat of media file
+            error (str): reason the media file failed, or None
+        """
+        creationdate = media_record.creationdate
+        if creationdate is not None:
+            creationdate = str(creationdate)
+        geolocation = media_record.geolocation or (None, None, None)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO media_records"
+            " (path, size, mtime_ns, extension, creationdate, latitude, longitude, altitude,"
+            " extra_values, error)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (media_record.path, file_stat.st_size, file_stat.st_mtime_ns,
+             media_record.extension, creationdate,
+             *(None if value is None else float(value) for value in geolocation),
+             json.dumps(media_record.extra_values, default=str), error))
+
+    def failures(self):
+        """ Gets the media files that failed.
+
+        Returns:
+            list: (path, error) per failed media file
+        """
+        return self.connection.execute(
+            "SELECT path, error FROM media_records WHERE error IS NOT NULL"
+            " ORDER BY path").fetchall()
+
+    def commit(self):
+        """ Writes the stored media records to disk: a checkpoint.
+        """
+        self.connection.commit()
+
+    def close(self, complete=False):
+        """ Commits and closes the journal.
+
+        Args:
+            complete (bool): True if the scan went through all media files
+        """
+        self.set_info("complete", "1" if complete else "0")
+        self.connection.commit()
+        self.connection.close()
+
+# End of class ScanJournal
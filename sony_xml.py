@@ -0,0 +1,55 @@
+""" Reads Sony NonRealTimeMeta XML files, like the ones the FDR-X3000 writes next to its videos.
+
+    The XML file is parsed incrementally and reading stops as soon as the
+    CreationDate and the ExifGPS group have been seen, so no DOM is built.
+"""
+
+from xml.etree import ElementTree as ET
+
+
+def local_name(tag):
+    """ Strips the namespace from an XML tag.
+
+    Args:
+        tag (str): tag like {urn:schemas-professionalDisc:nonRealTimeMeta:ver.2.00}Item
+
+    Returns:
+        str: tag without namespace, like Item
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def read_nonrealtimemeta(mediafile_location_disk):
+    """ Reads the creationdate and GPS items of a NonRealTimeMeta XML file.
+
+    Args:
+        mediafile_location_disk (str): path and name of XML file
+
+    Returns:
+        dict: CreationDate and the items of the ExifGPS group, like Latitude,
+              LatitudeRef, Altitude, AltitudeRef, Speed, Track, DOP and TimeStamp.
+              All values are strings. Missing items are not in the dictionary.
+    """
+    metadata = {}
+    creationdate_seen = False
+    in_gps_group = False
+    # Open the file ourselves: iterparse only closes a file it opened when it reads to the end
+    with open(mediafile_location_disk, "rb") as xml_file:
+        for event, element in ET.iterparse(xml_file, events=("start", "end")):
+            tag = local_name(element.tag)
+            if event == "start":
+                if tag == "Group" and element.get("name") == "ExifGPS":
+                    in_gps_group = True
+                continue
+            if tag == "CreationDate":
+                metadata["CreationDate"] = element.get("value")
+                creationdate_seen = True
+            elif tag == "Item" and in_gps_group:
+                metadata[element.get("name")] = element.get("value")
+            elif tag == "Group" and in_gps_group:
+                in_gps_group = False
+                if creationdate_seen:
+                    # Everything we need is read, skip the rest of the file
+                    break
+            element.clear()
+    return metadata
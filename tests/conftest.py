@@ -0,0 +1,7 @@
+""" The modules of media_gpsplot are top level modules next to the tests directory.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
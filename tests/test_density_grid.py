@@ -0,0 +1,52 @@
+""" Tests of counting media files per cell of a density grid.
+"""
+
+import numpy as np
+import pytest
+
+from density_grid import density_grid, mercator_to_geolocation
+from map_tiles import mercator_xy
+
+
+def test_mercator_round_trip():
+    latitudes = np.array([-60.0, 0.0, 45.1885, 80.0])
+    longitudes = np.array([-179.0, 0.0, 5.7245, 151.21])
+    assert np.allclose(mercator_to_geolocation(*mercator_xy(latitudes, longitudes)),
+                       (latitudes, longitudes))
+
+
+def test_binning_and_weights():
+    # The corners of the bounding box and three more points in the cell of the last one,
+    # on a grid of 2 by 2 cells
+    latitudes = np.array([10.0, 10.0, 0.0, 0.0, 1.0, 2.0, 3.0])
+    longitudes = np.array([0.0, 10.0, 0.0, 10.0, 9.0, 8.0, 7.0])
+    cells = density_grid(latitudes, longitudes, 2)
+    assert len(cells) == 4
+    weights = {(cell[0] > 5, cell[1] > 5): cell[2] for cell in cells}
+    # Four points in the south east cell, one in the other cells
+    assert weights == {(True, False): 0.25, (True, True): 0.25, (False, False): 0.25,
+                       (False, True): 1.0}
+    # The cell centers are in the middle of the halves of the bounding box, in Web Mercator
+    _, y = mercator_xy(np.array([10.0, 0.0]), np.array([0.0, 0.0]))
+    center_latitudes, _ = mercator_to_geolocation(
+        np.zeros(2), np.array([y[0] * 0.75 + y[1] * 0.25, y[0] * 0.25 + y[1] * 0.75]))
+    assert sorted({cell[0] for cell in cells}) == pytest.approx(sorted(center_latitudes),
+                                                                abs=1e-6)
+    assert sorted({cell[1] for cell in cells}) == pytest.approx([2.5, 7.5])
+
+
+def test_fullest_cell_has_weight_one():
+    random = np.random.default_rng(0)
+    latitudes = random.uniform(44.0, 46.0, 1000)
+    longitudes = random.uniform(5.0, 7.0, 1000)
+    cells = np.array(density_grid(latitudes, longitudes, 16))
+    assert cells[:, 2].max() == 1.0 and cells[:, 2].min() > 0
+    # The weights times the count of the fullest cell give back all media files
+    counts, _, _ = np.histogram2d(*mercator_xy(latitudes, longitudes), bins=16)
+    assert np.round(cells[:, 2] * counts.max()).sum() == len(latitudes)
+
+
+def test_one_spot_and_no_media_files():
+    assert density_grid(np.array([45.0, 45.0]), np.array([5.0, 5.0]), 64) == \
+        [[45.0, 5.0, 1.0]]
+    assert density_grid(np.array([]), np.array([]), 64) == []
@@ -0,0 +1,70 @@
+""" Tests of finding copies of media files by size, partial hash and full hash.
+"""
+
+import logging
+import os
+
+import duplicate_files
+from duplicate_files import DuplicateFilter, PARTIAL_HASH_BYTES
+
+
+def filter_paths(paths):
+    duplicate_filter = DuplicateFilter(logging.getLogger())
+    kept = [str(media_file) for _, media_file in
+            duplicate_filter.filter(("jpg", path) for path in paths)]
+    return kept, duplicate_filter
+
+
+def test_copies_are_skipped(tmp_path):
+    content = os.urandom(3 * PARTIAL_HASH_BYTES)
+    (tmp_path / "a.jpg").write_bytes(content)
+    (tmp_path / "b.jpg").write_bytes(content)
+    (tmp_path / "c.jpg").write_bytes(content[:10])
+    kept, duplicate_filter = filter_paths([tmp_path / "a.jpg", tmp_path / "b.jpg",
+                                           tmp_path / "c.jpg"])
+    assert kept == [str(tmp_path / "a.jpg"), str(tmp_path / "c.jpg")]
+    assert duplicate_filter.duplicates == {str(tmp_path / "a.jpg"): [str(tmp_path / "b.jpg")]}
+    assert duplicate_filter.duplicate_count == 1
+
+
+def test_same_head_and_tail_is_not_a_copy(tmp_path):
+    content = bytearray(3 * PARTIAL_HASH_BYTES)
+    (tmp_path / "a.jpg").write_bytes(content)
+    content[len(content) // 2] = 1
+    (tmp_path / "b.jpg").write_bytes(content)
+    kept, duplicate_filter = filter_paths([tmp_path / "a.jpg", tmp_path / "b.jpg"])
+    assert len(kept) == 2 and duplicate_filter.duplicates == {}
+
+
+def test_unique_sizes_are_not_hashed(tmp_path):
+    paths = []
+    for size in range(1, 20):
+        paths.append(tmp_path / f"{size}.jpg")
+        paths[-1].write_bytes(b"x" * size)
+    kept, duplicate_filter = filter_paths(paths)
+    assert len(kept) == len(paths) and duplicate_filter.bytes_hashed == 0
+
+
+def test_same_size_files_are_hashed_once(tmp_path, monkeypatch):
+    paths = []
+    for number in range(200):
+        paths.append(tmp_path / f"{number}.xml")
+        paths[-1].write_bytes(f"{number:08d}".encode())
+    hashed = []
+    read_partial_hash = DuplicateFilter.read_partial_hash
+
+    def counting_read_partial_hash(self, path, size):
+        hashed.append(path)
+        return read_partial_hash(self, path, size)
+
+    monkeypatch.setattr(duplicate_files.DuplicateFilter, "read_partial_hash",
+                        counting_read_partial_hash)
+    kept, _ = filter_paths(paths)
+    assert len(kept) == 200
+    assert len(hashed) == 200
+
+
+def test_same_path_twice_is_not_listed(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"jpeg")
+    kept, duplicate_filter = filter_paths([tmp_path / "a.jpg", tmp_path / "a.jpg"])
+    assert kept == [str(tmp_path / "a.jpg")] and duplicate_filter.duplicates == {}
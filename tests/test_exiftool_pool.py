@@ -0,0 +1,124 @@
+""" Tests of ExiftoolPool against a fake exiftool on PATH.
+"""
+
+import logging
+import os
+import stat
+import sys
+
+import pytest
+
+from exiftool_pool import ExiftoolError, ExiftoolPool, ExiftoolWorker
+
+
+# Fake exiftool in -stay_open mode: a JSON list per -execute, followed by {ready}.
+# Every process writes its pid to the starts file. A file with crash in its name
+# stops the process without an answer.
+FAKE_EXIFTOOL = """#!{python}
+import json
+import os
+import sys
+
+with open({starts_file!r}, "a") as starts:
+    starts.write(f"{{os.getpid()}}\\n")
+arguments = []
+for line in sys.stdin:
+    line = line.rstrip("\\n")
+    if line == "-execute":
+        files = [argument for argument in arguments if not argument.startswith("-")
+                 and argument != "filename=utf8"]
+        if any("crash" in media_file for media_file in files):
+            sys.exit(1)
+        results = [{{"SourceFile": media_file, "GPSLatitude": 44.5, "GPSLongitude": -5.5,
+                    "GPSAltitude": 321.0, "DateTimeOriginal": "2013:07:01 12:00:00",
+                    "Pid": os.getpid()}} for media_file in files]
+        # Output in two writes, so the answer is read up to {{ready}} and not less
+        sys.stdout.write(json.dumps(results) + "\\n")
+        sys.stdout.flush()
+        sys.stdout.write("{{ready}}\\n")
+        sys.stdout.flush()
+        arguments = []
+    elif line == "False" and arguments[-1:] == ["-stay_open"]:
+        break
+    else:
+        arguments.append(line)
+"""
+
+
+@pytest.fixture
+def fake_exiftool(tmp_path, monkeypatch):
+    """ Puts a fake exiftool on PATH.
+
+    Returns:
+        Path: file with the pid of every exiftool process that was started
+    """
+    starts_file = tmp_path / "starts.txt"
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    exiftool = bin_dir / "exiftool"
+    exiftool.write_text(FAKE_EXIFTOOL.format(python=sys.executable,
+                                             starts_file=str(starts_file)))
+    exiftool.chmod(exiftool.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return starts_file
+
+
+def read_starts(starts_file):
+    return starts_file.read_text().split() if starts_file.exists() else []
+
+
+def test_worker_reads_up_to_ready(fake_exiftool):
+    worker = ExiftoolWorker()
+    try:
+        first = worker.execute(["-j", "a.MTS"])
+        second = worker.execute(["-j", "b.MTS", "c.MTS"])
+    finally:
+        worker.close()
+    assert b"a.MTS" in first and b"{ready}" not in first
+    assert b"b.MTS" in second and b"c.MTS" in second and b"a.MTS" not in second
+
+
+def test_pool_reuses_workers(fake_exiftool):
+    pool = ExiftoolPool(logging.getLogger(), number_of_workers=1, batch_size=2)
+    try:
+        results = pool.read_gps([f"file{number}.MTS" for number in range(7)])
+    finally:
+        pool.close()
+    assert len(results) == 7
+    assert all(error is None for _, _, error in results)
+    assert results[0] == ("2013:07:01 12:00:00", (44.5, -5.5, 321.0), None)
+    # Four batches, one exiftool process
+    assert len(read_starts(fake_exiftool)) == 1
+
+
+def test_pool_restarts_dead_worker(fake_exiftool):
+    pool = ExiftoolPool(logging.getLogger(), number_of_workers=1, batch_size=10)
+    try:
+        failed = pool.read_gps(["crash.MTS", "other.MTS"])
+        assert [error is not None for _, _, error in failed] == [True, True]
+        assert pool.workers == []
+        results = pool.read_gps(["after.MTS"])
+    finally:
+        pool.close()
+    assert results[0][2] is None
+    assert len(read_starts(fake_exiftool)) == 2
+
+
+def test_execute_raises_when_worker_stops(fake_exiftool):
+    worker = ExiftoolWorker()
+    try:
+        with pytest.raises(ExiftoolError):
+            worker.execute(["-j", "crash.MTS"])
+    finally:
+        worker.close()
+
+
+def test_close_stops_workers(fake_exiftool):
+    pool = ExiftoolPool(logging.getLogger(), number_of_workers=2, batch_size=1)
+    pool.read_gps(["a.MTS", "b.MTS", "c.MTS"])
+    processes = [worker.process for worker in pool.workers]
+    assert processes
+    pool.close()
+    assert pool.workers == [] and pool.idle_workers == []
+    # Stopped by -stay_open False, not killed
+    assert [process.returncode for process in processes] == [0] * len(processes)
@@ -0,0 +1,55 @@
+""" Tests of the polling file watcher, the fallback of inotify.
+"""
+
+import logging
+import os
+
+from file_watcher import FileChanges, PollingWatcher, open_file_watcher
+
+
+def snapshot_of(directory):
+    def snapshot():
+        files = {}
+        for media_file in directory.iterdir():
+            file_stat = media_file.stat()
+            files[str(media_file)] = (file_stat.st_size, file_stat.st_mtime_ns)
+        return files
+    return snapshot
+
+
+def test_empty_changes_are_false():
+    changes = FileChanges()
+    assert not changes
+    changes.removed.add("p1.jpg")
+    assert changes
+
+
+def test_new_file_is_reported_once(tmp_path):
+    (tmp_path / "p1.jpg").write_bytes(b"jpeg")
+    watcher = PollingWatcher(snapshot_of(tmp_path), logging.getLogger(), interval=0.01)
+    (tmp_path / "p2.jpg").write_bytes(b"jpeg")
+    changes = watcher.wait_for_changes()
+    assert changes.changed == {str(tmp_path / "p2.jpg")}
+    assert not changes.removed and not changes.rescan
+    # The next burst only has the next change, not p2.jpg again
+    (tmp_path / "p3.jpg").write_bytes(b"jpeg")
+    changes = watcher.wait_for_changes()
+    assert changes.changed == {str(tmp_path / "p3.jpg")}
+
+
+def test_changed_and_removed_files(tmp_path):
+    (tmp_path / "p1.jpg").write_bytes(b"jpeg")
+    (tmp_path / "p2.jpg").write_bytes(b"jpeg")
+    watcher = PollingWatcher(snapshot_of(tmp_path), logging.getLogger(), interval=0.01)
+    (tmp_path / "p1.jpg").write_bytes(b"jpeg, edited")
+    os.remove(tmp_path / "p2.jpg")
+    changes = watcher.wait_for_changes()
+    assert changes.changed == {str(tmp_path / "p1.jpg")}
+    assert changes.removed == {str(tmp_path / "p2.jpg")}
+
+
+def test_polling_watcher_on_request(tmp_path):
+    watcher = open_file_watcher([tmp_path], snapshot_of(tmp_path), logging.getLogger(),
+                                polling=True)
+    assert isinstance(watcher, PollingWatcher)
+    watcher.close()
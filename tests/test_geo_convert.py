@@ -0,0 +1,94 @@
+""" Tests of the batch conversion of raw geolocations against the per-file conversion
+    the readers used before.
+"""
+
+import warnings
+
+import pytest
+
+from geo_convert import convert_geolocations, raw_geolocation_from_decimals
+
+
+def convert_per_file(coordinate, reference):
+    """ Conversion of one coordinate like the readers did it file by file.
+    """
+    if isinstance(coordinate, str):
+        coordinate = coordinate.split(":")
+    values = [float(value[0]) / float(value[1]) if isinstance(value, tuple) else float(value)
+              for value in coordinate]
+    decimals = values[0] + values[1] / 60 + values[2] / (60 * 60)
+    if reference in ['S', 'W', b'S', b'W']:
+        decimals = decimals * -1
+    return decimals
+
+
+RAW_GEOLOCATIONS = [
+    # HEIC/JPEG EXIF rationals
+    (((45, 1), (4, 1), (870, 100)), "N", ((5, 1), (43, 1), (1234, 100)), "W", (300, 1), 0),
+    # Floats, bytes refs, below sea level
+    ((45.0, 4.0, 8.7), b"S", (170.0, 0.0, 30.0), b"E", 12.5, 1),
+    # Sony XML strings
+    ("45:4:8.7", "S", "5:43:12.34", "E", "100", None),
+    ("0:30:0", "N", "179:59:59.9", "W", None, None),
+]
+
+
+@pytest.mark.parametrize("raw_geolocation", RAW_GEOLOCATIONS)
+def test_matches_per_file_conversion(raw_geolocation):
+    latitude, latitude_ref, longitude, longitude_ref, _, _ = raw_geolocation
+    geolocations, out_of_range, unreadable = convert_geolocations([raw_geolocation])
+    assert geolocations[0][0] == pytest.approx(convert_per_file(latitude, latitude_ref))
+    assert geolocations[0][1] == pytest.approx(convert_per_file(longitude, longitude_ref))
+    assert out_of_range == [False] and unreadable == [False]
+
+
+def test_batch_matches_single_conversions():
+    batch, _, _ = convert_geolocations(RAW_GEOLOCATIONS)
+    singles = [convert_geolocations([raw_geolocation])[0][0]
+               for raw_geolocation in RAW_GEOLOCATIONS]
+    assert batch == singles
+
+
+def test_altitudes():
+    geolocations, _, _ = convert_geolocations(RAW_GEOLOCATIONS)
+    assert [geolocation[2] for geolocation in geolocations] == \
+        pytest.approx([300.0, -12.5, 100.0, 0.0])
+
+
+def test_decimals():
+    geolocations, _, _ = convert_geolocations(
+        [raw_geolocation_from_decimals((45.069, -5.72, -10.0))])
+    assert geolocations == [pytest.approx((45.069, -5.72, -10.0))]
+
+
+def test_malformed_geolocations_are_unreadable():
+    raw_geolocations = [
+        None,
+        ("45:4:x", "N", "5:43:12.34", "E", 0, 0),
+        (((45, 1), (4, 1)), "N", ((5, 1), (43, 1), (1, 1)), "E", 0, 0),
+        ((("a", 1), (4, 1), (1, 1)), "N", ((5, 1), (43, 1), (1, 1)), "E", 0, 0),
+        (((45, 0), (4, 1), (1, 1)), "N", ((5, 1), (43, 1), (1, 1)), "E", 0, 0),
+        ("45:4", "N", "5:43:12.34", "E", 0, 0),
+        ((95.0, 0.0, 0.0), "N", (5.0, 0.0, 0.0), "E", 0, 0),
+        ((45.0, 0.0, 0.0), "N", (185.0, 0.0, 0.0), "W", 0, 0),
+        ("45:4:8.7", "N", "5:43:12.34", "E", 0, 0),
+    ]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        geolocations, out_of_range, unreadable = convert_geolocations(raw_geolocations)
+    assert geolocations[:8] == [None] * 8
+    assert geolocations[8] is not None
+    assert unreadable == [False, True, True, True, True, True, False, False, False]
+    assert out_of_range == [False, False, False, False, False, False, True, True, False]
+
+
+def test_one_bad_string_does_not_spoil_the_batch():
+    geolocations, _, unreadable = convert_geolocations([
+        ("45:4:8.7", "N", "5:43:12.34", "E", 0, 0),
+        ("45:4:8.7", "N", "5:43:1e", "E", 0, 0),
+        ("10:0:0", "S", "20:0:0", "W", 0, 0),
+    ])
+    assert unreadable == [False, True, False]
+    assert geolocations[0][:2] == pytest.approx((convert_per_file("45:4:8.7", "N"),
+                                                 convert_per_file("5:43:12.34", "E")))
+    assert geolocations[2][:2] == pytest.approx((-10.0, -20.0))
@@ -0,0 +1,72 @@
+""" Tests of simplifying GPS tracks within their tolerance.
+"""
+
+import numpy as np
+import pytest
+
+from gps_tracks import EARTH_RADIUS, GPSTrack, decimate_track, simplify_track
+
+
+def make_track(x_meters, y_meters, latitude=45.0):
+    """ Track around latitude, from x and y in meters """
+    latitudes = latitude + np.degrees(np.asarray(y_meters) / EARTH_RADIUS)
+    longitudes = np.degrees(np.asarray(x_meters) / (EARTH_RADIUS * np.cos(np.radians(latitude))))
+    times = np.arange(len(latitudes)).astype("datetime64[s]")
+    return GPSTrack("track.mp4", times, latitudes, longitudes, np.zeros(len(latitudes)))
+
+
+def to_meters(track, latitude=45.0):
+    x_meters = EARTH_RADIUS * np.radians(track.longitudes) * np.cos(np.radians(latitude))
+    y_meters = EARTH_RADIUS * np.radians(track.latitudes - latitude)
+    return np.column_stack((x_meters, y_meters))
+
+
+def max_deviation(track, simplified_track):
+    """ Largest distance of a point of the track to the simplified track """
+    points = to_meters(track)
+    starts = to_meters(simplified_track)[:-1]
+    ends = to_meters(simplified_track)[1:]
+    segments = ends - starts
+    lengths = np.maximum(np.einsum("ij,ij->i", segments, segments), 1e-12)
+    # Distance of every point to every segment
+    fractions = np.clip(np.einsum("pij,ij->pi", points[:, None, :] - starts[None], segments) /
+                        lengths, 0, 1)
+    nearest = starts[None] + fractions[..., None] * segments[None]
+    return np.linalg.norm(points[:, None, :] - nearest, axis=2).min(axis=1).max()
+
+
+@pytest.mark.parametrize("tolerance", [2.0, 5.0, 20.0])
+def test_deviation_stays_within_tolerance(tolerance):
+    # A wiggly track, a point per meter
+    x_meters = np.arange(0.0, 3000.0, 1.0)
+    y_meters = 30 * np.sin(x_meters / 40) + 8 * np.sin(x_meters / 7)
+    track = make_track(x_meters, y_meters)
+    simplified_track = simplify_track(track, tolerance)
+    assert len(simplified_track) < len(track) / 4
+    assert max_deviation(track, simplified_track) <= tolerance * 1.001
+
+
+@pytest.mark.parametrize("seed", [2, 10])
+def test_deviation_of_noisy_track_stays_within_tolerance(seed):
+    # A random walk like GPS noise. Thinning out and Douglas-Peucker with the full
+    # tolerance went up to 1.3 times the tolerance on these tracks.
+    random = np.random.default_rng(seed)
+    track = make_track(np.cumsum(random.uniform(0.2, 3.0, 2000)),
+                       np.cumsum(random.normal(0.0, 1.5, 2000)))
+    simplified_track = simplify_track(track, 5.0)
+    assert max_deviation(track, simplified_track) <= 5.0 * 1.001
+
+
+def test_straight_track_keeps_its_ends():
+    track = make_track(np.arange(0.0, 1000.0, 1.0), np.zeros(1000))
+    simplified_track = simplify_track(track, 5.0)
+    assert len(simplified_track) == 2
+    assert simplified_track.times[0] == track.times[0]
+    assert simplified_track.times[-1] == track.times[-1]
+
+
+def test_decimate_keeps_a_point_per_distance():
+    track = make_track(np.arange(0.0, 100.0, 1.0), np.zeros(100))
+    decimated_track = decimate_track(track, 10.0)
+    assert np.allclose(np.diff(to_meters(decimated_track)[:, 0])[:-1], 10.0, atol=0.01)
+    assert decimated_track.times[-1] == track.times[-1]
@@ -0,0 +1,187 @@
+""" Tests of reading the Exif item of HEIC files from the pitm, iinf, iref and iloc boxes.
+"""
+
+import struct
+
+import pytest
+
+from exif_reader import ExifFormatError, read_heic_exif_data
+from isobmff import BoxFormatError, read_heif_item_locations, read_heif_item_references, \
+    read_heif_item_types
+
+
+TIFF_DATA = b"MM\x00*\x00\x00\x00\x08" + b"\x00" * 6
+
+
+def box(box_type, payload):
+    return struct.pack(">L4s", 8 + len(payload), box_type.encode()) + payload
+
+
+def full_box(box_type, version, payload, flags=0):
+    return box(box_type, bytes([version]) + flags.to_bytes(3, "big") + payload)
+
+
+def infe(version, item_id, item_type):
+    id_format = ">H" if version == 2 else ">L"
+    return full_box("infe", version, struct.pack(id_format, item_id) + b"\x00\x00" +
+                    item_type.encode() + b"\x00")
+
+
+def iinf(entries, version=0):
+    count_format = ">H" if version == 0 else ">L"
+    return full_box("iinf", version, struct.pack(count_format, len(entries)) + b"".join(entries))
+
+
+def iref(version, from_item_id, to_item_ids, reference_type="cdsc"):
+    id_format = ">H" if version == 0 else ">L"
+    payload = struct.pack(id_format, from_item_id) + struct.pack(">H", len(to_item_ids)) + \
+        b"".join(struct.pack(id_format, item_id) for item_id in to_item_ids)
+    return full_box("iref", version, box(reference_type, payload))
+
+
+def iloc(version, items, offset_size=4, length_size=4, base_offset_size=0, index_size=0):
+    """ items: (item id, construction method, base offset, [(offset, length)]) """
+    sizes = offset_size << 12 | length_size << 8 | base_offset_size << 4 | index_size
+    id_format = ">H" if version < 2 else ">L"
+    payload = struct.pack(">H", sizes) + struct.pack(id_format, len(items))
+    for item_id, construction_method, base_offset, extents in items:
+        payload += struct.pack(id_format, item_id)
+        if version in (1, 2):
+            payload += struct.pack(">H", construction_method)
+        payload += b"\x00\x00" + base_offset.to_bytes(base_offset_size, "big")
+        payload += struct.pack(">H", len(extents))
+        for extent_offset, extent_length in extents:
+            payload += b"\x00" * index_size + extent_offset.to_bytes(offset_size, "big") + \
+                extent_length.to_bytes(length_size, "big")
+    return full_box("iloc", version, payload)
+
+
+def meta_payload(*children):
+    """ Meta box payload like read_heic_exif_data reads it: version, flags and children """
+    return b"\x00" * 4 + b"".join(children)
+
+
+def test_item_types_of_infe_v2_and_v3():
+    meta = meta_payload(iinf([infe(2, 1, "hvc1"), infe(3, 70000, "Exif"),
+                              full_box("infe", 1, b"\x00\x02\x00\x00")], version=1))
+    assert read_heif_item_types(meta, 4, len(meta)) == {1: "hvc1", 70000: "Exif"}
+
+
+def test_item_references_with_16_and_32_bit_ids():
+    meta = meta_payload(iref(0, 2, [1, 3]))
+    assert read_heif_item_references(meta, 4, len(meta), "cdsc") == {2: [1, 3]}
+    meta = meta_payload(iref(1, 70000, [1]))
+    assert read_heif_item_references(meta, 4, len(meta), "cdsc") == {70000: [1]}
+    assert read_heif_item_references(meta, 4, len(meta), "dimg") == {}
+
+
+def test_item_locations_v0():
+    meta = meta_payload(iloc(0, [(1, 0, 0, [(100, 20), (200, 30)])]))
+    assert read_heif_item_locations(meta, 4, len(meta)) == {1: (0, [(100, 20), (200, 30)])}
+
+
+def test_item_locations_v1_with_base_offset_and_index():
+    meta = meta_payload(iloc(1, [(1, 1, 1000, [(8, 20)]), (2, 0, 0, [(5, 6)])],
+                             offset_size=8, length_size=4, base_offset_size=4, index_size=4))
+    assert read_heif_item_locations(meta, 4, len(meta)) == {1: (1, [(1008, 20)]),
+                                                            2: (0, [(5, 6)])}
+
+
+def test_item_locations_v2_with_32_bit_ids():
+    meta = meta_payload(iloc(2, [(70000, 0, 0, [(100, 0)])], offset_size=4, length_size=0))
+    assert read_heif_item_locations(meta, 4, len(meta)) == {70000: (0, [(100, 0)])}
+
+
+def test_truncated_boxes():
+    meta = meta_payload(iloc(0, [(1, 0, 0, [(100, 20)])]))
+    with pytest.raises(BoxFormatError):
+        read_heif_item_locations(meta[:-3], 4, len(meta) - 3)
+    # The box size is right, but it counts one item more than it has
+    iloc_box = bytearray(iloc(0, [(1, 0, 0, [(100, 20)])]))
+    iloc_box[15] = 2
+    meta = meta_payload(bytes(iloc_box))
+    with pytest.raises(BoxFormatError):
+        read_heif_item_locations(meta, 4, len(meta))
+
+
+def write_heic(heic_path, meta_children, after_meta=b""):
+    """ Writes a HEIC file with an ftyp box, a meta box and what comes after it """
+    ftyp = box("ftyp", b"heic\x00\x00\x00\x00mif1heic")
+    meta = full_box("meta", 0, b"".join(meta_children))
+    heic_path.write_bytes(ftyp + meta + after_meta)
+    return len(ftyp) + len(meta)
+
+
+def exif_item(tiff_data):
+    # The Exif item starts with the offset of the TIFF header after Exif\0\0
+    return struct.pack(">L", 6) + b"Exif\x00\x00" + tiff_data
+
+
+def test_exif_item_in_file(tmp_path):
+    heic_path = tmp_path / "file_extent.heic"
+    item = exif_item(TIFF_DATA)
+    meta_children = [full_box("pitm", 0, struct.pack(">H", 1)),
+                     iinf([infe(2, 1, "hvc1"), infe(2, 2, "Exif")]),
+                     iref(0, 2, [1])]
+    iloc_size = len(iloc(0, [(2, 0, 0, [(0, 0)])]))
+    meta_end = write_heic(heic_path, meta_children + [b"\x00" * iloc_size])
+    mdat_offset = meta_end + 8
+    write_heic(heic_path, meta_children + [iloc(0, [(2, 0, 0, [(mdat_offset, len(item))])])],
+               box("mdat", item))
+    assert read_heic_exif_data(heic_path) == TIFF_DATA
+
+
+def test_exif_item_in_idat(tmp_path):
+    heic_path = tmp_path / "idat.heic"
+    item = exif_item(TIFF_DATA)
+    write_heic(heic_path, [iinf([infe(3, 2, "Exif")], version=1),
+                           iloc(1, [(2, 1, 0, [(0, 10), (10, len(item) - 10)])]),
+                           box("idat", item)])
+    assert read_heic_exif_data(heic_path) == TIFF_DATA
+
+
+def test_exif_item_of_primary_image_is_preferred(tmp_path):
+    heic_path = tmp_path / "two_exif.heic"
+    other_item = exif_item(b"II*\x00" + b"\x00" * 10)
+    item = exif_item(TIFF_DATA)
+    write_heic(heic_path, [full_box("pitm", 0, struct.pack(">H", 1)),
+                           iinf([infe(2, 1, "hvc1"), infe(2, 2, "Exif"), infe(2, 3, "Exif")]),
+                           iref(0, 3, [1]),
+                           iloc(1, [(2, 1, 0, [(0, len(other_item))]),
+                                    (3, 1, 0, [(len(other_item), len(item))])]),
+                           box("idat", other_item + item)])
+    assert read_heic_exif_data(heic_path) == TIFF_DATA
+
+
+def test_file_without_exif_item(tmp_path):
+    heic_path = tmp_path / "no_exif.heic"
+    write_heic(heic_path, [iinf([infe(2, 1, "hvc1")])])
+    assert read_heic_exif_data(heic_path) is None
+
+
+def test_truncated_meta_box(tmp_path):
+    heic_path = tmp_path / "truncated.heic"
+    write_heic(heic_path, [iinf([infe(2, 2, "Exif")]), iloc(0, [(2, 0, 0, [(0, 10)])])[:-4]])
+    with pytest.raises(ExifFormatError):
+        read_heic_exif_data(heic_path)
+
+
+def test_encoded_heic_matches_pillow_heif(tmp_path):
+    piexif = pytest.importorskip("piexif")
+    pillow_heif = pytest.importorskip("pillow_heif")
+    from PIL import Image
+
+    pillow_heif.register_heif_opener()
+    exif = piexif.dump({
+        "0th": {piexif.ImageIFD.DateTime: b"2021:08:14 10:00:00", piexif.ImageIFD.Model: b"Phone"},
+        "GPS": {piexif.GPSIFD.GPSLatitudeRef: b"N",
+                piexif.GPSIFD.GPSLatitude: ((45, 1), (4, 1), (870, 100)),
+                piexif.GPSIFD.GPSLongitudeRef: b"W",
+                piexif.GPSIFD.GPSLongitude: ((5, 1), (59, 1), (6461, 1000))}})
+    heic_path = tmp_path / "encoded.heic"
+    Image.new("RGB", (16, 16)).save(heic_path, exif=exif)
+
+    exif_data = read_heic_exif_data(heic_path)
+    expected = piexif.load(pillow_heif.open_heif(heic_path).info["exif"], key_is_name=True)
+    assert piexif.load(exif_data, key_is_name=True) == expected
+    assert expected["GPS"]["GPSLongitudeRef"] == b"W"
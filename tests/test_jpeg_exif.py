@@ -0,0 +1,51 @@
+""" Tests of reading EXIF data and extra fields from the JPEG header.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from exif_reader import TAG_DATETIME, TAG_GPSINFO, read_jpeg_exif
+from media_gpsplot import extract_media_file
+
+
+piexif = pytest.importorskip("piexif")
+
+
+@pytest.fixture
+def jpeg_file(tmp_path):
+    from PIL import Image
+
+    exif = piexif.dump({
+        "0th": {piexif.ImageIFD.DateTime: b"2021:08:14 10:00:00",
+                piexif.ImageIFD.Model: b"Camera"},
+        "Exif": {piexif.ExifIFD.LensModel: b"Lens 24mm"},
+        "GPS": {piexif.GPSIFD.GPSLatitudeRef: b"N",
+                piexif.GPSIFD.GPSLatitude: ((45, 1), (4, 1), (870, 100)),
+                piexif.GPSIFD.GPSLongitudeRef: b"W",
+                piexif.GPSIFD.GPSLongitude: ((5, 1), (59, 1), (6461, 1000)),
+                piexif.GPSIFD.GPSAltitude: (300, 1)}})
+    jpeg_file = tmp_path / "t.jpg"
+    Image.new("RGB", (16, 16)).save(jpeg_file, exif=exif)
+    return jpeg_file
+
+
+def test_only_datetime_and_gps_without_extra_tags(jpeg_file):
+    exif = read_jpeg_exif(jpeg_file)
+    assert set(exif) == {TAG_DATETIME, TAG_GPSINFO}
+    assert exif[TAG_DATETIME] == "2021:08:14 10:00:00"
+
+
+def test_extra_tags_from_ifd0_and_exif_ifd(jpeg_file):
+    exif = read_jpeg_exif(jpeg_file, {piexif.ImageIFD.Model, piexif.ExifIFD.LensModel})
+    assert exif[piexif.ImageIFD.Model] == "Camera"
+    assert exif[piexif.ExifIFD.LensModel] == "Lens 24mm"
+
+
+def test_extra_fields_of_jpeg(jpeg_file):
+    creationdate, raw_geolocation, error, extra_values = \
+        extract_media_file(Path(jpeg_file), "jpg", ("Model", "LensModel", "GPSAltitude"))
+    assert error is None
+    assert creationdate == "2021:08:14 10:00:00"
+    assert raw_geolocation[1] == "N" and raw_geolocation[3] == "W"
+    assert extra_values == ("Camera", "Lens 24mm", 300.0)
@@ -0,0 +1,114 @@
+""" Tests of the live map: batch files, latest.js and watching the media paths by polling.
+"""
+
+import argparse
+import json
+import logging
+
+import pytest
+
+import media_gpsplot
+from file_watcher import PollingWatcher
+from live_map import LiveMap
+
+
+MARKER_STYLES = [("red", "camera"), ("lightgray", "question-sign")]
+
+
+def read_batch(batch_file):
+    """ Batch number, points and removed files of a batch file """
+    script = batch_file.read_text(encoding="utf-8")
+    assert script.startswith("addMediaBatch(") and script.endswith(");\n")
+    return json.loads(f"[{script[len('addMediaBatch('):-len(');') - 1]}]")
+
+
+def read_latest(data_dir):
+    return (data_dir / "latest.js").read_text(encoding="utf-8")
+
+
+def test_batches_and_latest(tmp_path):
+    live_map = LiveMap(tmp_path / "live.html", MARKER_STYLES)
+    data_dir = tmp_path / "live_data"
+    assert read_latest(data_dir) == "setMediaBatches(0);\n"
+    assert '"live_data"' in (tmp_path / "live.html").read_text(encoding="utf-8")
+
+    live_map.add_batch([[45.1885, 5.7245, 0, "/media/p1.jpg", "2021-08-14 10:00:00"]])
+    live_map.add_batch([], {"/media/p2.jpg", "/media/p1.jpg"})
+    assert read_batch(data_dir / "batch_000001.js") == \
+        [1, [[45.1885, 5.7245, 0, "/media/p1.jpg", "2021-08-14 10:00:00"]], []]
+    assert read_batch(data_dir / "batch_000002.js") == [2, [], ["/media/p1.jpg", "/media/p2.jpg"]]
+    assert read_latest(data_dir) == "setMediaBatches(2);\n"
+    assert not (data_dir / "latest.js.tmp").exists()
+
+
+def test_batches_of_earlier_run_are_removed(tmp_path):
+    live_map = LiveMap(tmp_path / "live.html", MARKER_STYLES)
+    live_map.add_batch([])
+    live_map.add_batch([])
+    LiveMap(tmp_path / "live.html", MARKER_STYLES)
+    data_dir = tmp_path / "live_data"
+    assert sorted(path.name for path in data_dir.iterdir()) == ["latest.js"]
+    assert read_latest(data_dir) == "setMediaBatches(0);\n"
+
+
+def make_jpeg(jpeg_file, with_gps=True):
+    piexif = pytest.importorskip("piexif")
+    from PIL import Image
+
+    exif = {"0th": {piexif.ImageIFD.DateTime: b"2021:08:14 10:00:00"}}
+    if with_gps:
+        exif["GPS"] = {piexif.GPSIFD.GPSLatitudeRef: b"N",
+                       piexif.GPSIFD.GPSLatitude: ((45, 1), (11, 1), (1860, 100)),
+                       piexif.GPSIFD.GPSLongitudeRef: b"E",
+                       piexif.GPSIFD.GPSLongitude: ((5, 1), (43, 1), (2820, 100))}
+    Image.new("RGB", (16, 16)).save(jpeg_file, exif=piexif.dump(exif))
+
+
+def test_watch_by_polling(tmp_path, monkeypatch):
+    pytest.importorskip("pandas")
+    media_dir = tmp_path / "media"
+    media_dir.mkdir()
+    make_jpeg(media_dir / "p1.jpg")
+    reported = []
+
+    class ScriptedWatcher:
+        """ Polling watcher that makes a media file before each scan, and stops the watch
+            after two bursts.
+        """
+        def __init__(self, snapshot, logger):
+            self.watcher = PollingWatcher(snapshot, logger, interval=0.01)
+
+        def wait_for_changes(self):
+            if len(reported) == 0:
+                make_jpeg(media_dir / "p2.jpg")
+            elif len(reported) == 1:
+                make_jpeg(media_dir / "p3.jpg", with_gps=False)
+            else:
+                raise KeyboardInterrupt
+            changes = self.watcher.wait_for_changes()
+            reported.append(sorted(changes.changed))
+            return changes
+
+        def close(self):
+            self.watcher.close()
+
+    def open_scripted_watcher(directories, snapshot, logger, polling=False):
+        assert polling
+        return ScriptedWatcher(snapshot, logger)
+
+    monkeypatch.setattr(media_gpsplot, "open_file_watcher", open_scripted_watcher)
+    args = argparse.Namespace(media_path=str(media_dir), output=str(tmp_path / "live.html"),
+                              no_cache=True, cache=None, rebuild_cache=False, extra_fields="",
+                              follow_symlinks=False, jobs=1, poll=True)
+    media_gpsplot.watch_media_paths(args, None, logging.getLogger())
+
+    p1_jpg, p2_jpg, p3_jpg = (str((media_dir / name).resolve())
+                              for name in ("p1.jpg", "p2.jpg", "p3.jpg"))
+    # Every new file is reported once
+    assert reported == [[p2_jpg], [p3_jpg]]
+    data_dir = tmp_path / "live_data"
+    assert read_latest(data_dir) == "setMediaBatches(3);\n"
+    batches = [read_batch(data_dir / f"batch_{batch:06d}.js") for batch in (1, 2, 3)]
+    assert [[point[3] for point in points] for _, points, _ in batches] == [[p1_jpg], [p2_jpg], []]
+    assert batches[1][1][0][:2] == pytest.approx([45.1885, 5.7245])
+    assert [removed for _, _, removed in batches] == [[], [], []]
@@ -0,0 +1,105 @@
+""" Tests of writing media files as JSON map tiles per zoom level.
+"""
+
+import json
+import math
+
+from map_tiles import CLUSTER_MAX_ZOOM, POINTS_ZOOM, TILE_CELLS, write_map_tiles
+
+
+MARKER_STYLES = [("red", "camera"), ("lightgray", "question-sign")]
+
+
+def tile_of(latitude, longitude, zoom):
+    """ Tile of a geolocation, with the formula of the OpenStreetMap wiki """
+    tiles_per_side = 2 ** zoom
+    latitude = math.radians(latitude)
+    tile_x = int((longitude + 180.0) / 360.0 * tiles_per_side)
+    tile_y = int((1.0 - math.asinh(math.tan(latitude)) / math.pi) / 2.0 * tiles_per_side)
+    return tile_x, tile_y
+
+
+def write_tiles(output_dir, geolocations, places=None, copies=None):
+    latitudes = [latitude for latitude, _ in geolocations]
+    longitudes = [longitude for _, longitude in geolocations]
+    return write_map_tiles(output_dir, latitudes, longitudes, [0] * len(geolocations),
+                           [f"p{index}.jpg" for index in range(len(geolocations))],
+                           ["2021-08-14 10:00:00"] * len(geolocations), MARKER_STYLES,
+                           places, copies)
+
+
+def read_tile(output_dir, zoom, tile_x, tile_y):
+    tile_file = output_dir / "tiles" / str(zoom) / str(tile_x) / f"{tile_y}.json"
+    return json.loads(tile_file.read_text(encoding="utf-8"))
+
+
+def tile_files(output_dir):
+    return sorted(str(tile_file.relative_to(output_dir / "tiles"))
+                  for tile_file in (output_dir / "tiles").rglob("*.json"))
+
+
+# Two points close together in Grenoble, one in Sydney
+GRENOBLE = [(45.1885, 5.7245), (45.1890, 5.7250)]
+SYDNEY = (-33.8600, 151.2100)
+
+
+def test_points_tiles(tmp_path):
+    write_tiles(tmp_path, GRENOBLE + [SYDNEY], places=["Grenoble", "Grenoble", ""],
+                copies=[0, 2, 0])
+    tile_x, tile_y = tile_of(*GRENOBLE[0], POINTS_ZOOM)
+    points = read_tile(tmp_path, POINTS_ZOOM, tile_x, tile_y)["points"]
+    assert [point[3] for point in points] == ["p0.jpg", "p1.jpg"]
+    assert points[1] == [45.189, 5.725, 0, "p1.jpg", "2021-08-14 10:00:00", "Grenoble", 2]
+    tile_x, tile_y = tile_of(*SYDNEY, POINTS_ZOOM)
+    assert [point[3] for point in read_tile(tmp_path, POINTS_ZOOM, tile_x, tile_y)["points"]] \
+        == ["p2.jpg"]
+
+
+def test_tiles_per_zoom_level(tmp_path):
+    tile_count = write_tiles(tmp_path, GRENOBLE + [SYDNEY])
+    expected = set()
+    for zoom in range(POINTS_ZOOM + 1):
+        for latitude, longitude in GRENOBLE + [SYDNEY]:
+            tile_x, tile_y = tile_of(latitude, longitude, zoom)
+            expected.add(f"{zoom}/{tile_x}/{tile_y}.json")
+    assert tile_files(tmp_path) == sorted(expected)
+    assert tile_count == len(expected)
+    assert (tmp_path / "index.html").exists()
+
+
+def test_cluster_counts(tmp_path):
+    write_tiles(tmp_path, GRENOBLE + [SYDNEY])
+    # The whole world is one tile at zoom 0, Grenoble and Sydney are in other cells
+    clusters = read_tile(tmp_path, 0, 0, 0)["clusters"]
+    assert sorted(cluster[2] for cluster in clusters) == [1, 2]
+    grenoble_cluster = max(clusters, key=lambda cluster: cluster[2])
+    assert grenoble_cluster[:2] == [45.18875, 5.72475]
+    # Up to CLUSTER_MAX_ZOOM there are at most TILE_CELLS by TILE_CELLS clusters per tile
+    tile_x, tile_y = tile_of(*GRENOBLE[0], CLUSTER_MAX_ZOOM)
+    clusters = read_tile(tmp_path, CLUSTER_MAX_ZOOM, tile_x, tile_y)["clusters"]
+    assert sum(cluster[2] for cluster in clusters) == 2
+    assert len(clusters) <= TILE_CELLS * TILE_CELLS
+
+
+def test_many_points_in_one_tile_are_clustered(tmp_path):
+    # A grid of 20 by 20 points across one tile of CLUSTER_MAX_ZOOM
+    geolocations = [(45.1 + row * 0.0015, 5.7 + column * 0.002)
+                    for row in range(20) for column in range(20)]
+    write_tiles(tmp_path, geolocations)
+    clusters = read_tile(tmp_path, 0, 0, 0)["clusters"]
+    assert clusters[0][2] == len(geolocations)
+    counts = []
+    for tile_file in (tmp_path / "tiles" / str(CLUSTER_MAX_ZOOM)).rglob("*.json"):
+        tile_clusters = json.loads(tile_file.read_text(encoding="utf-8"))["clusters"]
+        assert len(tile_clusters) <= TILE_CELLS * TILE_CELLS
+        counts.extend(cluster[2] for cluster in tile_clusters)
+    assert sum(counts) == len(geolocations) and max(counts) > 1
+
+
+def test_tiles_of_earlier_run_are_replaced(tmp_path):
+    write_tiles(tmp_path, GRENOBLE + [SYDNEY])
+    write_tiles(tmp_path, [SYDNEY])
+    tile_x, tile_y = tile_of(*GRENOBLE[0], POINTS_ZOOM)
+    assert not (tmp_path / "tiles" / str(POINTS_ZOOM) / str(tile_x) / f"{tile_y}.json").exists()
+    assert len(tile_files(tmp_path)) == POINTS_ZOOM + 1
+    assert not (tmp_path / "tiles.new").exists() and not (tmp_path / "tiles.old").exists()
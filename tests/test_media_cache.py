@@ -0,0 +1,117 @@
+""" Tests of the media cache: lookups keyed by path, size and mtime, versions and pruning.
+"""
+
+import logging
+import os
+import sqlite3
+
+import media_cache
+from media_cache import MediaCache
+
+
+def open_cache(tmp_path, rebuild=False):
+    return MediaCache(tmp_path / "cache.sqlite", logging.getLogger(), rebuild=rebuild)
+
+
+def make_media_file(directory, name="p1.jpg", content=b"jpeg"):
+    directory.mkdir(exist_ok=True)
+    media_file = directory / name
+    media_file.write_bytes(content)
+    return media_file
+
+
+def store_and_reopen(tmp_path, media_file, geolocation=(45.5, -5.25, 321.0)):
+    cache = open_cache(tmp_path)
+    cache.store(media_file, media_file.stat(), "2021:08:14 10:00:00", geolocation)
+    cache.close()
+    return open_cache(tmp_path)
+
+
+def test_unchanged_file_is_a_hit(tmp_path):
+    media_file = make_media_file(tmp_path / "media")
+    cache = store_and_reopen(tmp_path, media_file)
+    assert cache.lookup(media_file, media_file.stat()) == \
+        (True, "2021:08:14 10:00:00", (45.5, -5.25, 321.0))
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.close()
+
+
+def test_file_without_geolocation_is_a_hit(tmp_path):
+    media_file = make_media_file(tmp_path / "media")
+    cache = store_and_reopen(tmp_path, media_file, geolocation=None)
+    assert cache.lookup(media_file, media_file.stat()) == (True, "2021:08:14 10:00:00", None)
+    cache.close()
+
+
+def test_changed_mtime_is_a_miss(tmp_path):
+    media_file = make_media_file(tmp_path / "media")
+    cache = store_and_reopen(tmp_path, media_file)
+    file_stat = media_file.stat()
+    os.utime(media_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000_000))
+    assert cache.lookup(media_file, media_file.stat()) == (False, None, None)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cache.close()
+
+
+def test_changed_size_is_a_miss(tmp_path):
+    media_file = make_media_file(tmp_path / "media")
+    cache = store_and_reopen(tmp_path, media_file)
+    file_stat = media_file.stat()
+    media_file.write_bytes(b"jpeg, longer")
+    os.utime(media_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+    assert cache.lookup(media_file, media_file.stat()) == (False, None, None)
+    cache.close()
+
+
+def test_version_mismatch_clears_the_cache(tmp_path):
+    media_file = make_media_file(tmp_path / "media")
+    store_and_reopen(tmp_path, media_file).close()
+    connection = sqlite3.connect(str(tmp_path / "cache.sqlite"))
+    connection.execute("UPDATE cache_info SET value = ? WHERE key = 'version'",
+                       (str(media_cache.CACHE_VERSION - 1),))
+    connection.commit()
+    connection.close()
+
+    cache = open_cache(tmp_path)
+    assert cache.get_cache_version() == media_cache.CACHE_VERSION
+    assert cache.lookup(media_file, media_file.stat()) == (False, None, None)
+    cache.close()
+
+
+def test_rebuild_clears_the_cache(tmp_path):
+    media_file = make_media_file(tmp_path / "media")
+    store_and_reopen(tmp_path, media_file).close()
+    cache = open_cache(tmp_path, rebuild=True)
+    assert cache.lookup(media_file, media_file.stat()) == (False, None, None)
+    cache.close()
+
+
+def test_prune_removes_unseen_paths(tmp_path):
+    media_path = tmp_path / "media"
+    kept_file = make_media_file(media_path, "kept.jpg")
+    marked_file = make_media_file(media_path, "marked.jpg")
+    gone_file = make_media_file(media_path, "gone.jpg")
+    other_file = make_media_file(tmp_path / "other", "other.jpg")
+    cache = open_cache(tmp_path)
+    for media_file in (kept_file, marked_file, gone_file, other_file):
+        cache.store(media_file, media_file.stat(), None, None)
+    cache.close()
+
+    cache = open_cache(tmp_path)
+    cache.lookup(kept_file, kept_file.stat())
+    cache.mark_seen(marked_file)
+    assert cache.prune([media_path]) == 1
+    assert cache.lookup(gone_file, gone_file.stat()) == (False, None, None)
+    assert cache.lookup(marked_file, marked_file.stat())[0]
+    # Files outside the scanned media paths stay in the cache
+    assert cache.lookup(other_file, other_file.stat())[0]
+    cache.close()
+
+
+def test_prune_keeps_stored_files(tmp_path):
+    media_path = tmp_path / "media"
+    media_file = make_media_file(media_path)
+    cache = open_cache(tmp_path)
+    cache.store(media_file, media_file.stat(), None, None)
+    assert cache.prune([media_path]) == 0
+    cache.close()
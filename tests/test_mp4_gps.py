@@ -0,0 +1,163 @@
+""" Tests of reading GPS data from synthetic MP4 files: udta, loci, QuickTime keys and GPMF.
+"""
+
+import struct
+
+import numpy as np
+import pytest
+
+from mp4_gps import MP4FormatError, QUICKTIME_EPOCH_OFFSET, read_gpmf_gps, read_mp4_gps, \
+    read_mp4_track
+
+
+# 2021-08-14T10:27:22 UTC
+CREATION_TIME = 1628936842
+
+
+def box(box_type, payload):
+    return struct.pack(">L4s", 8 + len(payload), box_type.encode("latin-1")) + payload
+
+
+def full_box(box_type, payload, version=0):
+    return box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+
+def mvhd(creation_time=CREATION_TIME):
+    return full_box("mvhd", struct.pack(">LLLL", creation_time + QUICKTIME_EPOCH_OFFSET, 0,
+                                        1000, 0))
+
+
+def klv(key, value_type, value_size, values):
+    """ GPMF entry, padded to 32 bits """
+    data = struct.pack(">4scBH", key, value_type.encode("latin-1"), value_size,
+                       len(values) // value_size) + values
+    return data + b"\x00" * (-len(data) % 4)
+
+
+def nested(key, *entries):
+    data = b"".join(entries)
+    return struct.pack(">4scBH", key, b"\x00", 4, len(data) // 4) + data
+
+
+def gps5_sample(points, gps_time=b"210814102722.000", gps_fix=3, key=b"GPS5", columns=5):
+    """ GPMF sample with latitude, longitude, altitude per point """
+    scale = (10000000, 10000000, 1000) + (1000,) * (columns - 3)
+    values = b"".join(struct.pack(f">{columns}l", round(latitude * 1e7), round(longitude * 1e7),
+                                  round(altitude * 1000), *([0] * (columns - 3)))
+                      for latitude, longitude, altitude in points)
+    return nested(b"DEVC", nested(b"STRM",
+                                  klv(b"GPSU", "U", 16, gps_time),
+                                  klv(b"GPSF", "L", 4, struct.pack(">L", gps_fix)),
+                                  klv(b"SCAL", "l", 4, struct.pack(f">{columns}l", *scale)),
+                                  klv(key, "l", 4 * columns, values)))
+
+
+def write_mp4(mp4_path, moov_children, samples=()):
+    """ Writes an MP4 file. The samples go in mdat and get a GPMF track in moov. """
+    ftyp = box("ftyp", b"mp42\x00\x00\x00\x00mp42")
+    mdat = box("mdat", b"".join(samples))
+    offset = len(ftyp) + 8
+    chunk_offsets = []
+    for sample in samples:
+        chunk_offsets.append(offset)
+        offset += len(sample)
+    if samples:
+        stbl = box("stbl",
+                   full_box("stsd", struct.pack(">L", 1) + box("gpmd", b"\x00" * 8)) +
+                   full_box("stsz", struct.pack(f">LL{len(samples)}L", 0, len(samples),
+                                                *(len(sample) for sample in samples))) +
+                   full_box("stsc", struct.pack(">LLLL", 1, 1, 1, 1)) +
+                   full_box("stco", struct.pack(f">L{len(samples)}L", len(samples),
+                                                *chunk_offsets)))
+        moov_children = list(moov_children) + \
+            [box("trak", box("mdia", box("minf", stbl)))]
+    mp4_path.write_bytes(ftyp + mdat + box("moov", b"".join(moov_children)))
+
+
+def test_udta_xyz_location(tmp_path):
+    location = b"+52.3700+004.8900+010.000/"
+    mp4_path = tmp_path / "xyz.mp4"
+    write_mp4(mp4_path, [mvhd(), box("udta", box("\xa9xyz", struct.pack(">HH", len(location),
+                                                                          0x15c7) + location))])
+    assert read_mp4_gps(mp4_path) == ("2021-08-14T10:27:22", (52.37, 4.89, 10.0))
+
+
+def test_loci_location(tmp_path):
+    loci = struct.pack(">H", 0x15c7) + b"Home\x00" + b"\x00" + \
+        struct.pack(">3l", int(-4.5 * 65536), int(45.25 * 65536), 100 * 65536)
+    mp4_path = tmp_path / "loci.mp4"
+    write_mp4(mp4_path, [mvhd(), box("udta", full_box("loci", loci))])
+    assert read_mp4_gps(mp4_path) == ("2021-08-14T10:27:22", (45.25, -4.5, 100.0))
+
+
+def test_quicktime_keys_location(tmp_path):
+    key = b"com.apple.quicktime.location.ISO6709"
+    keys = full_box("keys", struct.pack(">L", 2) +
+                    struct.pack(">L", 8 + len(b"other.key")) + b"mdta" + b"other.key" +
+                    struct.pack(">L", 8 + len(key)) + b"mdta" + key)
+    ilst = box("ilst", box("\x00\x00\x00\x02",
+                           box("data", struct.pack(">LL", 1, 0) + b"-33.8600+151.2100+005.000/")))
+    meta = box("meta", box("hdlr", b"\x00" * 24) + keys + ilst)
+    mp4_path = tmp_path / "keys.mov"
+    write_mp4(mp4_path, [mvhd(), meta])
+    assert read_mp4_gps(mp4_path) == ("2021-08-14T10:27:22", (-33.86, 151.21, 5.0))
+
+
+def test_video_without_location(tmp_path):
+    mp4_path = tmp_path / "none.mp4"
+    write_mp4(mp4_path, [mvhd(0)])
+    assert read_mp4_gps(mp4_path) == (None, None)
+
+
+def test_gpmf_first_fix(tmp_path):
+    mp4_path = tmp_path / "gopro.mp4"
+    write_mp4(mp4_path, [mvhd()], [gps5_sample([(45.0, 5.0, 200.0)], gps_fix=0),
+                                   gps5_sample([(45.1, 5.2, 210.5), (45.2, 5.3, 211.0)])])
+    creationdate, geolocation = read_mp4_gps(mp4_path)
+    assert creationdate == "2021-08-14T10:27:22"
+    assert geolocation == pytest.approx((45.1, 5.2, 210.5))
+
+
+def test_gpmf_gps9():
+    sample = gps5_sample([(45.1, -5.2, 210.5)], key=b"GPS9", columns=8)
+    gps_time, gps_points = read_gpmf_gps(sample)
+    assert gps_time == np.datetime64("2021-08-14T10:27:22.000")
+    assert gps_points == pytest.approx(np.array([[45.1, -5.2, 210.5]]))
+
+
+def test_gpmf_track(tmp_path):
+    mp4_path = tmp_path / "gopro.mp4"
+    write_mp4(mp4_path, [mvhd()],
+              [gps5_sample([(45.0, 5.0, 200.0), (45.0, 5.001, 200.0)], b"210814102722.000"),
+               gps5_sample([(45.0, 5.002, 200.0), (45.0, 5.003, 200.0)], b"210814102723.000")])
+    times, gps_points = read_mp4_track(mp4_path)
+    assert times.tolist() == np.array(["2021-08-14T10:27:22.000", "2021-08-14T10:27:22.500",
+                                       "2021-08-14T10:27:23.000", "2021-08-14T10:27:23.500"],
+                                      dtype="datetime64[ms]").tolist()
+    assert gps_points[:, 1] == pytest.approx([5.0, 5.001, 5.002, 5.003])
+
+
+def test_video_without_gpmf_track(tmp_path):
+    mp4_path = tmp_path / "none.mp4"
+    write_mp4(mp4_path, [mvhd()])
+    assert read_mp4_track(mp4_path) == (None, None)
+
+
+def test_gpmf_data_cut_short(tmp_path):
+    # The GPS5 entry says it has more points than the sample has: a ValueError in NumPy
+    sample = bytearray(gps5_sample([(45.0, 5.0, 200.0), (45.0, 5.001, 200.0)]))
+    gps5_position = sample.index(b"GPS5")
+    sample[gps5_position + 6:gps5_position + 8] = struct.pack(">H", 50)
+    mp4_path = tmp_path / "broken.mp4"
+    write_mp4(mp4_path, [mvhd()], [bytes(sample)])
+    with pytest.raises(MP4FormatError):
+        read_mp4_gps(mp4_path)
+    with pytest.raises(MP4FormatError):
+        read_mp4_track(mp4_path)
+
+
+def test_missing_moov(tmp_path):
+    mp4_path = tmp_path / "no_moov.mp4"
+    mp4_path.write_bytes(box("ftyp", b"mp42\x00\x00\x00\x00") + box("mdat", b"\x00" * 16))
+    with pytest.raises(MP4FormatError):
+        read_mp4_gps(mp4_path)
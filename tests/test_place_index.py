@@ -0,0 +1,65 @@
+""" Tests of the place index: nearest place of geolocations from a small gazetteer.
+"""
+
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("pandas")
+
+from place_index import PlaceIndex  # noqa: E402
+
+
+GAZETTEER = """name,latitude,longitude,country_code
+Grenoble,45.1885,5.7245,FR
+Chambéry,45.5646,5.9178,FR
+Sydney,-33.8679,151.2073,AU
+Nowhere,,,
+"""
+
+
+@pytest.fixture
+def gazetteer_file(tmp_path):
+    gazetteer_file = tmp_path / "places.csv"
+    gazetteer_file.write_text(GAZETTEER, encoding="utf-8")
+    return gazetteer_file
+
+
+def test_nearest_place(gazetteer_file):
+    place_index = PlaceIndex.open(str(gazetteer_file), logging.getLogger())
+    assert len(place_index) == 3
+    # Voiron is 22 km from Grenoble and 34 km from Chambéry, Aix-les-Bains is near Chambéry
+    places = place_index.lookup([45.3642, 45.6887, -33.9], [5.5906, 5.9155, 151.2])
+    assert places.tolist() == ["Grenoble, FR", "Chambéry, FR", "Sydney, AU"]
+
+
+def test_max_distance(gazetteer_file):
+    place_index = PlaceIndex.open(str(gazetteer_file), logging.getLogger())
+    # Voiron is 22 km from Grenoble, Lyon is 95 km from Grenoble
+    places = place_index.lookup([45.3642, 45.7640], [5.5906, 4.8357], max_distance=30.0)
+    assert places.tolist() == ["Grenoble, FR", None]
+    places = place_index.lookup([45.3642], [5.5906], max_distance=20.0)
+    assert places.tolist() == [None]
+
+
+def test_cache_is_used_and_made_again(gazetteer_file, caplog):
+    cache_dir = gazetteer_file.parent / "places.csv.places"
+    with caplog.at_level(logging.DEBUG):
+        PlaceIndex.open(str(gazetteer_file), logging.getLogger())
+        assert "Building place index" in caplog.text
+        assert sorted(os.listdir(cache_dir)) == ["coordinates.npy", "places.npy", "source.json"]
+
+        caplog.clear()
+        place_index = PlaceIndex.open(str(gazetteer_file), logging.getLogger())
+        assert "Place index from cache" in caplog.text
+        assert place_index.lookup([45.19], [5.72]).tolist() == ["Grenoble, FR"]
+
+        # A changed gazetteer makes the cache again
+        gazetteer_file.write_text(GAZETTEER.replace("Grenoble", "Gières"), encoding="utf-8")
+        os.utime(gazetteer_file, ns=(0, 0))
+        caplog.clear()
+        place_index = PlaceIndex.open(str(gazetteer_file), logging.getLogger())
+        assert "Building place index" in caplog.text
+        assert place_index.lookup([45.19], [5.72]).tolist() == ["Gières, FR"]
@@ -0,0 +1,113 @@
+""" Round trips of media records through the record sinks and the geo index.
+"""
+
+import csv
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from geo_index import read_geo_index, write_geo_index
+from media_gpsplot import MediaRecord, MediaRecordBuilder
+from record_sinks import RECORD_COLUMNS, open_record_sink
+
+
+EXTRA_FIELDS = ("Model", "ISO")
+
+MEDIA_RECORDS = [
+    MediaRecord("/media/p1.jpg", "jpg", "2021:08:14 10:00:00", (45.5, -5.25, 321.0),
+                ("Pixel 5", 100)),
+    # No geolocation, no creationdate, no extra values
+    MediaRecord("/media/nogps.mp4", "mp4", None, None, (None, None)),
+    MediaRecord("/media/C0605M01.XML", "XML", "2021-08-14T11:27:22+01:00",
+                (-33.9, 151.2, -2.5), ("ILCE-7M3", None)),
+]
+
+
+def write_records(output_file):
+    record_sink = open_record_sink(str(output_file), EXTRA_FIELDS)
+    for media_record in MEDIA_RECORDS:
+        record_sink.write(media_record)
+    record_sink.close()
+
+
+def test_csv_round_trip(tmp_path):
+    output_file = tmp_path / "records.csv"
+    write_records(output_file)
+    with open(output_file, newline="", encoding="utf-8") as csv_file:
+        rows = list(csv.reader(csv_file))
+    assert rows[0] == RECORD_COLUMNS + list(EXTRA_FIELDS)
+    assert rows[1] == ["/media/p1.jpg", "jpg", "2021:08:14 10:00:00", "45.5", "-5.25",
+                       "321.0", "Pixel 5", "100"]
+    # None is an empty field
+    assert rows[2] == ["/media/nogps.mp4", "mp4", "", "", "", "", "", ""]
+    records_df = pd.read_csv(output_file)
+    assert records_df["latitude"].dtype == np.float64
+    assert records_df["latitude"].isna().tolist() == [False, True, False]
+    assert records_df["extension"].tolist() == ["jpg", "mp4", "xml"]
+
+
+def test_jsonl_round_trip(tmp_path):
+    output_file = tmp_path / "records.jsonl"
+    write_records(output_file)
+    with open(output_file, encoding="utf-8") as jsonl_file:
+        records = [json.loads(line) for line in jsonl_file]
+    assert list(records[0]) == RECORD_COLUMNS + list(EXTRA_FIELDS)
+    assert records[0]["ISO"] == 100 and records[0]["latitude"] == 45.5
+    assert records[1] == {"filename": "/media/nogps.mp4", "extension": "mp4",
+                          "creationdate": None, "latitude": None, "longitude": None,
+                          "altitude": None, "Model": None, "ISO": None}
+    assert records[2]["creationdate"] == "2021-08-14T11:27:22+01:00"
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    output_file = tmp_path / "records.parquet"
+    write_records(output_file)
+    records_df = pd.read_parquet(output_file)
+    assert list(records_df.columns) == RECORD_COLUMNS + list(EXTRA_FIELDS)
+    for column in ("latitude", "longitude", "altitude"):
+        assert records_df[column].dtype == np.float64
+    assert records_df["latitude"].isna().tolist() == [False, True, False]
+    assert records_df["creationdate"].isna().tolist() == [False, True, False]
+    # Extra fields are strings in Parquet, missing values stay missing
+    assert records_df["ISO"].tolist()[0] == "100"
+    assert records_df["ISO"].isna().tolist() == [False, True, True]
+    assert records_df["Model"].tolist()[2] == "ILCE-7M3"
+
+
+def make_geo_dataframe():
+    media_records = MediaRecordBuilder(EXTRA_FIELDS)
+    for media_record in MEDIA_RECORDS:
+        if media_record.geolocation is not None:
+            media_records.append(media_record)
+    # A media file with a geolocation but no creationdate or extra values
+    media_records.append(MediaRecord("/media/h1.heic", "heic", "no date", (1.0, 2.0, 3.0),
+                                     (None, None)))
+    return media_records.to_dataframe()
+
+
+@pytest.mark.parametrize("index_suffix", [".feather", ".parquet"])
+def test_geo_index_round_trip(tmp_path, index_suffix):
+    pytest.importorskip("pyarrow")
+    media_files_df = make_geo_dataframe()
+    index_file = tmp_path / f"index{index_suffix}"
+    write_geo_index(media_files_df, index_file)
+    geo_index_df = read_geo_index(index_file)
+
+    assert geo_index_df.index.name == "filename"
+    assert geo_index_df.index.tolist() == media_files_df.index.tolist()
+    assert list(geo_index_df.columns) == list(media_files_df.columns)
+    assert pd.api.types.is_datetime64_dtype(geo_index_df["creationdate"])
+    assert geo_index_df["creationdate"].isna().tolist() == [False, False, True]
+    assert geo_index_df["creationdate"].iloc[1] == pd.Timestamp("2021-08-14 11:27:22")
+    for column in ("latitude", "longitude", "altitude"):
+        assert geo_index_df[column].dtype == np.float64
+        np.testing.assert_array_equal(geo_index_df[column], media_files_df[column])
+    assert isinstance(geo_index_df["extension"].dtype, pd.CategoricalDtype)
+    assert geo_index_df["extension"].tolist() == ["jpg", "xml", "heic"]
+    # Extra fields are strings, missing values are NA and not the text nan
+    assert geo_index_df["ISO"].tolist()[0] == "100"
+    assert geo_index_df["ISO"].isna().tolist() == [False, True, True]
+    assert geo_index_df["Model"].isna().tolist() == [False, False, True]
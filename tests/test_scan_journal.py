@@ -0,0 +1,72 @@
+""" Tests of resuming a scan from the scan journal.
+"""
+
+import logging
+import os
+
+import pytest
+
+from media_gpsplot import MediaRecord
+from scan_journal import ScanJournal, ScanJournalError
+
+
+@pytest.fixture
+def media_file(tmp_path):
+    media_file = tmp_path / "p1.jpg"
+    media_file.write_bytes(b"jpeg")
+    return media_file
+
+
+def open_journal(tmp_path, resume=False, extra_fields=()):
+    return ScanJournal(tmp_path / "journal.sqlite", logging.getLogger(), [tmp_path],
+                       extra_fields, resume=resume)
+
+
+def store_record(scan_journal, media_file):
+    scan_journal.store(MediaRecord(media_file, "jpg", "2021:08:14 10:00:00",
+                                   (45.5, -5.25, 321.0)), media_file.stat())
+    scan_journal.commit()
+
+
+def test_resume_serves_unchanged_files(tmp_path, media_file):
+    scan_journal = open_journal(tmp_path)
+    store_record(scan_journal, media_file)
+    scan_journal.close()
+
+    scan_journal = open_journal(tmp_path, resume=True)
+    assert scan_journal.resuming
+    assert scan_journal.lookup(media_file, media_file.stat()) == \
+        ("2021:08:14 10:00:00", (45.5, -5.25, 321.0), (), None)
+    assert scan_journal.resumed == 1
+    scan_journal.close()
+
+
+def test_resume_reads_changed_files_again(tmp_path, media_file):
+    scan_journal = open_journal(tmp_path)
+    store_record(scan_journal, media_file)
+    scan_journal.close()
+    file_stat = media_file.stat()
+    os.utime(media_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000_000))
+
+    scan_journal = open_journal(tmp_path, resume=True)
+    assert scan_journal.lookup(media_file, media_file.stat()) is None
+    scan_journal.close()
+
+
+def test_complete_scan_is_not_resumed(tmp_path, media_file):
+    scan_journal = open_journal(tmp_path)
+    store_record(scan_journal, media_file)
+    scan_journal.close(complete=True)
+
+    scan_journal = open_journal(tmp_path, resume=True)
+    assert not scan_journal.resuming
+    assert scan_journal.lookup(media_file, media_file.stat()) is None
+    scan_journal.close()
+
+
+def test_resume_needs_the_same_scan(tmp_path, media_file):
+    with pytest.raises(ScanJournalError):
+        open_journal(tmp_path, resume=True)
+    open_journal(tmp_path).close()
+    with pytest.raises(ScanJournalError):
+        open_journal(tmp_path, resume=True, extra_fields=("Model",))
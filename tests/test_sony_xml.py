@@ -0,0 +1,48 @@
+""" Tests of streaming through Sony NonRealTimeMeta XML files.
+"""
+
+import gc
+import warnings
+
+from sony_xml import read_nonrealtimemeta
+
+
+NONREALTIMEMETA = """<?xml version="1.0" encoding="UTF-8"?>
+<NonRealTimeMeta xmlns="urn:schemas-professionalDisc:nonRealTimeMeta:ver.2.00">
+	<CreationDate value="2021-08-14T11:27:22+01:00"/>
+	<AcquisitionRecord>
+		<Group name="ExifGPS">
+			<Item name="LatitudeRef" value="N"/>
+			<Item name="Latitude" value="44:41:31.488"/>
+			<Item name="LongitudeRef" value="W"/>
+			<Item name="Longitude" value="5:59:06.461"/>
+			<Item name="Altitude" value="1646.7"/>
+		</Group>
+	</AcquisitionRecord>
+"""
+
+
+def test_reads_creationdate_and_gps_items(tmp_path):
+    xml_file = tmp_path / "C0001M01.XML"
+    xml_file.write_text(NONREALTIMEMETA + "</NonRealTimeMeta>\n")
+    assert read_nonrealtimemeta(xml_file) == {
+        "CreationDate": "2021-08-14T11:27:22+01:00", "LatitudeRef": "N",
+        "Latitude": "44:41:31.488", "LongitudeRef": "W", "Longitude": "5:59:06.461",
+        "Altitude": "1646.7"}
+
+
+def test_stops_after_gps_group_and_closes_file(tmp_path):
+    # The rest of the file is never parsed, so it may even be broken
+    xml_file = tmp_path / "C0001M01.XML"
+    xml_file.write_text(NONREALTIMEMETA + "<Broken")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ResourceWarning)
+        assert read_nonrealtimemeta(str(xml_file))["Latitude"] == "44:41:31.488"
+        gc.collect()
+
+
+def test_file_without_gps_group(tmp_path):
+    xml_file = tmp_path / "C0001M01.XML"
+    xml_file.write_text('<NonRealTimeMeta><CreationDate value="2021-08-14T11:27:22+01:00"/>'
+                        '</NonRealTimeMeta>')
+    assert read_nonrealtimemeta(xml_file) == {"CreationDate": "2021-08-14T11:27:22+01:00"}
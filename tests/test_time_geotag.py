@@ -0,0 +1,106 @@
+""" Tests of geotagging media files by time, from a time index of known positions.
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from gps_tracks import GPSTrack
+from media_gpsplot import MediaRecord, MediaRecordBuilder, geotag_by_time
+from time_geotag import TimeIndex
+
+
+def make_time_index():
+    # Positions at 10:00:00, 10:01:40 and, after a gap of an hour, 11:01:40
+    return TimeIndex(np.array(["2021-08-14T10:00:00", "2021-08-14T11:01:40",
+                               "2021-08-14T10:01:40", "NaT"], dtype="datetime64[ms]"),
+                     [45.0, 47.0, 46.0, 50.0], [5.0, 7.0, 6.0, 9.0], [100.0, 300.0, 200.0, 0.0])
+
+
+def locate(time_index, times, max_gap=300.0):
+    return time_index.locate(np.array(times, dtype="datetime64[ms]"), max_gap)
+
+
+def test_unknown_times_are_left_out_of_the_index():
+    assert len(make_time_index()) == 3
+
+
+def test_exact_hit():
+    latitudes, longitudes, altitudes, matched = locate(make_time_index(),
+                                                       ["2021-08-14T10:01:40"])
+    assert matched.tolist() == [True]
+    assert (latitudes[0], longitudes[0], altitudes[0]) == (46.0, 6.0, 200.0)
+
+
+def test_interpolation_between_neighbours():
+    # A quarter of the way from 10:00:00 to 10:01:40
+    latitudes, longitudes, altitudes, matched = locate(make_time_index(),
+                                                       ["2021-08-14T10:00:25"])
+    assert matched.tolist() == [True]
+    assert (latitudes[0], longitudes[0], altitudes[0]) == pytest.approx((45.25, 5.25, 125.0))
+
+
+def test_gap_over_the_limit():
+    time_index = make_time_index()
+    # Half an hour from both neighbours
+    latitudes, _, _, matched = locate(time_index, ["2021-08-14T10:31:40"])
+    assert matched.tolist() == [False] and np.isnan(latitudes[0])
+    # Within the gap of only one neighbour: its position, not interpolated
+    latitudes, _, _, matched = locate(time_index, ["2021-08-14T10:04:00"])
+    assert matched.tolist() == [True] and latitudes[0] == 46.0
+    # With a larger maximum gap it is interpolated
+    latitudes, _, _, matched = locate(time_index, ["2021-08-14T10:31:40"], max_gap=3600.0)
+    assert matched.tolist() == [True] and latitudes[0] == pytest.approx(46.5)
+
+
+def test_out_of_range():
+    time_index = make_time_index()
+    latitudes, _, _, matched = locate(time_index, ["2021-08-14T09:58:00", "2021-08-14T11:05:00",
+                                                   "2021-08-14T09:00:00", "2021-08-14T12:00:00",
+                                                   "NaT"])
+    assert matched.tolist() == [True, True, False, False, False]
+    assert latitudes[:2].tolist() == [45.0, 47.0]
+
+
+def test_empty_index():
+    _, _, _, matched = locate(TimeIndex([], [], [], []), ["2021-08-14T10:00:00"])
+    assert matched.tolist() == [False]
+
+
+def geotag(located_records, unlocated_records, gps_tracks=None, utc_offset=2.0):
+    media_records = MediaRecordBuilder()
+    for media_record in located_records:
+        media_records.append(media_record)
+    geotagged_df = geotag_by_time(unlocated_records, media_records.to_dataframe(), gps_tracks,
+                                  logging.getLogger(), utc_offset=utc_offset, max_gap=60.0)
+    return {filename: (row['latitude'], row['longitude'])
+            for filename, row in geotagged_df.iterrows()}
+
+
+def test_mp4_creationdates_are_utc():
+    # Local time is UTC + 2: the video at 08:00 UTC and the photo at 10:00 local are at
+    # the same time, the photo at 08:00 local is two hours earlier
+    located_records = [MediaRecord("v.mp4", "mp4", "2021-08-14T08:00:00", (45.0, 5.0, 0.0))]
+    unlocated_records = [MediaRecord("a.jpg", "jpg", "2021:08:14 10:00:00", None),
+                         MediaRecord("b.jpg", "jpg", "2021:08:14 08:00:00", None)]
+    assert geotag(located_records, unlocated_records) == {"a.jpg": (45.0, 5.0)}
+
+
+def test_unlocated_mp4_is_looked_up_in_local_time():
+    located_records = [MediaRecord("p.jpg", "jpg", "2021:08:14 10:00:00", (45.0, 5.0, 0.0)),
+                       MediaRecord("c.xml", "xml", "2021-08-14T12:00:00+02:00",
+                                   (46.0, 6.0, 0.0))]
+    unlocated_records = [MediaRecord("v.mp4", "mp4", "2021-08-14T08:00:00", None),
+                         MediaRecord("w.mov", "mov", "2021-08-14T10:00:00", None)]
+    assert geotag(located_records, unlocated_records) == {"v.mp4": (45.0, 5.0),
+                                                          "w.mov": (46.0, 6.0)}
+
+
+def test_gps_track_times_are_utc():
+    gps_track = GPSTrack("t.mp4", np.array(["2021-08-14T08:00:00", "2021-08-14T08:00:10"],
+                                           dtype="datetime64[ms]"),
+                         [45.0, 45.1], [5.0, 5.1], [0.0, 0.0])
+    unlocated_records = [MediaRecord("a.jpg", "jpg", "2021:08:14 10:00:05", None)]
+    geotagged = geotag([], unlocated_records, [gps_track])
+    assert geotagged["a.jpg"] == pytest.approx((45.05, 5.05))
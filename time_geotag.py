@@ -0,0 +1,100 @@
+""" Geotagging by time: media files without geolocation get the position of media files
+    and GPS track points from around the same time.
+
+    All positions with a time go in one sorted time index. The times of the media files
+    are looked up in it with a binary search (numpy.searchsorted) for the whole batch at
+    once. Between two positions within the maximum time gap the position is interpolated,
+    otherwise the nearest position within the gap is used.
+"""
+
+import numpy as np
+
+
+# Maximum time in seconds between a media file and the position it gets
+DEFAULT_MAX_TIME_GAP = 300.0
+
+
+class TimeIndex:
+    """ Positions sorted by time.
+    """
+    def __init__(self, times, latitudes, longitudes, altitudes):
+        times = np.asarray(times, dtype="datetime64[ms]")
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        valid = ~np.isnat(times) & np.isfinite(latitudes)
+        times = times[valid].astype(np.int64)
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.latitudes = latitudes[valid][order]
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)[valid][order]
+        self.altitudes = np.asarray(altitudes, dtype=np.float64)[valid][order]
+
+    @classmethod
+    def from_sources(cls, sources):
+        """ Makes a time index from several sources, like media files and GPS tracks.
+
+        Args:
+            sources (list): (times, latitudes, longitudes, altitudes) arrays per source
+
+        Returns:
+            TimeIndex: time index of all positions
+        """
+        if not sources:
+            return cls([], [], [], [])
+        return cls(*(np.concatenate([np.asarray(source[column], dtype=dtype)
+                                     for source in sources])
+                     for column, dtype in enumerate(["datetime64[ms]", np.float64,
+                                                     np.float64, np.float64])))
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, times, max_gap=DEFAULT_MAX_TIME_GAP):
+        """ Looks up the positions at the given times.
+
+        Args:
+            times (ndarray): times, datetime64, NaT if unknown
+            max_gap (float): maximum time in seconds between a time and a position
+
+        Returns:
+            ndarray: latitudes, NaN where there is no position
+            ndarray: longitudes
+            ndarray: altitudes
+            ndarray: True where a position was found
+        """
+        times = np.asarray(times, dtype="datetime64[ms]")
+        number_of_times = len(times)
+        latitudes = np.full(number_of_times, np.nan)
+        longitudes = np.full(number_of_times, np.nan)
+        altitudes = np.full(number_of_times, np.nan)
+        if len(self.times) == 0 or number_of_times == 0:
+            return latitudes, longitudes, altitudes, np.zeros(number_of_times, dtype=bool)
+
+        known = ~np.isnat(times)
+        lookup_times = times.astype(np.int64)
+        max_gap_ms = max_gap * 1000.0
+        # Index of the first position at or after every time
+        after = np.searchsorted(self.times, lookup_times, side="left")
+        before = after - 1
+        has_before = before >= 0
+        has_after = after < len(self.times)
+        before = np.clip(before, 0, len(self.times) - 1)
+        after = np.clip(after, 0, len(self.times) - 1)
+        gap_before = (lookup_times - self.times[before]).astype(np.float64)
+        gap_after = (self.times[after] - lookup_times).astype(np.float64)
+        near_before = known & has_before & (gap_before <= max_gap_ms)
+        near_after = known & has_after & (gap_after <= max_gap_ms)
+
+        # Both neighbours within the gap: interpolated, an exact time match has weight 1
+        span = gap_before + gap_after
+        weight_after = np.divide(gap_before, span, out=np.ones_like(span), where=span > 0)
+        for values, index_values in ((latitudes, self.latitudes),
+                                     (longitudes, self.longitudes),
+                                     (altitudes, self.altitudes)):
+            values[near_after] = index_values[after[near_after]]
+            values[near_before & ~near_after] = index_values[before[near_before & ~near_after]]
+            both = near_before & near_after
+            values[both] = index_values[before[both]] * (1.0 - weight_after[both]) \
+                + index_values[after[both]] * weight_after[both]
+        return latitudes, longitudes, altitudes, near_before | near_after
+
+# End of class TimeIndex